@@ -8,3 +8,8 @@ class ActivityLogConfig(AppConfig):
     def ready(self):
         # Import signal handlers
         from . import signals  # noqa: F401
+
+        # SQLite full-text index (see activity_log.search)
+        from django.db.models.signals import post_migrate
+        from .search import ensure_sqlite_index
+        post_migrate.connect(ensure_sqlite_index, sender=self)
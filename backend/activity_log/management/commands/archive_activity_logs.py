@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from activity_log.retention import archive_activity_logs
+
+
+class Command(BaseCommand):
+    help = 'Move activity log entries older than the retention window to compressed monthly JSONL archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.ACTIVITY_LOG_RETENTION_DAYS,
+            help='Archive entries created more than this many days ago',
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=str(settings.ACTIVITY_LOG_ARCHIVE_DIR),
+            help='Directory receiving the activity_log_YYYY-MM.jsonl.gz files',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of entries read, archived and deleted per batch',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the entries that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        summary = archive_activity_logs(
+            older_than_days=options['older_than_days'],
+            output_dir=options['output_dir'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{summary['archived']} entries created before {summary['cutoff']} would be archived")
+            return
+
+        for path in summary['files']:
+            self.stdout.write(f"Wrote {path}")
+        self.stdout.write(self.style.SUCCESS(
+            f"[OK] Archived {summary['archived']} entries and deleted {summary['deleted']} from the activity log"
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:33
+
+from django.db import migrations, models
+
+
+def backfill_search_text(apps, schema_editor):
+    ActivityLog = apps.get_model('activity_log', 'ActivityLog')
+    batch = []
+    for log in ActivityLog.objects.select_related('actor').iterator(chunk_size=2000):
+        parts = [log.description, log.target_repr]
+        if log.actor is not None:
+            parts += [log.actor.first_name, log.actor.last_name, log.actor.email]
+        log.search_text = ' '.join(part for part in parts if part)
+        batch.append(log)
+        if len(batch) >= 2000:
+            ActivityLog.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    ActivityLog.objects.bulk_update(batch, ['search_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity_log', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+    ]
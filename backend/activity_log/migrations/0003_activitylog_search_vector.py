@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_search_vector(apps, schema_editor):
+    # PostgreSQL only; SQLite gets its FTS5 index from activity_log.search.ensure_sqlite_index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE activity_log_activitylog ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(search_text, ''))) STORED"
+    )
+    schema_editor.execute(
+        "CREATE INDEX activity_log_search_vector_gin ON activity_log_activitylog USING GIN (search_vector)"
+    )
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS activity_log_search_vector_gin")
+    schema_editor.execute("ALTER TABLE activity_log_activitylog DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity_log', '0002_activitylog_search_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
@@ -33,6 +33,10 @@ class ActivityLog(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
 
+    # Description, target and actor name/email in one column, indexed for full-text search
+    # (tsvector + GIN on PostgreSQL, FTS5 table on SQLite: see activity_log.search)
+    search_text = models.TextField(blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -46,7 +50,16 @@ class ActivityLog(models.Model):
     def save(self, *args, **kwargs):
         if self.actor and not self.actor_role:
             self.actor_role = self.actor.role
+        self.search_text = self.compose_search_text()
         super().save(*args, **kwargs)
 
+    def compose_search_text(self):
+        """Text indexed for search; bulk writers (activity_log.writer) must set search_text themselves."""
+        parts = [self.description, self.target_repr]
+        actor = self.actor
+        if actor is not None:
+            parts += [actor.first_name, actor.last_name, actor.email]
+        return ' '.join(part for part in parts if part)
+
     def __str__(self):
         return f"{self.get_action_display()} - {self.target_repr or self.target_model or ''}"
@@ -0,0 +1,68 @@
+"""
+Retention of the ActivityLog table.
+
+Entries older than the retention window are streamed, in primary key order and in batches,
+to gzip-compressed JSONL files (one file per month, activity_log_YYYY-MM.jsonl.gz) and then
+deleted, keeping the hot table behind the admin activity feed small. Each batch is written and
+closed before it is deleted, so an interrupted run loses nothing; rerunning it may repeat the
+last batch in the archive, which is harmless since every line carries the row id.
+"""
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import ActivityLog
+
+ARCHIVE_FIELDS = [
+    'id', 'actor_id', 'actor_role', 'action', 'description',
+    'target_app', 'target_model', 'target_id', 'target_repr',
+    'metadata', 'ip_address', 'user_agent', 'created_at',
+]
+
+
+def archive_path(output_dir, month):
+    return os.path.join(output_dir, f"activity_log_{month}.jsonl.gz")
+
+
+def archive_activity_logs(older_than_days, output_dir, batch_size=5000, dry_run=False):
+    """
+    Move entries created more than `older_than_days` ago to the monthly archives in `output_dir`.
+    Returns a summary: cutoff, archived/deleted counts and the files written.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    expired = ActivityLog.objects.filter(created_at__lt=cutoff)
+    summary = {'cutoff': cutoff.isoformat(), 'archived': 0, 'deleted': 0, 'files': []}
+
+    if dry_run:
+        summary['archived'] = expired.count()
+        return summary
+
+    os.makedirs(output_dir, exist_ok=True)
+    last_id = 0
+    while True:
+        rows = list(expired.filter(id__gt=last_id).order_by('id').values(*ARCHIVE_FIELDS)[:batch_size])
+        if not rows:
+            break
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row['created_at'].strftime('%Y-%m'), []).append(row)
+        for month, month_rows in by_month.items():
+            path = archive_path(output_dir, month)
+            # Appending adds a gzip member; gzip readers see one continuous JSONL stream
+            with gzip.open(path, 'at', encoding='utf-8') as archive:
+                for row in month_rows:
+                    archive.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+            if path not in summary['files']:
+                summary['files'].append(path)
+
+        summary['archived'] += len(rows)
+        deleted, _ = ActivityLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        summary['deleted'] += deleted
+        last_id = rows[-1]['id']
+
+    return summary
@@ -0,0 +1,100 @@
+"""
+Full-text search over ActivityLog.search_text.
+
+PostgreSQL: a stored generated tsvector column (search_vector, 'simple' configuration so Arabic
+and French text is indexed as-is) with a GIN index, created by migration 0003.
+SQLite (local development): an external-content FTS5 table kept in sync by triggers, installed
+after every migrate by ensure_sqlite_index() since SQLite table rebuilds drop triggers.
+Other backends, or SQLite without FTS5, fall back to icontains on search_text.
+
+Terms are matched as prefixes so the admin UI can search while typing; every term must match.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import ActivityLog
+
+TABLE = ActivityLog._meta.db_table
+FTS_TABLE = 'activity_log_fts'
+
+_SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_text, content='{TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+]
+
+
+def search_terms(query):
+    """Words of a user query, stripped of any search-syntax characters."""
+    return re.findall(r'\w+', query or '')
+
+
+def sqlite_fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def ensure_sqlite_index(using=None, **kwargs):
+    """post_migrate hook: (re)create the FTS5 table and triggers, rebuilding the index if they were missing."""
+    if connection.vendor != 'sqlite' or (using and using != connection.alias):
+        return
+    if TABLE not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{FTS_TABLE}_%'])
+        complete = cursor.fetchone()[0] == 3
+        if complete:
+            return
+        try:
+            for statement in _SQLITE_INDEX_SQL:
+                cursor.execute(statement)
+        except Exception:
+            # SQLite built without FTS5: search falls back to icontains
+            return
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def search_activity_logs(queryset, query):
+    """Filter `queryset` to entries matching every term of `query`, annotated with a relevance `rank`."""
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.annotate(
+            matched=RawSQL(f'"{TABLE}"."search_vector" @@ to_tsquery(\'simple\', %s)', [tsquery], output_field=BooleanField()),
+            rank=RawSQL(f'ts_rank("{TABLE}"."search_vector", to_tsquery(\'simple\', %s))', [tsquery], output_field=FloatField()),
+        ).filter(matched=True)
+
+    if sqlite_fts_available():
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # bm25() is lower for better matches; negate it so rank sorts like ts_rank
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = "{TABLE}"."id"',
+                [match], output_field=FloatField()
+            )
+        )
+
+    for term in terms:
+        queryset = queryset.filter(search_text__icontains=term)
+    return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
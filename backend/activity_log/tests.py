@@ -1,3 +1,199 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from communication.models import Conversation, Message
+from users.models import User
+from .models import ActivityLog
+from .retention import ARCHIVE_FIELDS, archive_activity_logs
+from .search import sqlite_fts_available
+from .utils import log_activity
+from .writer import BufferedActivityLogWriter
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class ActivityLogWriterTest(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(email="teacher@test.com", password=None, role="TEACHER")
+        self.conversation = Conversation.objects.create()
+
+    def test_synchronous_fallback_writes_immediately(self):
+        message = Message.objects.create(conversation=self.conversation, sender=self.teacher, content="hi")
+
+        log = ActivityLog.objects.get(action=ActivityLog.Action.MESSAGE_SENT)
+        self.assertEqual(log.actor, self.teacher)
+        self.assertEqual(log.actor_role, 'TEACHER')
+        self.assertEqual(log.target_id, str(message.id))
+
+    @override_settings(ACTIVITY_LOG_ASYNC=True)
+    def test_entries_are_buffered_until_commit_and_flushed_in_bulk(self):
+        buffered = BufferedActivityLogWriter(batch_size=100, flush_interval=60)
+        with mock.patch('activity_log.utils.writer', buffered), \
+                mock.patch.object(buffered, '_ensure_worker'):
+            with self.captureOnCommitCallbacks() as callbacks:
+                for index in range(5):
+                    log_activity(actor=self.teacher, description=f"entry {index}")
+                # Nothing is buffered before the transaction commits
+                self.assertEqual(buffered.stats()['queued'], 0)
+            for callback in callbacks:
+                callback()
+
+            self.assertEqual(buffered.stats()['pending'], 5)
+            self.assertFalse(ActivityLog.objects.exists())
+
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(buffered.flush(), 5)
+            self.assertEqual(len(queries), 1)
+
+        self.assertEqual(ActivityLog.objects.filter(actor_role='TEACHER').count(), 5)
+        self.assertEqual(buffered.stats(), {
+            'queued': 5, 'written': 5, 'dropped': 0, 'failed': 0, 'flushes': 1, 'pending': 0
+        })
+
+    def test_full_buffer_drops_and_counts_entries(self):
+        buffered = BufferedActivityLogWriter(batch_size=100, max_buffer=2)
+        with mock.patch.object(buffered, '_ensure_worker'):
+            results = [buffered.enqueue(ActivityLog(description=str(index))) for index in range(3)]
+
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(buffered.stats()['dropped'], 1)
+        self.assertEqual(buffered.stats()['pending'], 2)
+
+    def test_reaching_the_batch_size_wakes_the_worker(self):
+        buffered = BufferedActivityLogWriter(batch_size=2)
+        with mock.patch.object(buffered, '_ensure_worker'):
+            buffered.enqueue(ActivityLog(description="first"))
+            self.assertFalse(buffered._wakeup.is_set())
+            buffered.enqueue(ActivityLog(description="second"))
+            self.assertTrue(buffered._wakeup.is_set())
+
+
+class WriterStatsAPITest(APITestCase):
+    def test_admins_can_read_writer_stats(self):
+        admin = User.objects.create_user(email="admin@test.com", password=None, role="ADMIN")
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/activity-logs/writer-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('dropped', response.data)
+        self.assertEqual(response.data['pid'], os.getpid())
+
+
+class ActivityLogRetentionTest(TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        now = timezone.now()
+        for days in (400, 370, 200, 10):
+            log = ActivityLog.objects.create(description=f"{days} days ago", metadata={'days': days})
+            ActivityLog.objects.filter(pk=log.pk).update(created_at=now - timedelta(days=days))
+
+    def _read(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            return [json.loads(line) for line in archive]
+
+    def test_command_streams_old_entries_to_monthly_archives(self):
+        out = StringIO()
+        call_command(
+            'archive_activity_logs', older_than_days=180, output_dir=self.output_dir, batch_size=2, stdout=out
+        )
+
+        self.assertIn('[OK] Archived 3 entries and deleted 3', out.getvalue())
+        self.assertEqual(list(ActivityLog.objects.values_list('description', flat=True)), ["10 days ago"])
+
+        archived = []
+        for name in sorted(os.listdir(self.output_dir)):
+            self.assertTrue(name.startswith('activity_log_') and name.endswith('.jsonl.gz'))
+            archived += self._read(os.path.join(self.output_dir, name))
+        self.assertEqual(sorted(row['metadata']['days'] for row in archived), [200, 370, 400])
+        self.assertEqual(set(archived[0]), set(ARCHIVE_FIELDS))
+
+    def test_reruns_append_to_existing_archives(self):
+        archive_activity_logs(300, self.output_dir)
+        ActivityLog.objects.filter(description="200 days ago").update(created_at=timezone.now() - timedelta(days=400))
+        summary = archive_activity_logs(300, self.output_dir)
+
+        self.assertEqual(summary['archived'], 1)
+        self.assertEqual(sum(len(self._read(path)) for path in {
+            os.path.join(self.output_dir, name) for name in os.listdir(self.output_dir)
+        }), 3)
+
+    def test_dry_run_only_counts(self):
+        summary = archive_activity_logs(180, self.output_dir, dry_run=True)
+        self.assertEqual(summary['archived'], 3)
+        self.assertEqual(ActivityLog.objects.count(), 4)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class ActivityLogSearchTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email="admin@test.com", password=None, role="ADMIN")
+        self.teacher = User.objects.create_user(
+            email="karim@test.com", password=None, role="TEACHER", first_name="Karim", last_name="Alaoui"
+        )
+        self.client.force_authenticate(user=self.admin)
+        log_activity(actor=self.teacher, description="Homework 'Fractions' created for class 3")
+        log_activity(actor=self.teacher, description="Payment of 300 recorded for invoice 12")
+        log_activity(actor=self.admin, description="Homework 'Fractions' homework reminder sent")
+
+    def _search(self, **params):
+        response = self.client.get('/api/activity-logs/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['description'] for item in response.data['results']]
+
+    def test_search_text_is_maintained_on_write(self):
+        log = ActivityLog.objects.get(description__startswith="Payment")
+        self.assertEqual(log.search_text, "Payment of 300 recorded for invoice 12 Karim Alaoui karim@test.com")
+
+    def test_ranked_prefix_search_over_description_and_actor(self):
+        if connection.vendor == 'sqlite':
+            # Installed by the post_migrate hook, not the icontains fallback
+            self.assertTrue(sqlite_fts_available())
+        self.assertEqual(len(self._search(q="fract")), 2)
+        # Two matches of "homework" rank the reminder first
+        results = self._search(q="homework fractions")
+        self.assertEqual(results, [
+            "Homework 'Fractions' homework reminder sent",
+            "Homework 'Fractions' created for class 3",
+        ])
+        self.assertEqual(self._search(q="alaoui payment"), ["Payment of 300 recorded for invoice 12"])
+        self.assertEqual(self._search(q="nothing-matches-this"), [])
+
+    def test_search_is_date_bounded(self):
+        ActivityLog.objects.filter(description__startswith="Payment").update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        start = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self._search(q="karim", start=start), ["Homework 'Fractions' created for class 3"])
+        self.assertEqual(len(self._search(q="karim")), 2)
+
+        response = self.client.get('/api/activity-logs/search/', {'q': 'karim', 'start': 'not-a-date'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start', response.data)
+
+    def test_deleted_and_updated_entries_leave_the_index(self):
+        ActivityLog.objects.filter(description__startswith="Payment").delete()
+        self.assertEqual(self._search(q="payment"), [])
+
+        log = ActivityLog.objects.get(description__contains="reminder")
+        log.description = "Reminder rescheduled"
+        log.save()
+        self.assertEqual(self._search(q="rescheduled"), ["Reminder rescheduled"])
+
+    def test_list_search_uses_the_denormalized_column(self):
+        response = self.client.get('/api/activity-logs/', {'search': 'karim@test'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.client.get('/api/activity-logs/search/').status_code, 400)
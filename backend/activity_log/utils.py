@@ -1,9 +1,12 @@
 from typing import Any, Optional
 
 from django.apps import apps
+from django.conf import settings
+from django.db import transaction
 from django.http import HttpRequest
 
 from .models import ActivityLog
+from .writer import writer
 
 
 def _get_client_ip(request: HttpRequest) -> Optional[str]:
@@ -26,6 +29,8 @@ def log_activity(
 ) -> ActivityLog:
     """
     Convenience helper to persist an ActivityLog entry.
+    The entry is buffered and written in bulk once the current transaction commits
+    (see activity_log.writer); with ACTIVITY_LOG_ASYNC disabled it is saved immediately.
     - actor: User instance
     - action: ActivityLog.Action value
     - target: any Django model instance to capture app/model/id automatically
@@ -43,8 +48,10 @@ def log_activity(
             target_id = getattr(target, 'pk', None)
         target_repr = target_repr or str(target)
 
-    return ActivityLog.objects.create(
+    entry = ActivityLog(
         actor=actor,
+        # Read from the instance in hand: ActivityLog.save() is skipped by bulk_create
+        actor_role=getattr(actor, 'role', '') or '',
         action=action,
         description=description or '',
         target_app=target_app or '',
@@ -55,3 +62,11 @@ def log_activity(
         ip_address=_get_client_ip(request),
         user_agent=request.META.get('HTTP_USER_AGENT', '') if request else '',
     )
+    entry.search_text = entry.compose_search_text()
+
+    if not getattr(settings, 'ACTIVITY_LOG_ASYNC', False):
+        entry.save()
+        return entry
+
+    transaction.on_commit(lambda: writer.enqueue(entry))
+    return entry
@@ -1,8 +1,14 @@
-from rest_framework import viewsets, permissions, filters
+import os
+
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet, DateTimeFilter
 
 from .models import ActivityLog
 from .serializers import ActivityLogSerializer
+from .writer import writer
+from .search import search_activity_logs, search_terms
 
 
 class IsAdminOrStaff(permissions.BasePermission):
@@ -26,11 +32,43 @@ class ActivityLogFilter(FilterSet):
 
 
 class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = ActivityLog.objects.all().order_by('-created_at')
+    queryset = ActivityLog.objects.select_related('actor__profile').order_by('-created_at')
     serializer_class = ActivityLogSerializer
     permission_classes = [IsAdminOrStaff]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = ActivityLogFilter
-    search_fields = ['description', 'target_repr', 'actor__full_name', 'actor__email']
+    # Description, target and actor name/email, denormalized on the row (no join)
+    search_fields = ['search_text']
     ordering_fields = ['created_at', 'actor_role', 'action']
     ordering = ['-created_at']
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search ranked by relevance (?q=...), combinable with the list filters
+        (start/end dates, action, actor, ...)
+        """
+        query = request.query_params.get('q', '')
+        if not search_terms(query):
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The list filters, validated like the list endpoint (400 on a bad start/end date)
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = search_activity_logs(queryset, query).order_by('-rank', '-created_at')
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='writer-stats')
+    def writer_stats(self, request):
+        """
+        Counters of the buffered log writer (queued, written, dropped, failed, pending).
+        Every process has its own writer: behind several workers these are the counters of the
+        one that served the request, identified by `pid`.
+        """
+        return Response({
+            'pid': os.getpid(),
+            'scope': 'process',
+            **writer.stats(),
+        })
@@ -0,0 +1,108 @@
+"""
+Buffered ActivityLog writer.
+
+log_activity() hands entries to a process-wide BufferedActivityLogWriter instead of inserting
+them inside the caller's request/signal. Entries join the buffer when the caller's transaction
+commits (so rolled-back actions are never logged) and a daemon thread writes them with
+bulk_create every ACTIVITY_LOG_FLUSH_INTERVAL seconds, or as soon as ACTIVITY_LOG_BATCH_SIZE
+entries are waiting. The buffer is bounded by ACTIVITY_LOG_MAX_BUFFER: when the database falls
+behind, new entries are dropped and counted rather than growing memory without limit.
+stats() exposes the queued/written/dropped/failed counters of the process it runs in.
+
+With ACTIVITY_LOG_ASYNC disabled (the activity_log tests), log_activity writes synchronously.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedActivityLogWriter:
+    def __init__(self, batch_size=200, flush_interval=2.0, max_buffer=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._counters = {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'flushes': 0}
+
+    def enqueue(self, entry):
+        """Buffer one unsaved ActivityLog. Returns False if it was dropped because the buffer is full."""
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self._counters['dropped'] += 1
+                dropped = self._counters['dropped']
+            else:
+                self._buffer.append(entry)
+                self._counters['queued'] += 1
+                dropped = None
+                pending = len(self._buffer)
+        if dropped is not None:
+            # Log the first drop and then every 1000th, not every entry
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"Activity log buffer full, {dropped} entries dropped so far")
+            return False
+
+        self._ensure_worker()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Write every buffered entry now. Returns the number of entries written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                ActivityLog.objects.bulk_create(batch, batch_size=self.batch_size)
+            except Exception as e:
+                with self._lock:
+                    self._counters['failed'] += len(batch)
+                logger.error(f"Failed to write {len(batch)} activity log entries: {str(e)}")
+                return 0
+            with self._lock:
+                self._counters['written'] += len(batch)
+                self._counters['flushes'] += 1
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'pending': len(self._buffer)}
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+
+writer = BufferedActivityLogWriter(
+    batch_size=getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 200),
+    flush_interval=getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 2.0),
+    max_buffer=getattr(settings, 'ACTIVITY_LOG_MAX_BUFFER', 10000),
+)
+
+# Do not lose the last partial batch on a clean shutdown
+atexit.register(writer.flush)
@@ -3,7 +3,7 @@
 from django.contrib import admin
 from .models import (
     SchoolTimetable, TimetableSession, AttendanceSession, AttendanceRecord,
-    StudentAbsenceFlag, StudentParentRelation, AttendanceNotification
+    StudentAbsenceFlag, StudentParentRelation, AttendanceNotification, AttendanceDailyStat
 )
 
 @admin.register(SchoolTimetable)
@@ -64,3 +64,11 @@ class AttendanceNotificationAdmin(admin.ModelAdmin):
     search_fields = ['recipient__first_name', 'recipient__last_name', 'student__first_name', 'student__last_name']
     readonly_fields = ['created_at', 'sent_at', 'delivered_at', 'read_at']
     date_hierarchy = 'created_at'
+
+@admin.register(AttendanceDailyStat)
+class AttendanceDailyStatAdmin(admin.ModelAdmin):
+    list_display = ['student', 'school_class', 'subject', 'teacher', 'date', 'total_count', 'present_count', 'absent_count', 'late_count', 'excused_count']
+    list_filter = ['date', 'grade', 'track', 'subject']
+    search_fields = ['student__first_name', 'student__last_name', 'school_class__name']
+    readonly_fields = ['updated_at']
+    date_hierarchy = 'date'
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AttendanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'attendance'
+
+    def ready(self):
+        """
+        Import signals to ensure they are registered.
+        """
+        import attendance.signals  # noqa
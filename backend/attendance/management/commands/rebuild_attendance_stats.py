@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.stats import check_consistency, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the AttendanceDailyStat cube used by the attendance reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Compare the cube with AttendanceRecord instead of rebuilding it',
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='With --check, repair missing, stale and orphaned cube rows',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of cube rows inserted per bulk_create batch',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            self.stdout.write('Rebuilding attendance daily statistics...')
+            written = rebuild(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'[OK] Rebuilt attendance statistics with {written} rows'))
+            return
+
+        report = check_consistency(fix=options['fix'])
+
+        self.stdout.write(f"Checked {report['checked']} statistics rows")
+        self.stdout.write(f"Missing rows: {report['missing']}")
+        self.stdout.write(f"Stale rows: {report['stale']}")
+        self.stdout.write(f"Orphaned rows: {report['orphaned']}")
+
+        problems = report['missing'] + report['stale'] + report['orphaned']
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('[OK] Attendance statistics are consistent'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'[OK] Repaired {problems} statistics rows'))
+        else:
+            raise CommandError(f'Attendance statistics have {problems} inconsistent rows; run with --check --fix to repair')
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_alter_schooltimetable_unique_together'),
+        ('schools', '0011_gasoilrecord_payment_method'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_count', models.PositiveIntegerField(default=0)),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('absent_count', models.PositiveIntegerField(default=0)),
+                ('late_count', models.PositiveIntegerField(default=0)),
+                ('excused_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('grade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_daily_stats', to='schools.grade')),
+                ('school_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_daily_stats', to='schools.schoolclass')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_daily_stats', to=settings.AUTH_USER_MODEL)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_daily_stats', to='schools.subject')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='taught_attendance_daily_stats', to=settings.AUTH_USER_MODEL)),
+                ('track', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_daily_stats', to='schools.track')),
+            ],
+            options={
+                'verbose_name': 'Attendance Daily Stat',
+                'verbose_name_plural': 'Attendance Daily Stats',
+                'indexes': [models.Index(fields=['school_class', 'date'], name='attendance__school__5e131d_idx'), models.Index(fields=['grade', 'date'], name='attendance__grade_i_d44539_idx'), models.Index(fields=['student', 'date'], name='attendance__student_57c5e0_idx'), models.Index(fields=['teacher', 'date'], name='attendance__teacher_76f983_idx'), models.Index(fields=['date'], name='attendance__date_580974_idx')],
+                'unique_together': {('student', 'school_class', 'subject', 'teacher', 'date')},
+            },
+        ),
+    ]
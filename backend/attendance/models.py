@@ -160,25 +160,31 @@ class AttendanceSession(models.Model):
             self.save()
             
             # Create attendance records for all students in the class
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
             from users.models import StudentEnrollment
-            enrollments = StudentEnrollment.objects.filter(
-                school_class=self.timetable_session.timetable.school_class,
-                academic_year=self.timetable_session.timetable.academic_year,
+            timetable = self.timetable_session.timetable
+            student_ids = StudentEnrollment.objects.filter(
+                school_class_id=timetable.school_class_id,
+                academic_year_id=timetable.academic_year_id,
                 is_active=True
-            ).select_related('student')
-            students = [enrollment.student for enrollment in enrollments]
-            
-            for student in students:
-                AttendanceRecord.objects.get_or_create(
-                    attendance_session=self,
-                    student=student,
-                    defaults={
-                        'status': 'present',  # Default to present
-                        'marked_by': self.teacher
-                    }
-                )
+            ).values_list('student_id', flat=True)
+
+            existing = set(self.attendance_records.values_list('student_id', flat=True))
+            AttendanceRecord.objects.bulk_create(
+                [
+                    AttendanceRecord(
+                        attendance_session=self,
+                        student_id=student_id,
+                        status='present',  # Default to present
+                        marked_by_id=self.teacher_id
+                    )
+                    for student_id in student_ids if student_id not in existing
+                ],
+                ignore_conflicts=True  # Records created concurrently by another request
+            )
+
+            # bulk_create bypasses post_save: refresh the statistics cube once
+            from .stats import refresh_sessions
+            refresh_sessions([self.pk])
     
     def complete_session(self):
         """Complete attendance session"""
@@ -188,12 +194,19 @@ class AttendanceSession(models.Model):
             self.save()
             
             # Create flags for absent students
-            absent_records = self.attendance_records.filter(status='absent')
-            for record in absent_records:
-                StudentAbsenceFlag.objects.get_or_create(
-                    student=record.student,
-                    attendance_record=record
-                )
+            absent_records = self.attendance_records.filter(status='absent').values_list('id', 'student_id')
+            flagged = set(
+                StudentAbsenceFlag.objects.filter(
+                    attendance_record__attendance_session=self
+                ).values_list('attendance_record_id', flat=True)
+            )
+            StudentAbsenceFlag.objects.bulk_create(
+                [
+                    StudentAbsenceFlag(student_id=student_id, attendance_record_id=record_id)
+                    for record_id, student_id in absent_records if record_id not in flagged
+                ],
+                ignore_conflicts=True
+            )
     
     @property
     def total_students(self):
@@ -257,6 +270,57 @@ class AttendanceRecord(models.Model):
     def __str__(self):
         return f"{self.student.full_name} - {self.get_status_display()} - {self.attendance_session.date}"
 
+# =====================================
+# ATTENDANCE STATISTICS CUBE
+# =====================================
+
+class AttendanceDailyStat(models.Model):
+    """
+    Daily attendance counts per (student, class, subject, teacher, date).
+    Read by the attendance statistics endpoints instead of scanning AttendanceRecord.
+    Maintained by attendance.stats (via attendance.signals and the bulk code paths);
+    rebuilt with `manage.py rebuild_attendance_stats`.
+    """
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='attendance_daily_stats'
+    )
+    school_class = models.ForeignKey('schools.SchoolClass', on_delete=models.CASCADE, related_name='attendance_daily_stats')
+    subject = models.ForeignKey('schools.Subject', on_delete=models.CASCADE, related_name='attendance_daily_stats')
+    teacher = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='taught_attendance_daily_stats'
+    )
+    date = models.DateField()
+
+    # Denormalized class dimensions
+    grade = models.ForeignKey('schools.Grade', on_delete=models.CASCADE, related_name='attendance_daily_stats')
+    track = models.ForeignKey(
+        'schools.Track', on_delete=models.CASCADE, null=True, blank=True, related_name='attendance_daily_stats'
+    )
+
+    # Record counts
+    total_count = models.PositiveIntegerField(default=0)
+    present_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+    excused_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'school_class', 'subject', 'teacher', 'date']
+        indexes = [
+            models.Index(fields=['school_class', 'date']),
+            models.Index(fields=['grade', 'date']),
+            models.Index(fields=['student', 'date']),
+            models.Index(fields=['teacher', 'date']),
+            models.Index(fields=['date']),
+        ]
+        verbose_name = "Attendance Daily Stat"
+        verbose_name_plural = "Attendance Daily Stats"
+
+    def __str__(self):
+        return f"{self.student_id} - {self.school_class_id} - {self.subject_id} - {self.date}"
+
 # =====================================
 # STUDENT ABSENCE FLAG SYSTEM
 # =====================================
@@ -0,0 +1,165 @@
+# attendance/notifications.py
+"""
+Fan-out of absence notifications when an attendance session is completed.
+
+Recipients (admins/general supervisors, the absent students, their parents) are resolved
+with a few set queries, every Notification/AttendanceNotification row is built in memory
+and written with bulk_create. bulk_create bypasses the Notification post_save receiver, so
+the fan-out updates the recipients' unread counters itself (communication.unread).
+
+enqueue_absence_notifications() hands the work to a local job queue drained by a single
+daemon worker, so completing a session does not wait for the fan-out. The job is queued
+on transaction commit; with ATTENDANCE_NOTIFICATIONS_ASYNC disabled (tests) it runs inline.
+"""
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+
+from communication.models import Notification
+from communication.unread import notifications_created
+from .models import AttendanceNotification, AttendanceSession, StudentParentRelation
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+BULK_BATCH_SIZE = 500
+
+_jobs = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def absence_staff_ids():
+    """Active admins and general supervisors, who are told about every absence."""
+    return list(
+        User.objects.filter(
+            Q(role='ADMIN') | Q(role='STAFF', profile__position='GENERAL_SUPERVISOR'),
+            is_active=True
+        ).values_list('id', flat=True).distinct()
+    )
+
+
+def absence_parent_ids(students):
+    """Map student id -> parent ids to notify: active relations first, then User.parent as fallback."""
+    parents = {student.id: [] for student in students}
+    relations = StudentParentRelation.objects.filter(
+        student_id__in=parents, is_active=True, notify_absence=True
+    ).values_list('student_id', 'parent_id')
+    for student_id, parent_id in relations:
+        if parent_id not in parents[student_id]:
+            parents[student_id].append(parent_id)
+
+    for student in students:
+        if student.parent_id and student.parent_id not in parents[student.id]:
+            parents[student.id].append(student.parent_id)
+    return parents
+
+
+def build_absence_notifications(session, absent_records):
+    """Return the unsaved (Notification, AttendanceNotification) rows for the absent records of a session."""
+    subject_name = session.timetable_session.subject.name
+    session_date = session.date
+
+    staff_ids = absence_staff_ids()
+    parents = absence_parent_ids({record.student_id: record.student for record in absent_records}.values())
+
+    notifications, attendance_notifications = [], []
+
+    def notify(recipient_id, record, title, message):
+        notifications.append(Notification(
+            recipient_id=recipient_id,
+            title=title,
+            message=message,
+            notification_type=Notification.Type.SYSTEM,
+            related_object_id=record.id,
+            related_object_type='attendance_record'
+        ))
+
+    for record in absent_records:
+        student = record.student
+        student_name = student.full_name
+        title = f"Absence Alert: {student_name}"
+        message = f"the student {student_name} is absent in the session :{subject_name}"
+
+        # 1. Notify Admins and General Supervisors
+        for staff_id in staff_ids:
+            notify(staff_id, record, title, message)
+
+        # 2. Notify the Student
+        if student.is_active:
+            notify(
+                student.id, record, "Absence Alert",
+                f"You were marked absent in the session :{subject_name} on {session_date}"
+            )
+
+        # 3. Notify Parents: legacy AttendanceNotification (reports/history) and the bell icon Notification
+        for parent_id in parents[student.id]:
+            attendance_notifications.append(AttendanceNotification(
+                recipient_id=parent_id,
+                student=student,
+                notification_type='absence',
+                title=f"إخطار غياب - Absence Alert: {student_name}",
+                message=f"تم تسجيل غياب {student_name} في حصة {subject_name} بتاريخ {session_date}",
+                attendance_record=record
+            ))
+            notify(parent_id, record, title, message)
+
+    return notifications, attendance_notifications
+
+
+def send_absence_notifications(session_id):
+    """Notify everyone concerned by the absences of a session. Returns a summary of the rows written."""
+    session = AttendanceSession.objects.select_related('timetable_session__subject').get(id=session_id)
+    absent_records = list(
+        session.attendance_records.filter(status='absent').select_related('student__profile')
+    )
+    summary = {'absent_students': len(absent_records), 'notifications': 0, 'attendance_notifications': 0}
+    if not absent_records:
+        return summary
+
+    notifications, attendance_notifications = build_absence_notifications(session, absent_records)
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications, batch_size=BULK_BATCH_SIZE)
+        AttendanceNotification.objects.bulk_create(attendance_notifications, batch_size=BULK_BATCH_SIZE)
+        notifications_created(notification.recipient_id for notification in notifications)
+
+    summary['notifications'] = len(notifications)
+    summary['attendance_notifications'] = len(attendance_notifications)
+    return summary
+
+
+def enqueue_absence_notifications(session_id):
+    """Queue the fan-out of a session's absence notifications, or run it inline when async is disabled."""
+    if not getattr(settings, 'ATTENDANCE_NOTIFICATIONS_ASYNC', False):
+        return send_absence_notifications(session_id)
+    # Queued once the session/records are committed, so the worker sees them
+    transaction.on_commit(lambda: _submit(session_id))
+    return None
+
+
+def _submit(session_id):
+    global _worker
+    _jobs.put(session_id)
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_drain, name='absence-notifications', daemon=True)
+            _worker.start()
+
+
+def _drain():
+    """Worker loop of the local job queue: one fan-out at a time, in submission order."""
+    while True:
+        session_id = _jobs.get()
+        try:
+            summary = send_absence_notifications(session_id)
+            logger.info(f"Absence notifications for session {session_id}: {summary}")
+        except Exception as e:
+            logger.error(f"Absence notifications for session {session_id} failed: {str(e)}")
+        finally:
+            connection.close()
+            _jobs.task_done()
@@ -3,6 +3,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
 from .models import (
     SchoolTimetable, TimetableSession, AttendanceSession, AttendanceRecord,
@@ -124,6 +125,20 @@ class TimetableSessionCreateSerializer(serializers.ModelSerializer):
 # ATTENDANCE RECORD SERIALIZERS
 # =====================================
 
+def with_record_details(queryset):
+    """Load the relations and pending flag counts AttendanceRecordSerializer reads, in one query"""
+    return queryset.select_related(
+        'student__profile__school_subject', 'marked_by__profile',
+        'attendance_session__timetable_session__subject',
+        'attendance_session__timetable_session__timetable__school_class__grade__educational_level',
+        'attendance_session__timetable_session__timetable__school_class__track',
+    ).annotate(
+        pending_flags_total=Count(
+            'student__absence_flags', filter=Q(student__absence_flags__is_cleared=False)
+        )
+    )
+
+
 class AttendanceRecordSerializer(serializers.ModelSerializer):
     """Individual attendance record"""
     student = UserBasicSerializer(read_only=True)
@@ -167,11 +182,15 @@ class AttendanceRecordSerializer(serializers.ModelSerializer):
 
     def get_has_pending_flags(self, obj):
         """Check if student has any uncleared absence flags"""
-        return obj.student.absence_flags.filter(is_cleared=False).exists()
+        return self.get_pending_flags_count(obj) > 0
 
     def get_pending_flags_count(self, obj):
         """Get count of uncleared absence flags for this student"""
-        return obj.student.absence_flags.filter(is_cleared=False).count()
+        # Annotated by with_record_details() to avoid two queries per record
+        count = getattr(obj, 'pending_flags_total', None)
+        if count is None:
+            count = obj.student.absence_flags.filter(is_cleared=False).count()
+        return count
 
 class AttendanceRecordUpdateSerializer(serializers.ModelSerializer):
     """Update attendance record"""
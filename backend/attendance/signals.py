@@ -0,0 +1,48 @@
+# attendance/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import AttendanceRecord, AttendanceSession
+from .stats import refresh_keys, refresh_sessions, session_key
+
+
+@receiver(post_save, sender=AttendanceRecord)
+def update_attendance_stats_on_record_save(sender, instance, raw=False, **kwargs):
+    """Keep the AttendanceDailyStat rows of the record's session in sync."""
+    if raw:
+        return
+    refresh_sessions([instance.attendance_session_id])
+
+
+@receiver(post_delete, sender=AttendanceRecord)
+def update_attendance_stats_on_record_delete(sender, instance, **kwargs):
+    refresh_sessions([instance.attendance_session_id])
+
+
+@receiver(pre_save, sender=AttendanceSession)
+def remember_attendance_session_key(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._stats_key = session_key(instance.pk)
+
+
+@receiver(post_save, sender=AttendanceSession)
+def update_attendance_stats_on_session_move(sender, instance, created, raw=False, **kwargs):
+    """Re-bucket the session's records when its date, teacher or timetable slot changes."""
+    if raw or created:
+        return
+    old_key = getattr(instance, '_stats_key', None)
+    new_key = session_key(instance.pk)
+    if old_key != new_key:
+        refresh_keys([old_key, new_key])
+
+
+@receiver(pre_delete, sender=AttendanceSession)
+def remember_deleted_attendance_session_key(sender, instance, **kwargs):
+    instance._stats_key = session_key(instance.pk)
+
+
+@receiver(post_delete, sender=AttendanceSession)
+def update_attendance_stats_on_session_delete(sender, instance, **kwargs):
+    refresh_keys([getattr(instance, '_stats_key', None)])
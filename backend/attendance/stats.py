@@ -0,0 +1,190 @@
+# attendance/stats.py
+"""
+Maintenance of the AttendanceDailyStat cube.
+
+A cube row holds the record counts of one student for one (class, subject, teacher, date)
+key. Whenever records of a session change, every row of the session's key is recomputed
+from AttendanceRecord (refresh_sessions). Record save/delete and session moves are handled
+by attendance.signals; bulk writers (start_session, bulk_mark) call refresh_sessions
+themselves. rebuild() and check_consistency() back the management command.
+"""
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import AttendanceDailyStat, AttendanceRecord, AttendanceSession
+
+STATUSES = ('present', 'absent', 'late', 'excused')
+COUNT_FIELDS = ['total_count'] + [f'{status}_count' for status in STATUSES]
+
+_CLASS = 'attendance_session__timetable_session__timetable__school_class'
+_RECORD_DIMENSIONS = {
+    'student_id': 'student_id',
+    'school_class_id': f'{_CLASS}_id',
+    'grade_id': f'{_CLASS}__grade_id',
+    'track_id': f'{_CLASS}__track_id',
+    'subject_id': 'attendance_session__timetable_session__subject_id',
+    'teacher_id': 'attendance_session__teacher_id',
+    'date': 'attendance_session__date',
+}
+_ROW_ATTNAMES = ['student_id', 'school_class_id', 'subject_id', 'teacher_id', 'date', 'grade_id', 'track_id']
+
+
+def sum_counts():
+    """Sum expressions of the cube counts, for aggregate()/annotate() on AttendanceDailyStat."""
+    return {field: Sum(field) for field in COUNT_FIELDS}
+
+
+def session_key(session_id):
+    """(class, subject, teacher, date) key of a session, or None if it does not exist."""
+    keys = session_keys([session_id])
+    return next(iter(keys), None)
+
+
+def session_keys(session_ids):
+    return set(
+        AttendanceSession.objects.filter(id__in=session_ids).values_list(
+            'timetable_session__timetable__school_class_id',
+            'timetable_session__subject_id',
+            'teacher_id',
+            'date',
+        )
+    )
+
+
+def _records_for_keys(keys):
+    query = Q()
+    for class_id, subject_id, teacher_id, day in keys:
+        query |= Q(**{
+            f'{_CLASS}_id': class_id,
+            'attendance_session__timetable_session__subject_id': subject_id,
+            'attendance_session__teacher_id': teacher_id,
+            'attendance_session__date': day,
+        })
+    return AttendanceRecord.objects.filter(query)
+
+
+def _rows_for_keys(keys):
+    query = Q()
+    for class_id, subject_id, teacher_id, day in keys:
+        query |= Q(school_class_id=class_id, subject_id=subject_id, teacher_id=teacher_id, date=day)
+    return AttendanceDailyStat.objects.filter(query)
+
+
+def iter_expected_rows(records=None):
+    """Yield unsaved cube rows aggregated from `records` (default: every AttendanceRecord)."""
+    records = AttendanceRecord.objects.all() if records is None else records
+    aggregated = (
+        records.values(*_RECORD_DIMENSIONS.values())
+        .annotate(
+            total_count=Count('id'),
+            **{f'{status}_count': Count('id', filter=Q(status=status)) for status in STATUSES},
+        )
+        .order_by()
+    )
+    for values in aggregated.iterator():
+        yield AttendanceDailyStat(
+            **{attname: values[path] for attname, path in _RECORD_DIMENSIONS.items()},
+            **{field: values[field] for field in COUNT_FIELDS},
+        )
+
+
+def _lock_keys(keys):
+    """Lock the sessions of the given keys until the end of the transaction."""
+    query = Q()
+    for class_id, subject_id, teacher_id, day in keys:
+        query |= Q(
+            timetable_session__timetable__school_class_id=class_id,
+            timetable_session__subject_id=subject_id,
+            teacher_id=teacher_id,
+            date=day,
+        )
+    # Ordered, so concurrent refreshes of overlapping keys cannot deadlock
+    list(
+        AttendanceSession.objects.select_for_update(of=('self',))
+        .filter(query).order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def refresh_keys(keys):
+    """Recompute every cube row of the given (class, subject, teacher, date) keys."""
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return 0
+    # Joins the caller's transaction (bulk_mark, signal handlers) without a savepoint
+    with transaction.atomic(savepoint=False):
+        # Two refreshes of a key must not interleave: both would delete the rows and then
+        # insert the same ones, and the second insert would hit the unique constraint
+        _lock_keys(keys)
+        _rows_for_keys(keys).delete()
+        rows = AttendanceDailyStat.objects.bulk_create(
+            list(iter_expected_rows(_records_for_keys(keys))), batch_size=500
+        )
+    return len(rows)
+
+
+def refresh_sessions(session_ids):
+    """Recompute the cube rows touched by the records of these sessions."""
+    return refresh_keys(session_keys(session_ids))
+
+
+def rebuild(batch_size=1000):
+    """Truncate and repopulate the cube from AttendanceRecord. Returns the number of rows written."""
+    written = 0
+    batch = []
+    with transaction.atomic():
+        AttendanceDailyStat.objects.all().delete()
+        for row in iter_expected_rows():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                AttendanceDailyStat.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            AttendanceDailyStat.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def check_consistency(fix=False):
+    """
+    Compare the cube against AttendanceRecord, one day at a time.
+    Returns counts of checked/missing/stale/orphaned rows; with fix=True they are repaired.
+    """
+    report = {'checked': 0, 'missing': 0, 'stale': 0, 'orphaned': 0}
+
+    days = set(AttendanceSession.objects.filter(attendance_records__isnull=False).values_list('date', flat=True))
+    days.update(AttendanceDailyStat.objects.values_list('date', flat=True))
+
+    for day in sorted(days):
+        existing = {
+            tuple(getattr(row, attname) for attname in _ROW_ATTNAMES[:5]): row
+            for row in AttendanceDailyStat.objects.filter(date=day)
+        }
+        to_create, to_update = [], []
+
+        for expected in iter_expected_rows(AttendanceRecord.objects.filter(attendance_session__date=day)):
+            report['checked'] += 1
+            current = existing.pop(tuple(getattr(expected, attname) for attname in _ROW_ATTNAMES[:5]), None)
+            if current is None:
+                report['missing'] += 1
+                to_create.append(expected)
+            elif any(
+                getattr(current, name) != getattr(expected, name) for name in COUNT_FIELDS + _ROW_ATTNAMES[5:]
+            ):
+                report['stale'] += 1
+                expected.pk = current.pk
+                to_update.append(expected)
+
+        report['orphaned'] += len(existing)
+
+        if fix:
+            with transaction.atomic():
+                AttendanceDailyStat.objects.bulk_create(to_create, batch_size=500)
+                AttendanceDailyStat.objects.bulk_update(
+                    to_update, COUNT_FIELDS + ['grade', 'track'], batch_size=500
+                )
+                if existing:
+                    AttendanceDailyStat.objects.filter(pk__in=[row.pk for row in existing.values()]).delete()
+
+    return report
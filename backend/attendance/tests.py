@@ -1,18 +1,24 @@
 # attendance/tests.py
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from unittest import mock
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
 from datetime import date, time, datetime, timedelta
 from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from .models import (
     SchoolTimetable, TimetableSession, AttendanceSession, AttendanceRecord,
     StudentAbsenceFlag, StudentParentRelation,
-    AttendanceNotification
+    AttendanceNotification, AttendanceDailyStat
 )
+from .stats import check_consistency, rebuild, refresh_sessions
+from . import notifications as absence_notifications
+from communication.models import Notification
 from users.models import StudentEnrollment
 from schools.models import School, AcademicYear, EducationalLevel, Grade, SchoolClass, Subject, Room
 
@@ -271,6 +277,48 @@ class AttendanceSessionModelTest(TestCase):
         flags = StudentAbsenceFlag.objects.filter(student=self.student1)
         self.assertEqual(flags.count(), 1)
     
+    def test_session_transitions_use_constant_queries(self):
+        """Benchmark: starting/completing a session costs the same queries for 2 or 40 students"""
+        def run_session(session_date):
+            session = AttendanceSession.objects.create(
+                timetable_session=self.timetable_session, date=session_date, teacher=self.teacher
+            )
+            session = AttendanceSession.objects.get(pk=session.pk)
+            with CaptureQueriesContext(connection) as start_queries:
+                session.start_session()
+            session.attendance_records.update(status='absent')
+            with CaptureQueriesContext(connection) as complete_queries:
+                session.complete_session()
+            return session, len(start_queries), len(complete_queries)
+
+        small, small_start, small_complete = run_session(date(2024, 10, 1))
+        for index in range(38):
+            student = User.objects.create_user(email=f"extra{index}@test.com", password=None, role="STUDENT")
+            StudentEnrollment.objects.create(
+                student=student, school_class=self.school_class, academic_year=self.academic_year
+            )
+        large, large_start, large_complete = run_session(date(2024, 10, 2))
+
+        self.assertEqual(small.attendance_records.count(), 2)
+        self.assertEqual(large.attendance_records.count(), 40)
+        self.assertEqual(StudentAbsenceFlag.objects.filter(attendance_record__attendance_session=large).count(), 40)
+        self.assertEqual(small_start, large_start)
+        self.assertEqual(small_complete, large_complete)
+
+    def test_start_session_keeps_existing_records(self):
+        """Records created before the session starts are neither duplicated nor reset"""
+        session = AttendanceSession.objects.create(
+            timetable_session=self.timetable_session, date=date.today(), teacher=self.teacher
+        )
+        AttendanceRecord.objects.create(
+            attendance_session=session, student=self.student1, status='late', marked_by=self.teacher
+        )
+
+        session.start_session()
+
+        self.assertEqual(session.attendance_records.count(), 2)
+        self.assertEqual(session.attendance_records.get(student=self.student1).status, 'late')
+
     def test_attendance_statistics(self):
         """Test attendance session statistics"""
         session = AttendanceSession.objects.create(
@@ -395,6 +443,7 @@ class StudentAbsenceFlagModelTest(TestCase):
 # API TESTS
 # =====================================
 
+@override_settings(ATTENDANCE_NOTIFICATIONS_ASYNC=False)
 class AttendanceAPITestCase(APITestCase):
     """Base test case for attendance API tests"""
     
@@ -517,6 +566,105 @@ class AttendanceSessionAPITest(AttendanceAPITestCase):
         )
         self.assertEqual(record.status, 'absent')
     
+    def test_bulk_mark_rejects_unknown_student_without_writing(self):
+        """Unknown students are reported up front and no record is changed"""
+        self.attendance_session.start_session()
+
+        self.client.force_authenticate(user=self.teacher)
+        url = f'/api/attendance/sessions/{self.attendance_session.id}/bulk_mark/'
+        data = {
+            'records': [
+                {'student_id': str(self.student.id), 'status': 'absent'},
+                {'student_id': '999999', 'status': 'absent'},
+            ]
+        }
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['missing_student_ids'], [999999])
+        record = AttendanceRecord.objects.get(attendance_session=self.attendance_session, student=self.student)
+        self.assertEqual(record.status, 'present')
+
+    def _add_students(self, session, count):
+        students = [
+            User.objects.create_user(
+                email=f"bulk{User.objects.count()}@test.com", password=None, role="STUDENT"
+            )
+            for _ in range(count)
+        ]
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(attendance_session=session, student=student, marked_by=session.teacher)
+            for student in students
+        ])
+        return students
+
+    def _bulk_mark_payload(self, students):
+        return {'records': [
+            {'student_id': str(student.id), 'status': 'late', 'arrival_time': '08:40', 'notes': 'bus'}
+            for student in students
+        ]}
+
+    def test_bulk_mark_query_count_is_independent_of_class_size(self):
+        """Benchmark: marking 3 or 35 students costs the same number of queries"""
+        self.attendance_session.start_session()
+        self.client.force_authenticate(user=self.teacher)
+        url = f'/api/attendance/sessions/{self.attendance_session.id}/bulk_mark/'
+
+        counts = []
+        for size in (3, 35):
+            students = self._add_students(self.attendance_session, size)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, self._bulk_mark_payload(students), format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['records']), size)
+            self.assertEqual(response.data['records'][0]['status'], 'late')
+            self.assertEqual(response.data['records'][0]['pending_flags_count'], 0)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(
+            AttendanceRecord.objects.filter(status='late', arrival_time=time(8, 40), notes='bus').count(), 38
+        )
+
+    def test_bulk_mark_load_200_teachers(self):
+        """Load benchmark: 200 teachers marking their period at the same time stay within a fixed query budget"""
+        students = [self.student] + [
+            User.objects.create_user(email=f"load{index}@test.com", password=None, role="STUDENT")
+            for index in range(29)
+        ]
+        sessions = []
+        for index in range(200):
+            teacher = User.objects.create_user(email=f"t{index}@test.com", password=None, role="TEACHER")
+            timetable_session = TimetableSession.objects.create(
+                timetable=self.timetable, subject=self.subject, teacher=teacher,
+                day_of_week=index % 6 + 1, session_order=index // 6 + 2,
+                start_time=time(10, 0), end_time=time(11, 0)
+            )
+            session = AttendanceSession.objects.create(
+                timetable_session=timetable_session, date=date.today(), teacher=teacher, status='in_progress'
+            )
+            sessions.append(session)
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(attendance_session=session, student=student, marked_by=session.teacher)
+            for session in sessions for student in students
+        ])
+
+        payload = self._bulk_mark_payload(students)
+        per_request = set()
+        for session in sessions:
+            self.client.force_authenticate(user=session.teacher)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    f'/api/attendance/sessions/{session.id}/bulk_mark/', payload, format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            per_request.add(len(queries))
+
+        self.assertEqual(len(per_request), 1)
+        # Including the lock taken by the daily stats refresh
+        self.assertLessEqual(per_request.pop(), 13)
+        self.assertEqual(AttendanceRecord.objects.filter(status='late').count(), 200 * 30)
+
     def test_complete_attendance_session(self):
         """Test completing attendance session"""
         self.attendance_session.start_session()
@@ -550,6 +698,86 @@ class AttendanceSessionAPITest(AttendanceAPITestCase):
         )
         self.assertEqual(notifications.count(), 1)
 
+class AbsenceNotificationFanOutTest(AttendanceAPITestCase):
+    """Test the absence notification fan-out run when a session is completed"""
+
+    def setUp(self):
+        super().setUp()
+        self.attendance_session = AttendanceSession.objects.create(
+            timetable_session=self.timetable_session,
+            date=date.today(),
+            teacher=self.teacher,
+            status='in_progress'
+        )
+        AttendanceRecord.objects.create(
+            attendance_session=self.attendance_session, student=self.student,
+            marked_by=self.teacher, status='absent'
+        )
+
+    def _add_absent_students(self, count):
+        for _ in range(count):
+            index = User.objects.count()
+            parent = User.objects.create_user(email=f"p{index}@test.com", password=None, role="PARENT")
+            student = User.objects.create_user(
+                email=f"s{index}@test.com", password=None, role="STUDENT", parent=parent
+            )
+            AttendanceRecord.objects.create(
+                attendance_session=self.attendance_session, student=student,
+                marked_by=self.teacher, status='absent'
+            )
+
+    def test_recipients(self):
+        """Staff, the student, related parents and the fallback User.parent are each notified once"""
+        fallback_parent = User.objects.create_user(email="fallback@test.com", password=None, role="PARENT")
+        self.student.parent = self.parent
+        self.student.save()
+        other = User.objects.create_user(
+            email="other@test.com", password=None, role="STUDENT", parent=fallback_parent
+        )
+        AttendanceRecord.objects.create(
+            attendance_session=self.attendance_session, student=other, marked_by=self.teacher, status='absent'
+        )
+
+        summary = absence_notifications.send_absence_notifications(self.attendance_session.id)
+
+        self.assertEqual(summary, {'absent_students': 2, 'notifications': 6, 'attendance_notifications': 2})
+        for recipient in (self.admin, self.student, self.parent, other, fallback_parent):
+            self.assertTrue(Notification.objects.filter(recipient=recipient).exists())
+        self.assertEqual(Notification.objects.filter(recipient=self.parent).count(), 1)
+        self.assertEqual(AttendanceNotification.objects.get(student=other).recipient, fallback_parent)
+
+    def test_fan_out_query_count_is_independent_of_absences(self):
+        """Benchmark: 1 or 12 absent students cost the same number of queries (one insert batch each)"""
+        for index in range(5):
+            User.objects.create_user(email=f"admin{index}@test.com", password=None, role="ADMIN")
+
+        counts = []
+        for extra in (0, 11):
+            AttendanceNotification.objects.all().delete()
+            Notification.objects.all().delete()
+            self._add_absent_students(extra)
+            with CaptureQueriesContext(connection) as queries:
+                summary = absence_notifications.send_absence_notifications(self.attendance_session.id)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        # 6 staff + the student + the parent, per absence
+        self.assertEqual(summary['notifications'], 12 * 8)
+        self.assertEqual(Notification.objects.count(), 12 * 8)
+        self.assertEqual(AttendanceNotification.objects.count(), 12)
+
+    @override_settings(ATTENDANCE_NOTIFICATIONS_ASYNC=True)
+    def test_complete_queues_the_fan_out_on_commit(self):
+        """With async enabled, completing a session queues the job instead of writing notifications"""
+        self.client.force_authenticate(user=self.teacher)
+        with mock.patch.object(absence_notifications, '_submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/api/attendance/sessions/{self.attendance_session.id}/complete/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        submit.assert_called_once_with(self.attendance_session.id)
+        self.assertFalse(Notification.objects.filter(recipient=self.parent).exists())
+
 class AbsenceFlagAPITest(AttendanceAPITestCase):
     """Test absence flag API endpoints"""
     
@@ -704,4 +932,164 @@ class AttendanceWorkflowIntegrationTest(AttendanceAPITestCase):
         self.assertEqual(statistics['total_sessions'], 1)
         self.assertEqual(statistics['excused_count'], 1)
         
-        print("Complete attendance workflow test passed!")
\ No newline at end of file
+        print("Complete attendance workflow test passed!")
+
+
+class AttendanceStatisticsTest(AttendanceAPITestCase):
+    """Test the daily statistics cube behind the attendance reports"""
+
+    def setUp(self):
+        super().setUp()
+        self.attendance_session = AttendanceSession.objects.create(
+            timetable_session=self.timetable_session,
+            date=date.today(),
+            teacher=self.teacher
+        )
+
+    def _add_session(self, day, students):
+        session = AttendanceSession.objects.create(
+            timetable_session=self.timetable_session, date=day, teacher=self.teacher
+        )
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(attendance_session=session, student=student, marked_by=self.teacher, status='absent')
+            for student in students
+        ])
+        # bulk_create skips the signals: bulk writers refresh the cube themselves
+        refresh_sessions([session.id])
+        return session
+
+    def test_cube_follows_record_writes(self):
+        """start_session, bulk_mark, save and delete all keep the cube in step with the records"""
+        self.attendance_session.start_session()
+        row = AttendanceDailyStat.objects.get(student=self.student)
+        self.assertEqual((row.total_count, row.present_count), (1, 1))
+        self.assertEqual(row.school_class_id, self.school_class.id)
+        self.assertEqual(row.grade_id, self.grade.id)
+
+        self.client.force_authenticate(user=self.teacher)
+        url = f'/api/attendance/sessions/{self.attendance_session.id}/bulk_mark/'
+        response = self.client.post(
+            url, {'records': [{'student_id': str(self.student.id), 'status': 'late'}]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Rows of a refreshed key are replaced, so they are fetched again
+        row = AttendanceDailyStat.objects.get(student=self.student)
+        self.assertEqual((row.present_count, row.late_count), (0, 1))
+
+        record = AttendanceRecord.objects.get(student=self.student)
+        record.status = 'excused'
+        record.save()
+        row = AttendanceDailyStat.objects.get(student=self.student)
+        self.assertEqual((row.late_count, row.excused_count), (0, 1))
+
+        record.delete()
+        self.assertFalse(AttendanceDailyStat.objects.exists())
+
+    def test_reports_read_the_cube(self):
+        """class and classes statistics aggregate the cube rows"""
+        self._add_session(date.today() - timedelta(days=7), [self.student])
+        self.attendance_session.start_session()
+
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.get('/api/attendance/reports/class_statistics/', {'class_id': self.school_class.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statistics = response.data['statistics'][0]
+        self.assertEqual(statistics['total_sessions'], 2)
+        self.assertEqual(statistics['present_count'], 1)
+        self.assertEqual(statistics['absent_count'], 1)
+        self.assertEqual(float(statistics['attendance_percentage']), 50.0)
+
+        response = self.client.get('/api/attendance/reports/classes_statistics/', {
+            'start_date': (date.today() - timedelta(days=1)).isoformat()
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['statistics'], [{
+            'class_id': self.school_class.id,
+            'class_name': self.school_class.name,
+            'grade_name': self.grade.name,
+            'total_sessions': 1,
+            'present_count': 1,
+            'absent_count': 0,
+            'late_count': 0,
+            'excused_count': 0,
+            'attendance_percentage': 100.0,
+        }])
+
+    def test_summary_status_filter(self):
+        """The summary keeps its counts and breakdowns when filtered by status"""
+        self._add_session(date.today() - timedelta(days=7), [self.student])
+        self.attendance_session.start_session()
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/attendance/records/summary/', {'status': 'absent'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_records'], 1)
+        self.assertEqual(response.data['total_sessions'], 1)
+        self.assertEqual(response.data['present_count'], 0)
+        self.assertEqual(response.data['top_absent_students'][0]['count'], 1)
+        self.assertEqual(response.data['top_late_students'], [])
+        self.assertEqual(response.data['teacher_stats'][0]['attendance_session__teacher_id'], self.teacher.id)
+        self.assertEqual(response.data['subject_stats'][0]['total_records'], 1)
+
+        response = self.client.get('/api/attendance/records/summary/')
+        self.assertEqual(response.data['total_records'], 2)
+        self.assertEqual(response.data['total_sessions'], 2)
+
+    def test_summary_and_list_apply_the_same_filters(self):
+        """The summary counts exactly the records the list returns for the same filters"""
+        self._add_session(date.today() - timedelta(days=7), [self.student])
+        self.attendance_session.start_session()
+
+        self.client.force_authenticate(user=self.admin)
+        for params in [
+            {},
+            {'status': 'absent'},
+            {'start_date': date.today().isoformat()},
+            {'class_id': self.school_class.id, 'teacher_id': self.teacher.id},
+            {'subject_id': self.subject.id, 'search': self.student.first_name},
+            {'student_id': self.student.id, 'end_date': (date.today() - timedelta(days=1)).isoformat()},
+        ]:
+            records = self.client.get('/api/attendance/records/', params).data
+            records = records['results'] if isinstance(records, dict) else records
+            summary = self.client.get('/api/attendance/records/summary/', params).data
+            self.assertEqual(summary['total_records'], len(records), params)
+
+    def test_rebuild_and_consistency_check(self):
+        """The rebuild reproduces the incremental cube and the check repairs drift"""
+        self._add_session(date.today() - timedelta(days=7), [self.student])
+        self.attendance_session.start_session()
+        expected = set(AttendanceDailyStat.objects.values_list('date', 'total_count', 'absent_count'))
+
+        self.assertEqual(rebuild(), 2)
+        self.assertEqual(set(AttendanceDailyStat.objects.values_list('date', 'total_count', 'absent_count')), expected)
+
+        AttendanceDailyStat.objects.filter(date=date.today()).update(present_count=5)
+        AttendanceDailyStat.objects.filter(date=date.today() - timedelta(days=7)).delete()
+        report = check_consistency(fix=True)
+        self.assertEqual((report['missing'], report['stale'], report['orphaned']), (1, 1, 0))
+        report = check_consistency()
+        self.assertEqual((report['missing'], report['stale'], report['orphaned']), (0, 0, 0))
+
+    def test_students_statistics_query_count_is_independent_of_history(self):
+        """Benchmark: the report costs the same number of queries for 1 or 20 weeks of records"""
+        students = [self.student] + [
+            User.objects.create_user(email=f"stat{index}@test.com", password=None, role="STUDENT")
+            for index in range(9)
+        ]
+        self.client.force_authenticate(user=self.admin)
+
+        counts = []
+        added = 0
+        for weeks in (1, 20):
+            for week in range(added + 1, weeks + 1):
+                self._add_session(date.today() - timedelta(days=7 * week), students)
+            added = weeks
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/attendance/reports/students_statistics/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['statistics']), 10)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(response.data['statistics'][0]['total_sessions'], 20)
+
@@ -6,15 +6,18 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.utils import timezone
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count, Avg, Sum, Max, Exists, OuterRef
 from datetime import date, datetime, timedelta
 from django.contrib.auth import get_user_model
 
 from .models import (
     SchoolTimetable, TimetableSession, AttendanceSession, AttendanceRecord,
-    StudentAbsenceFlag, StudentParentRelation, AttendanceNotification
+    StudentAbsenceFlag, StudentParentRelation, AttendanceNotification, AttendanceDailyStat
 )
+from .stats import STATUSES, sum_counts, refresh_sessions
+from .notifications import enqueue_absence_notifications
 from users.models import StudentEnrollment
+from schools.models import SchoolClass
 from .serializers import (
     # Timetable Serializers
     SchoolTimetableSerializer, SchoolTimetableCreateSerializer,
@@ -37,7 +40,10 @@ from .serializers import (
     # Notification and Statistics Serializers
     AttendanceNotificationSerializer, AttendanceStatisticsSerializer,
     ClassAttendanceReportSerializer, StudentAttendanceHistorySerializer,
-    TodaySessionsSerializer
+    TodaySessionsSerializer,
+
+    # Queryset helpers
+    with_record_details
 )
 
 User = get_user_model()
@@ -64,6 +70,33 @@ class IsTeacherOrAdmin(permissions.BasePermission):
         
         return False
 
+def _count_stats(row):
+    """Counts of an aggregated AttendanceDailyStat row, in the shape the statistics endpoints return"""
+    total = row['total_count'] or 0
+    present = row['present_count'] or 0
+    late = row['late_count'] or 0
+    return {
+        'total_sessions': total,
+        'present_count': present,
+        'absent_count': row['absent_count'] or 0,
+        'late_count': late,
+        'excused_count': row['excused_count'] or 0,
+        'attendance_percentage': round((present + late) / total * 100, 2) if total > 0 else 0,
+    }
+
+
+def _only_status(row, status_filter):
+    """Restrict aggregated counts to one status, as filtering records by status would"""
+    if not status_filter:
+        return row
+    row = dict(row)
+    for status_name in STATUSES:
+        if status_name != status_filter:
+            row[f'{status_name}_count'] = 0
+    row['total_count'] = row.get(f'{status_filter}_count') or 0
+    return row
+
+
 class IsStudentOwnerOrTeacherOrAdmin(permissions.BasePermission):
     """Permission for student owners, parents, teachers, admins, and management staff"""
     def has_permission(self, request, view):
@@ -446,8 +479,8 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
         # Complete the session
         session.complete_session()
         
-        # Send notifications to parents for absent students
-        self._send_absence_notifications(session)
+        # Notify staff, students and parents of the absences (fanned out in the background)
+        enqueue_absence_notifications(session.id)
         
         serializer = self.get_serializer(session)
         return Response({
@@ -492,144 +525,97 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
             session.start_session()
         
         records_data = serializer.validated_data['records']
-        updated_records = []
-        
+
+        # Validate every student up front: nothing is written if one is unknown
+        try:
+            student_ids = [int(record_data['student_id']) for record_data in records_data]
+        except ValueError:
+            return Response({'error': 'student_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        records_by_student = {
+            record.student_id: record
+            for record in AttendanceRecord.objects.filter(attendance_session=session, student_id__in=student_ids)
+        }
+        missing_ids = [student_id for student_id in student_ids if student_id not in records_by_student]
+        if missing_ids:
+            return Response({
+                'error': f'Student with ID {missing_ids[0]} not found in this session',
+                'missing_student_ids': missing_ids
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        for student_id, record_data in zip(student_ids, records_data):
+            record = records_by_student[student_id]
+            record.status = record_data['status']
+            record.marked_by = request.user
+            record.updated_at = now
+
+            # Handle arrival time for late students
+            if record_data['status'] == 'late' and 'arrival_time' in record_data:
+                record.arrival_time = record_data['arrival_time']
+
+            # Handle notes
+            if 'notes' in record_data:
+                record.notes = record_data['notes']
+
         with transaction.atomic():
-            for record_data in records_data:
-                try:
-                    record = AttendanceRecord.objects.get(
-                        attendance_session=session,
-                        student_id=record_data['student_id']
-                    )
-                    record.status = record_data['status']
-                    record.marked_by = request.user
-                    
-                    # Handle arrival time for late students
-                    if record_data['status'] == 'late' and 'arrival_time' in record_data:
-                        record.arrival_time = record_data['arrival_time']
-                    
-                    # Handle notes
-                    if 'notes' in record_data:
-                        record.notes = record_data['notes']
-                    
-                    record.save()
-                    updated_records.append(record)
-                    
-                except AttendanceRecord.DoesNotExist:
-                    return Response({
-                        'error': f'Student with ID {record_data["student_id"]} not found in this session'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-        
+            AttendanceRecord.objects.bulk_update(
+                records_by_student.values(),
+                ['status', 'marked_by', 'arrival_time', 'notes', 'updated_at']
+            )
+            # bulk_update bypasses post_save: refresh the statistics cube once
+            refresh_sessions([session.id])
+
+        # Reload once with everything the serializer reads, in request order
+        updated_ids = list(dict.fromkeys(student_ids))
+        reloaded = {
+            record.student_id: record
+            for record in with_record_details(
+                AttendanceRecord.objects.filter(attendance_session=session, student_id__in=updated_ids)
+            )
+        }
+        updated_records = [reloaded[student_id] for student_id in updated_ids]
+
         serializer = AttendanceRecordSerializer(updated_records, many=True)
         return Response({
             'message': f'Updated {len(updated_records)} attendance records',
             'records': serializer.data
         })
     
-    def _send_absence_notifications(self, session):
-        """Send notifications to admins, supervisors, students, and parents for absent students"""
-        from communication.models import Notification
-        
-        absent_records = session.attendance_records.filter(status='absent')
-        if not absent_records.exists():
-            return
-
-        subject_name = session.timetable_session.subject.name
-        session_date = session.date
-        
-        # Get Admins and General Supervisors
-        staff_recipients = User.objects.filter(
-            Q(role='ADMIN') | Q(role='STAFF', profile__position='GENERAL_SUPERVISOR'),
-            is_active=True
-        ).distinct()
-        
-        for record in absent_records:
-            student_name = record.student.full_name
-            title = f"Absence Alert: {student_name}"
-            message = f"the student {student_name} is absent in the session :{subject_name}"
-            
-            # 1. Notify Admins and General Supervisors
-            for staff in staff_recipients:
-                Notification.objects.create(
-                    recipient=staff,
-                    title=title,
-                    message=message,
-                    notification_type=Notification.Type.SYSTEM,
-                    related_object_id=record.id,
-                    related_object_type='attendance_record'
-                )
-            
-            # 2. Notify the Student
-            if record.student.is_active:
-                Notification.objects.create(
-                    recipient=record.student,
-                    title="Absence Alert",
-                    message=f"You were marked absent in the session :{subject_name} on {session_date}",
-                    notification_type=Notification.Type.SYSTEM,
-                    related_object_id=record.id,
-                    related_object_type='attendance_record'
-                )
-
-            # 3. Notify Parents
-            parent_relations = StudentParentRelation.objects.filter(
-                student=record.student,
-                is_active=True,
-                notify_absence=True
-            ).select_related('parent')
-            
-            # Keep track of parents already notified to avoid duplicates
-            notified_parent_ids = set()
-
-            for relation in parent_relations:
-                # Create legacy AttendanceNotification (for specific reports/history)
-                AttendanceNotification.objects.create(
-                    recipient=relation.parent,
-                    student=record.student,
-                    notification_type='absence',
-                    title=f"إخطار غياب - Absence Alert: {student_name}",
-                    message=f"تم تسجيل غياب {student_name} في حصة {subject_name} بتاريخ {session_date}",
-                    attendance_record=record
-                )
-                
-                # Create communication.Notification for the bell icon
-                Notification.objects.create(
-                    recipient=relation.parent,
-                    title=title,
-                    message=message,
-                    notification_type=Notification.Type.SYSTEM,
-                    related_object_id=record.id,
-                    related_object_type='attendance_record'
-                )
-                notified_parent_ids.add(relation.parent.id)
-
-            # Fallback: Notify the parent linked directly to the student if not already notified
-            if record.student.parent and record.student.parent.id not in notified_parent_ids:
-                parent = record.student.parent
-                
-                # Create legacy AttendanceNotification (for specific reports/history)
-                AttendanceNotification.objects.create(
-                    recipient=parent,
-                    student=record.student,
-                    notification_type='absence',
-                    title=f"إخطار غياب - Absence Alert: {student_name}",
-                    message=f"تم تسجيل غياب {student_name} في حصة {subject_name} بتاريخ {session_date}",
-                    attendance_record=record
-                )
-                
-                # Create communication.Notification for the bell icon
-                Notification.objects.create(
-                    recipient=parent,
-                    title=title,
-                    message=message,
-                    notification_type=Notification.Type.SYSTEM,
-                    related_object_id=record.id,
-                    related_object_type='attendance_record'
-                )
-    
 # =====================================
 # ATTENDANCE RECORD VIEWSET
 # =====================================
 
+# Field paths of the attendance filters on each model (AttendanceRecordViewSet._filters)
+_CLASS_PATH = 'attendance_session__timetable_session__timetable__school_class'
+_RECORD_PATHS = {
+    'student': 'student',
+    'date': 'attendance_session__date',
+    'school_class': _CLASS_PATH,
+    'grade': f'{_CLASS_PATH}__grade',
+    'track': f'{_CLASS_PATH}__track',
+    'subject': 'attendance_session__timetable_session__subject',
+    'teacher': 'attendance_session__teacher',
+}
+_STAT_PATHS = {
+    'student': 'student',
+    'date': 'date',
+    'school_class': 'school_class',
+    'grade': 'grade',
+    'track': 'track',
+    'subject': 'subject',
+    'teacher': 'teacher',
+}
+_SESSION_PATHS = {
+    'date': 'date',
+    'school_class': 'timetable_session__timetable__school_class',
+    'grade': 'timetable_session__timetable__school_class__grade',
+    'track': 'timetable_session__timetable__school_class__track',
+    'subject': 'timetable_session__subject',
+    'teacher': 'teacher',
+}
+
+
 class AttendanceRecordViewSet(viewsets.ModelViewSet):
     """ViewSet for attendance records"""
     queryset = AttendanceRecord.objects.all()
@@ -647,96 +633,89 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             'marked_by'
         )
         
-        # Students can only see their own records
-        if self.request.user.role == 'STUDENT':
-            queryset = queryset.filter(student=self.request.user)
-        
-        # Parents can see their children's records
-        elif self.request.user.role == 'PARENT':
-            child_ids = StudentParentRelation.objects.filter(
-                parent=self.request.user, is_active=True
-            ).values_list('student_id', flat=True)
-            
-            queryset = queryset.filter(
-                Q(student_id__in=child_ids) | Q(student__parent=self.request.user)
-            )
-        
-        # Filter by student
-        student_id = self.request.query_params.get('student_id')
-        if student_id:
-            queryset = queryset.filter(student_id=student_id)
-        
-        # Filter by date range
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        
-        if start_date:
-            queryset = queryset.filter(attendance_session__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(attendance_session__date__lte=end_date)
-        
-        # Filter by status
-        status_filter = self.request.query_params.get('status')
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-
-        # Additional contextual filters
-        class_id = self.request.query_params.get('class_id')
-        if class_id:
-            queryset = queryset.filter(
-                attendance_session__timetable_session__timetable__school_class_id=class_id
-            )
-
-        grade_id = self.request.query_params.get('grade_id')
-        if grade_id:
-            queryset = queryset.filter(
-                attendance_session__timetable_session__timetable__school_class__grade_id=grade_id
-            )
+        queryset = queryset.filter(self._filters(_RECORD_PATHS, status_q=lambda value: Q(status=value)))
+        return queryset.order_by('-attendance_session__date')
 
-        track_id = self.request.query_params.get('track_id')
-        if track_id:
-            queryset = queryset.filter(
-                attendance_session__timetable_session__timetable__school_class__track_id=track_id
-            )
+    def _filters(self, paths, status_q=None):
+        """
+        Q of the list filters and of the user's visibility over one model: `paths` names the
+        fields of each dimension (see _RECORD_PATHS). Dimensions missing from `paths` are not
+        filtered; `status_q` translates the status filter.
+        """
+        params = self.request.query_params
+        user = self.request.user
+        query = Q()
 
-        subject_id = self.request.query_params.get('subject_id')
-        if subject_id:
-            queryset = queryset.filter(
-                attendance_session__timetable_session__subject_id=subject_id
+        student = paths.get('student')
+        if student:
+            # Students can only see their own records, parents their children's
+            if user.role == 'STUDENT':
+                query &= Q(**{student: user})
+            elif user.role == 'PARENT':
+                if not hasattr(self, '_child_ids'):
+                    self._child_ids = list(StudentParentRelation.objects.filter(
+                        parent=user, is_active=True
+                    ).values_list('student_id', flat=True))
+                query &= Q(**{f'{student}_id__in': self._child_ids}) | Q(**{f'{student}__parent': user})
+
+            student_id = params.get('student_id')
+            if student_id:
+                query &= Q(**{f'{student}_id': student_id})
+
+        start_date = params.get('start_date')
+        if start_date:
+            query &= Q(**{f"{paths['date']}__gte": start_date})
+        end_date = params.get('end_date')
+        if end_date:
+            query &= Q(**{f"{paths['date']}__lte": end_date})
+
+        status_filter = params.get('status')
+        if status_filter and status_q:
+            query &= status_q(status_filter)
+
+        for param, dimension in (
+            ('class_id', 'school_class'), ('grade_id', 'grade'), ('track_id', 'track'),
+            ('subject_id', 'subject'), ('teacher_id', 'teacher'),
+        ):
+            value = params.get(param)
+            if value:
+                query &= Q(**{f'{paths[dimension]}_id': value})
+
+        search = params.get('search')
+        if search and student:
+            query &= (
+                Q(**{f'{student}__first_name__icontains': search})
+                | Q(**{f'{student}__last_name__icontains': search})
+                | Q(**{f'{student}__profile__ar_first_name__icontains': search})
+                | Q(**{f'{student}__profile__ar_last_name__icontains': search})
+                | Q(**{f"{paths['school_class']}__name__icontains": search})
             )
 
-        teacher_id = self.request.query_params.get('teacher_id')
-        if teacher_id:
-            queryset = queryset.filter(attendance_session__teacher_id=teacher_id)
+        return query
 
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(student__first_name__icontains=search)
-                | Q(student__last_name__icontains=search)
-                | Q(student__profile__ar_first_name__icontains=search)
-                | Q(student__profile__ar_last_name__icontains=search)
-                | Q(attendance_session__timetable_session__timetable__school_class__name__icontains=search)
-            )
-        
-        return queryset.order_by('-attendance_session__date')
+    def _summary_filters(self):
+        """
+        The list filters as a Q on AttendanceDailyStat, a Q on AttendanceRecord and a Q on
+        AttendanceSession (the latter two for counting the sessions holding matching records).
+        """
+        status_filter = self.request.query_params.get('status')
+        # Unknown statuses match nothing, like filtering records would
+        stat_q = self._filters(_STAT_PATHS, status_q=lambda value: (
+            Q(**{f'{value}_count__gt': 0}) if value in STATUSES else Q(pk__in=[])
+        ))
+        record_q = self._filters(_RECORD_PATHS, status_q=lambda value: Q(status=value))
+        session_q = self._filters(_SESSION_PATHS)
+        return stat_q, record_q, session_q, status_filter
 
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        """Get aggregate summary for attendance records based on filters"""
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        from django.db.models import Count, Q
-        
-        stats = queryset.aggregate(
-            total_records=Count('id'),
-            present_count=Count('id', filter=Q(status='present')),
-            absent_count=Count('id', filter=Q(status='absent')),
-            late_count=Count('id', filter=Q(status='late')),
-            excused_count=Count('id', filter=Q(status='excused'))
-        )
-        
-        total = stats['total_records'] or 0
+        """Get aggregate summary for attendance records based on filters (read from the daily stats cube)"""
+        stat_q, record_q, session_q, status_filter = self._summary_filters()
+        stats_rows = AttendanceDailyStat.objects.filter(stat_q)
+        count_field = f'{status_filter}_count' if status_filter in STATUSES else 'total_count'
+
+        stats = _only_status(stats_rows.aggregate(**sum_counts()), status_filter)
+        total = stats['total_count'] or 0
         present = stats['present_count'] or 0
         absent = stats['absent_count'] or 0
         late = stats['late_count'] or 0
@@ -747,47 +726,52 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
         late_rate = round((late / total * 100), 1) if total > 0 else 0
         excused_rate = round((excused / total * 100), 1) if total > 0 else 0
         
-        # Get unique sessions count
-        total_sessions = queryset.values('attendance_session_id').distinct().count()
+        # Get unique sessions count: sessions holding at least one matching record
+        total_sessions = AttendanceSession.objects.filter(session_q).filter(
+            Exists(AttendanceRecord.objects.filter(record_q, attendance_session=OuterRef('pk')))
+        ).count()
+
+        def top_students(status_name):
+            if status_filter and status_filter != status_name:
+                return []
+            return list(
+                stats_rows.filter(**{f'{status_name}_count__gt': 0}).values(
+                    'student_id', 'student__first_name', 'student__last_name'
+                ).annotate(
+                    count=Sum(f'{status_name}_count')
+                ).order_by('-count')[:5]
+            )
 
-        # Top absent students
-        top_absent = queryset.filter(status='absent').values(
-            'student_id', 'student__first_name', 'student__last_name'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:5]
-        
-        # Top late students
-        top_late = queryset.filter(status='late').values(
-            'student_id', 'student__first_name', 'student__last_name'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:5]
+        def breakdown(fields, keys):
+            rows = stats_rows.values(*fields).annotate(**sum_counts()).order_by(f'-{count_field}')[:10]
+            results = []
+            for row in rows:
+                row = _only_status(row, status_filter)
+                entry = {key: row[field] for field, key in zip(fields, keys)}
+                entry.update({
+                    'total_records': row['total_count'],
+                    'present_count': row['present_count'],
+                    'absent_count': row['absent_count'],
+                    'late_count': row['late_count'],
+                    'excused_count': row['excused_count'],
+                })
+                results.append(entry)
+            return results
 
         # Teacher breakdown (for admin overview)
-        teacher_stats = queryset.values(
-            'attendance_session__teacher_id', 
-            'attendance_session__teacher__first_name', 
-            'attendance_session__teacher__last_name'
-        ).annotate(
-            total_records=Count('id'),
-            present_count=Count('id', filter=Q(status='present')),
-            absent_count=Count('id', filter=Q(status='absent')),
-            late_count=Count('id', filter=Q(status='late')),
-            excused_count=Count('id', filter=Q(status='excused'))
-        ).order_by('-total_records')[:10]
+        teacher_stats = breakdown(
+            ['teacher_id', 'teacher__first_name', 'teacher__last_name'],
+            ['attendance_session__teacher_id',
+             'attendance_session__teacher__first_name',
+             'attendance_session__teacher__last_name']
+        )
 
         # Subject breakdown (for admin overview)
-        subject_stats = queryset.values(
-            'attendance_session__timetable_session__subject_id', 
-            'attendance_session__timetable_session__subject__name'
-        ).annotate(
-            total_records=Count('id'),
-            present_count=Count('id', filter=Q(status='present')),
-            absent_count=Count('id', filter=Q(status='absent')),
-            late_count=Count('id', filter=Q(status='late')),
-            excused_count=Count('id', filter=Q(status='excused'))
-        ).order_by('-total_records')[:10]
+        subject_stats = breakdown(
+            ['subject_id', 'subject__name'],
+            ['attendance_session__timetable_session__subject_id',
+             'attendance_session__timetable_session__subject__name']
+        )
 
         return Response({
             'total_records': total,
@@ -800,10 +784,10 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             'absence_rate': absence_rate,
             'late_rate': late_rate,
             'excused_rate': excused_rate,
-            'top_absent_students': list(top_absent),
-            'top_late_students': list(top_late),
-            'teacher_stats': list(teacher_stats),
-            'subject_stats': list(subject_stats),
+            'top_absent_students': top_students('absent'),
+            'top_late_students': top_students('late'),
+            'teacher_stats': teacher_stats,
+            'subject_stats': subject_stats,
         })
 
     @action(detail=False, methods=['get'], url_path='student-statistics/(?P<student_id>[^/.]+)')
@@ -1172,45 +1156,24 @@ class AttendanceReportsViewSet(viewsets.ViewSet):
             return Response({'error': 'class_id is required'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        # Build query
-        query = Q(
-            attendance_session__timetable_session__timetable__school_class_id=class_id
-        )
-        
+        rows = AttendanceDailyStat.objects.filter(school_class_id=class_id)
         if start_date:
-            query &= Q(attendance_session__date__gte=start_date)
+            rows = rows.filter(date__gte=start_date)
         if end_date:
-            query &= Q(attendance_session__date__lte=end_date)
-        
-        # Get statistics
-        records = AttendanceRecord.objects.filter(query).select_related('student')
-        
+            rows = rows.filter(date__lte=end_date)
+
         # Group by student
+        per_student = list(rows.values('student_id').annotate(**sum_counts()).order_by())
+        students = User.objects.select_related('profile').in_bulk([row['student_id'] for row in per_student])
+
         student_stats = {}
-        for record in records:
-            student_id = record.student.id
-            if student_id not in student_stats:
-                student_stats[student_id] = {
-                    'student_id': student_id,
-                    'student_name': record.student.full_name,
-                    'total_sessions': 0,
-                    'present_count': 0,
-                    'absent_count': 0,
-                    'late_count': 0,
-                    'excused_count': 0
-                }
-            
-            student_stats[student_id]['total_sessions'] += 1
-            student_stats[student_id][f'{record.status}_count'] += 1
-        
-        # Calculate percentages
-        for stats in student_stats.values():
-            if stats['total_sessions'] > 0:
-                stats['attendance_percentage'] = round(
-                    (stats['present_count'] + stats['late_count']) / stats['total_sessions'] * 100, 2
-                )
-            else:
-                stats['attendance_percentage'] = 0
+        for row in per_student:
+            student_id = row['student_id']
+            student_stats[student_id] = {
+                'student_id': student_id,
+                'student_name': students[student_id].full_name,
+                **_count_stats(row)
+            }
         
         serializer = AttendanceStatisticsSerializer(list(student_stats.values()), many=True)
         return Response({'statistics': serializer.data})
@@ -1318,18 +1281,18 @@ class AttendanceReportsViewSet(viewsets.ViewSet):
         end_date = request.query_params.get('end_date')
         search = request.query_params.get('search')
 
-        # Build query for attendance records
+        # Build query on the daily stats cube
         query = Q()
         if grade_id and grade_id != 'all':
-            query &= Q(attendance_session__timetable_session__timetable__school_class__grade_id=grade_id)
+            query &= Q(grade_id=grade_id)
         if class_id and class_id != 'all':
-            query &= Q(attendance_session__timetable_session__timetable__school_class_id=class_id)
+            query &= Q(school_class_id=class_id)
         if track_id and track_id != 'all':
-            query &= Q(attendance_session__timetable_session__timetable__school_class__track_id=track_id)
+            query &= Q(track_id=track_id)
         if start_date:
-            query &= Q(attendance_session__date__gte=start_date)
+            query &= Q(date__gte=start_date)
         if end_date:
-            query &= Q(attendance_session__date__lte=end_date)
+            query &= Q(date__lte=end_date)
         if search:
             query &= (
                 Q(student__first_name__icontains=search) |
@@ -1338,44 +1301,31 @@ class AttendanceReportsViewSet(viewsets.ViewSet):
                 Q(student__profile__ar_last_name__icontains=search)
             )
 
-        # Get records
-        records = AttendanceRecord.objects.filter(query).select_related(
-            'student', 
-            'attendance_session__timetable_session__timetable__school_class__grade',
-            'attendance_session__timetable_session__timetable__school_class__track'
+        # Group by student
+        per_student = list(
+            AttendanceDailyStat.objects.filter(query)
+            .values('student_id')
+            .annotate(class_id=Max('school_class_id'), **sum_counts())
+            .order_by('student__last_name', 'student__first_name')
+        )
+        students = User.objects.select_related('profile').in_bulk([row['student_id'] for row in per_student])
+        classes = SchoolClass.objects.select_related('grade', 'track').in_bulk(
+            {row['class_id'] for row in per_student}
         )
 
-        # Group by student
         student_stats = {}
-        for record in records:
-            student_id = record.student.id
-            if student_id not in student_stats:
-                student_stats[student_id] = {
-                    'student_id': student_id,
-                    'student_name': record.student.full_name,
-                    'student_ar_name': f"{record.student.profile.ar_first_name} {record.student.profile.ar_last_name}" if hasattr(record.student, 'profile') else "",
-                    'class_name': record.attendance_session.timetable_session.timetable.school_class.name,
-                    'grade_name': record.attendance_session.timetable_session.timetable.school_class.grade.name,
-                    'track_name': record.attendance_session.timetable_session.timetable.school_class.track.name if record.attendance_session.timetable_session.timetable.school_class.track else "",
-                    'total_sessions': 0,
-                    'present_count': 0,
-                    'absent_count': 0,
-                    'late_count': 0,
-                    'excused_count': 0
-                }
-            
-            student_stats[student_id]['total_sessions'] += 1
-            student_stats[student_id][f'{record.status}_count'] += 1
-        
-        # Calculate percentages
-        from decimal import Decimal
-        for stats in student_stats.values():
-            if stats['total_sessions'] > 0:
-                stats['attendance_percentage'] = round(
-                    (stats['present_count'] + stats['late_count']) / stats['total_sessions'] * 100, 2
-                )
-            else:
-                stats['attendance_percentage'] = 0
+        for row in per_student:
+            student = students[row['student_id']]
+            school_class = classes[row['class_id']]
+            student_stats[student.id] = {
+                'student_id': student.id,
+                'student_name': student.full_name,
+                'student_ar_name': f"{student.profile.ar_first_name} {student.profile.ar_last_name}" if hasattr(student, 'profile') else "",
+                'class_name': school_class.name,
+                'grade_name': school_class.grade.name,
+                'track_name': school_class.track.name if school_class.track else "",
+                **_count_stats(row)
+            }
         
         return Response({'statistics': list(student_stats.values())})
 
@@ -1387,49 +1337,29 @@ class AttendanceReportsViewSet(viewsets.ViewSet):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
 
-        # Build query
+        # Build query on the daily stats cube
         query = Q()
         if grade_id and grade_id != 'all':
-            query &= Q(attendance_session__timetable_session__timetable__school_class__grade_id=grade_id)
+            query &= Q(grade_id=grade_id)
         if track_id and track_id != 'all':
-            query &= Q(attendance_session__timetable_session__timetable__school_class__track_id=track_id)
+            query &= Q(track_id=track_id)
         if start_date:
-            query &= Q(attendance_session__date__gte=start_date)
+            query &= Q(date__gte=start_date)
         if end_date:
-            query &= Q(attendance_session__date__lte=end_date)
-        
-        # Get records
-        records = AttendanceRecord.objects.filter(query).select_related(
-            'attendance_session__timetable_session__timetable__school_class__grade'
-        )
+            query &= Q(date__lte=end_date)
 
         # Group by class
+        per_class = list(AttendanceDailyStat.objects.filter(query).values('school_class_id').annotate(**sum_counts()).order_by())
+        classes = SchoolClass.objects.select_related('grade').in_bulk([row['school_class_id'] for row in per_class])
+
         class_stats = {}
-        for record in records:
-            class_obj = record.attendance_session.timetable_session.timetable.school_class
-            class_id = class_obj.id
-            if class_id not in class_stats:
-                class_stats[class_id] = {
-                    'class_id': class_id,
-                    'class_name': class_obj.name,
-                    'grade_name': class_obj.grade.name,
-                    'total_sessions': 0,
-                    'present_count': 0,
-                    'absent_count': 0,
-                    'late_count': 0,
-                    'excused_count': 0
-                }
-            
-            class_stats[class_id]['total_sessions'] += 1
-            class_stats[class_id][f'{record.status}_count'] += 1
-        
-        # Calculate percentages
-        for stats in class_stats.values():
-            if stats['total_sessions'] > 0:
-                stats['attendance_percentage'] = round(
-                    (stats['present_count'] + stats['late_count']) / stats['total_sessions'] * 100, 2
-                )
-            else:
-                stats['attendance_percentage'] = 0
+        for row in per_class:
+            class_obj = classes[row['school_class_id']]
+            class_stats[class_obj.id] = {
+                'class_id': class_obj.id,
+                'class_name': class_obj.name,
+                'grade_name': class_obj.grade.name,
+                **_count_stats(row)
+            }
         
         return Response({'statistics': list(class_stats.values())})
@@ -0,0 +1,79 @@
+"""
+Announcement delivery.
+
+Recipients are streamed as ids and their notifications are inserted with bulk_create one
+chunk at a time, so an announcement reaches every targeted user (the signal used to stop at
+the first 500) with a number of queries proportional to recipients / chunk size and bounded
+memory. bulk_create bypasses the Notification post_save receiver, so each chunk updates the
+recipients' unread counters itself (communication.unread).
+"""
+from django.apps import apps
+from django.db import transaction
+
+from users.models import User
+from .models import Notification
+from .unread import notifications_created
+
+DELIVERY_CHUNK_SIZE = 2000
+
+# Announcement.TargetRole -> User.Role
+ROLE_MAP = {
+    'PARENTS': 'PARENT',
+    'TEACHERS': 'TEACHER',
+    'STUDENTS': 'STUDENT'
+}
+
+
+def announcement_recipients(announcement):
+    """Queryset of the users an announcement is delivered to."""
+    if announcement.target_role == 'ALL':
+        recipients = User.objects.filter(is_active=True)
+    else:
+        user_role = ROLE_MAP.get(announcement.target_role)
+        if not user_role:
+            return User.objects.none()
+        recipients = User.objects.filter(role=user_role, is_active=True)
+
+    # Filter by grade if specified (only for students)
+    if announcement.target_grade_id and announcement.target_role == 'STUDENTS':
+        StudentEnrollment = apps.get_model('users', 'StudentEnrollment')
+        student_ids = StudentEnrollment.objects.filter(
+            school_class__grade_id=announcement.target_grade_id,
+            is_active=True
+        ).values_list('student_id', flat=True)
+        recipients = recipients.filter(id__in=student_ids)
+
+    # Exclude creator
+    if announcement.created_by_id:
+        recipients = recipients.exclude(id=announcement.created_by_id)
+    return recipients
+
+
+def deliver_announcement(announcement, chunk_size=DELIVERY_CHUNK_SIZE):
+    """Create the announcement notification of every recipient. Returns the number delivered."""
+    title = f"New Announcement: {announcement.title}"
+    message = announcement.content[:100] + ('...' if len(announcement.content) > 100 else '')
+
+    recipient_ids = announcement_recipients(announcement).order_by('id').values_list('id', flat=True)
+    delivered = 0
+    chunk = []
+    with transaction.atomic():
+        for recipient_id in recipient_ids.iterator(chunk_size=chunk_size):
+            chunk.append(Notification(
+                recipient_id=recipient_id,
+                title=title,
+                message=message,
+                notification_type=Notification.Type.ANNOUNCEMENT,
+                related_object_id=announcement.id,
+                related_object_type='announcement'
+            ))
+            if len(chunk) >= chunk_size:
+                Notification.objects.bulk_create(chunk)
+                notifications_created(notification.recipient_id for notification in chunk)
+                delivered += len(chunk)
+                chunk = []
+        if chunk:
+            Notification.objects.bulk_create(chunk)
+            notifications_created(notification.recipient_id for notification in chunk)
+            delivered += len(chunk)
+    return delivered
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0002_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'is_read', 'created_at'], name='notif_recipient_read_idx'),
+        ),
+    ]
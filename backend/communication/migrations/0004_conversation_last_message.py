@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_last_message(apps, schema_editor):
+    Conversation = apps.get_model('communication', 'Conversation')
+    Message = apps.get_model('communication', 'Message')
+    latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at', '-id')
+    Conversation.objects.update(
+        last_message=Subquery(latest.values('id')[:1]),
+        last_message_at=Subquery(latest.values('created_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0003_notification_notif_recipient_read_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='communication.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
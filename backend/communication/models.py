@@ -10,12 +10,22 @@ class Conversation(models.Model):
     participants = models.ManyToManyField(User, related_name='conversations')
     conversation_type = models.CharField(max_length=20, choices=Type.choices, default=Type.DIRECT)
     related_student = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='related_conversations', help_text="For parent-teacher chats about a specific student")
+    # Denormalized from Message (kept by communication.signals) so the inbox needs no message scan
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Conversation {self.id} ({self.get_conversation_type_display()})"
 
+    def refresh_last_message(self):
+        """Recompute last_message/last_message_at from the conversation's messages."""
+        last = self.messages.order_by('-created_at', '-id').first()
+        Conversation.objects.filter(pk=self.pk).update(
+            last_message=last, last_message_at=last.created_at if last else None
+        )
+
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
@@ -26,6 +36,10 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination of a thread and the incremental "since" sync
+            models.Index(fields=['conversation', 'created_at', 'id'], name='message_thread_keyset_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender} at {self.created_at}"
@@ -68,6 +82,10 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread counts and the cursor-paginated feed of one recipient
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notif_recipient_read_idx'),
+        ]
 
     def __str__(self):
         return f"Notification for {self.recipient}: {self.title}"
@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination
+
+
+class NotificationFeedPagination(CursorPagination):
+    """
+    Keyset pagination for the notification feed: pages are read from the
+    (recipient, is_read, created_at) index instead of counting and offsetting.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class MessageHistoryPagination(CursorPagination):
+    """
+    Keyset pagination of a message thread, newest first, over the
+    (conversation, created_at, id) index: older pages cost the same as the first.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
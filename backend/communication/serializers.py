@@ -29,13 +29,14 @@ class ConversationSerializer(serializers.ModelSerializer):
         fields = ['id', 'participants', 'conversation_type', 'related_student', 'created_at', 'updated_at', 'last_message', 'unread_count']
 
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        # print(f"DEBUG: Conv {obj.id} Participants: {[p.email for p in obj.participants.all()]} Last Msg: {last_msg.content if last_msg else 'None'}")
-        if last_msg:
-            return MessageSerializer(last_msg).data
+        # Denormalized on the conversation; ConversationViewSet select_relates it with the sender profile
+        if obj.last_message_id:
+            return MessageSerializer(obj.last_message).data
         return None
 
     def get_unread_count(self, obj):
+        if hasattr(obj, 'unread_messages_count'):
+            return obj.unread_messages_count
         request = self.context.get('request')
         if request and request.user:
             return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
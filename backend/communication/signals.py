@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.apps import apps
 from .models import Message, Announcement, Notification, Conversation
+from .delivery import deliver_announcement
+from . import unread
 from users.models import User
 
 @receiver(post_save, sender=Message)
@@ -10,6 +12,11 @@ def create_message_notification(sender, instance, created, **kwargs):
         # Notify all other participants in the conversation
         conversation = instance.conversation
         sender_user = instance.sender
+
+        # Keep the conversation's denormalized last message current
+        Conversation.objects.filter(pk=conversation.pk).update(
+            last_message=instance, last_message_at=instance.created_at
+        )
         
         # Get other participants
         recipients = conversation.participants.exclude(id=sender_user.id)
@@ -24,53 +31,31 @@ def create_message_notification(sender, instance, created, **kwargs):
                 related_object_type='conversation'
             )
 
+@receiver(post_delete, sender=Message)
+def refresh_conversation_last_message(sender, instance, origin=None, **kwargs):
+    # Nothing to refresh when the whole conversation is being deleted
+    if isinstance(origin, Conversation) or getattr(origin, 'model', None) is Conversation:
+        return
+    conversation = Conversation.objects.filter(pk=instance.conversation_id).first()
+    # SET_NULL has already cleared last_message if the deleted message was the last one
+    if conversation and conversation.last_message_id is None:
+        conversation.refresh_last_message()
+
+@receiver(post_save, sender=Notification)
+def count_created_notification(sender, instance, created, **kwargs):
+    # Keep the recipient's unread counter in step (bulk writers call unread.notifications_created)
+    if created and not instance.is_read:
+        unread.notifications_created([instance.recipient_id])
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    unread.invalidate([instance.recipient_id])
+
 @receiver(post_save, sender=Announcement)
 def create_announcement_notification(sender, instance, created, **kwargs):
     if created and instance.is_published:
-        # Determine recipients
-        recipients = User.objects.none()
-        
-        if instance.target_role == 'ALL':
-            recipients = User.objects.filter(is_active=True)
-        else:
-            # Map target_role to User.Role
-            # Announcement.TargetRole: PARENTS, TEACHERS, STUDENTS
-            # User.Role: PARENT, TEACHER, STUDENT
-            role_map = {
-                'PARENTS': 'PARENT',
-                'TEACHERS': 'TEACHER',
-                'STUDENTS': 'STUDENT'
-            }
-            user_role = role_map.get(instance.target_role)
-            if user_role:
-                recipients = User.objects.filter(role=user_role, is_active=True)
-        
-        # Filter by grade if specified (only for students)
-        if instance.target_grade and instance.target_role == 'STUDENTS':
-            # This requires checking StudentEnrollment
-            StudentEnrollment = apps.get_model('users', 'StudentEnrollment')
-            student_ids = StudentEnrollment.objects.filter(
-                school_class__grade=instance.target_grade,
-                is_active=True
-            ).values_list('student_id', flat=True)
-            recipients = recipients.filter(id__in=student_ids)
-
-        # Exclude creator
-        if instance.created_by:
-            recipients = recipients.exclude(id=instance.created_by.id)
-            
-        # Create notifications in bulk? No, loop for now to be safe with signals
-        # For large numbers, this should be a background task (Celery)
-        # We'll limit to 500 for safety in this synchronous implementation
-        for recipient in recipients[:500]:
-            Notification.objects.create(
-                recipient=recipient,
-                title=f"New Announcement: {instance.title}",
-                message=instance.content[:100] + ('...' if len(instance.content) > 100 else ''),
-                notification_type=Notification.Type.ANNOUNCEMENT,
-                related_object_id=instance.id,
-                related_object_type='announcement'
-            )
+        # Every recipient is notified, in chunked bulk inserts
+        deliver_announcement(instance)
 
 # We'll import Homework here. If it fails, we might need to move this.
 try:
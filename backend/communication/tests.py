@@ -1,3 +1,274 @@
+import os
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from users import presence
+from users.models import User
+from .delivery import deliver_announcement
+from .models import Announcement, Conversation, Message, Notification
+
+
+
+class AnnouncementDeliveryTest(TestCase):
+    """Announcement notifications are delivered to every recipient in chunked bulk inserts"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(email="admin@test.com", password=None, role="ADMIN")
+
+    def _create_users(self, count, role, is_active=True):
+        offset = User.objects.count()
+        User.objects.bulk_create([
+            User(email=f"{role.lower()}{offset + index}@test.com", role=role, is_active=is_active)
+            for index in range(count)
+        ])
+
+    def test_targets_role_and_excludes_creator(self):
+        self._create_users(3, 'PARENT')
+        self._create_users(2, 'PARENT', is_active=False)
+        self._create_users(4, 'TEACHER')
+
+        announcement = Announcement.objects.create(
+            title="Meeting", content="x" * 150, target_role='PARENTS', created_by=self.admin
+        )
+
+        notifications = Notification.objects.filter(related_object_type='announcement')
+        self.assertEqual(notifications.count(), 3)
+        self.assertFalse(notifications.exclude(recipient__role='PARENT').exists())
+        notification = notifications.first()
+        self.assertEqual(notification.related_object_id, announcement.id)
+        self.assertEqual(notification.title, "New Announcement: Meeting")
+        self.assertEqual(notification.message, "x" * 100 + '...')
+
+        Announcement.objects.create(title="All", content="hi", created_by=self.admin)
+        self.assertEqual(Notification.objects.filter(title="New Announcement: All").count(), 7)
+        self.assertFalse(Notification.objects.filter(recipient=self.admin).exists())
+
+    def test_unpublished_announcement_is_not_delivered(self):
+        self._create_users(3, 'PARENT')
+        Announcement.objects.create(title="Draft", content="...", is_published=False, created_by=self.admin)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_delivers_beyond_the_old_500_cap(self):
+        self._create_users(1500, 'PARENT')
+        Announcement.objects.create(title="Trip", content="...", target_role='PARENTS', created_by=self.admin)
+        self.assertEqual(Notification.objects.count(), 1500)
+
+    @skipUnless(os.getenv('RUN_BENCHMARKS') == 'true', "benchmark: set RUN_BENCHMARKS=true to run it")
+    def test_throughput_10k_recipients(self):
+        """Benchmark: 10,000 recipients are delivered in a bounded number of queries"""
+        self._create_users(10000, 'PARENT')
+        announcement = Announcement.objects.create(
+            title="Exams", content="...", target_role='PARENTS', is_published=False, created_by=self.admin
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            delivered = deliver_announcement(announcement, chunk_size=2000)
+
+        self.assertEqual(delivered, 10000)
+        self.assertEqual(Notification.objects.filter(related_object_id=announcement.id).count(), 10000)
+        # Reads and inserts grow with chunks (and the backend's parameter limit), not one query per user
+        self.assertLess(len(queries), 200)
+
+
+class NotificationFeedTest(APITestCase):
+    """Unread counter kept in the cache and the cursor-paginated feed"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="parent@test.com", password=None, role="PARENT")
+        self.client.force_authenticate(user=self.user)
+
+    def _notify(self, count, user=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Notification.objects.create(recipient=user or self.user, title=f"n{index}", message="...")
+                for index in range(count)
+            ]
+
+    def _unread_count(self):
+        response = self.client.get('/api/communication/notifications/unread_count/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['count']
+
+    def test_unread_count_is_served_from_the_counter(self):
+        self._notify(3)
+        self.assertEqual(self._unread_count(), 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._unread_count(), 3)
+        self.assertFalse(any('communication_notification' in query['sql'] for query in queries))
+
+        notifications = self._notify(2)
+        self.assertEqual(self._unread_count(), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/communication/notifications/{notifications[0].id}/mark_read/')
+            # Marking an already read notification does not count twice
+            self.client.post(f'/api/communication/notifications/{notifications[0].id}/mark_read/')
+        self.assertEqual(self._unread_count(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/communication/notifications/{notifications[1].id}/')
+        self.assertEqual(self._unread_count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/communication/notifications/mark_all_read/')
+        self.assertEqual(self._unread_count(), 0)
+        self.assertFalse(Notification.objects.filter(recipient=self.user, is_read=False).exists())
+
+    def test_announcement_fan_out_updates_counters(self):
+        self.assertEqual(self._unread_count(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Announcement.objects.create(title="Trip", content="...", target_role='PARENTS')
+        self.assertEqual(self._unread_count(), 1)
+
+    def test_feed_is_cursor_paginated_newest_first(self):
+        self._notify(5)
+        other = User.objects.create_user(email="other@test.com", password=None, role="PARENT")
+        self._notify(2, user=other)
+
+        response = self.client.get('/api/communication/notifications/feed/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        titles = [item['title'] for item in response.data['results']]
+        self.assertEqual(titles, ['n4', 'n3'])
+
+        seen = titles
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            seen += [item['title'] for item in response.data['results']]
+            next_url = response.data['next']
+        self.assertEqual(seen, ['n4', 'n3', 'n2', 'n1', 'n0'])
+
+        response = self.client.get('/api/communication/notifications/feed/', {'is_read': 'true'})
+        self.assertEqual(response.data['results'], [])
+
+
+class ConversationInboxTest(APITestCase):
+    """The inbox is one annotated query plus prefetches, whatever the number of conversations"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="teacher@test.com", password=None, role="TEACHER")
+        self.client.force_authenticate(user=self.user)
+
+    def _add_conversations(self, count):
+        conversations = []
+        for _ in range(count):
+            other = User.objects.create_user(
+                email=f"parent{User.objects.count()}@test.com", password=None, role="PARENT"
+            )
+            conversation = Conversation.objects.create()
+            conversation.participants.add(self.user, other)
+            Message.objects.create(conversation=conversation, sender=other, content="hello")
+            Message.objects.create(conversation=conversation, sender=other, content="are you there?")
+            Message.objects.create(conversation=conversation, sender=self.user, content="yes")
+            conversations.append(conversation)
+        return conversations
+
+    def test_inbox_query_count_is_independent_of_conversations(self):
+        counts = []
+        for count in (2, 12):
+            self._add_conversations(count)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/communication/conversations/')
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        # Presence is resolved once for the page, not once per conversation
+        with mock.patch('users.presence.last_seen_many', wraps=presence.last_seen_many) as last_seen_many:
+            response = self.client.get('/api/communication/conversations/')
+        self.assertEqual(last_seen_many.call_count, 1)
+        conversation = response.data['results'][0]
+        self.assertEqual(conversation['last_message']['content'], "yes")
+        self.assertEqual(conversation['unread_count'], 2)
+        self.assertEqual(len(conversation['participants']), 2)
+
+    def test_inbox_shows_online_participants(self):
+        online, offline = self._add_conversations(2)
+        online_user = online.participants.exclude(pk=self.user.pk).get()
+        presence.mark_online(online_user.id)
+        self.addCleanup(cache.clear)
+
+        response = self.client.get('/api/communication/conversations/')
+
+        statuses = {
+            participant['id']: participant['is_online']
+            for conversation in response.data['results'] for participant in conversation['participants']
+            if participant['id'] != self.user.id
+        }
+        self.assertEqual(statuses, {online_user.id: True, offline.participants.exclude(pk=self.user.pk).get().id: False})
+
+    def test_last_message_follows_new_and_deleted_messages(self):
+        older, newer = self._add_conversations(2)
+
+        response = self.client.post(
+            '/api/communication/messages/', {'conversation': older.id, 'content': "back on top"}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        older.refresh_from_db()
+        self.assertEqual(older.last_message.content, "back on top")
+
+        response = self.client.get('/api/communication/conversations/')
+        self.assertEqual([item['id'] for item in response.data['results']], [older.id, newer.id])
+
+        older.last_message.delete()
+        older.refresh_from_db()
+        self.assertEqual(older.last_message.content, "yes")
+        self.assertEqual(older.last_message_at, older.last_message.created_at)
+
+
+class MessageHistoryTest(APITestCase):
+    """Keyset pagination of a thread and the incremental "since" sync"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="teacher@test.com", password=None, role="TEACHER")
+        self.other = User.objects.create_user(email="parent@test.com", password=None, role="PARENT")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.user, self.other)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.other, content=f"m{index}")
+            for index in range(7)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_cursor_pages_walk_the_thread_newest_first(self):
+        response = self.client.get('/api/communication/messages/', {
+            'conversation': self.conversation.id, 'pagination': 'cursor', 'page_size': 3
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+
+        seen = [item['content'] for item in response.data['results']]
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            seen += [item['content'] for item in response.data['results']]
+            next_url = response.data['next']
+        self.assertEqual(seen, [f"m{index}" for index in reversed(range(7))])
+
+        # Page numbers stay the default
+        response = self.client.get('/api/communication/messages/', {'conversation': self.conversation.id})
+        self.assertEqual(response.data['count'], 7)
+
+    def test_since_returns_only_newer_messages(self):
+        url = '/api/communication/messages/since/'
+        response = self.client.get(url, {'conversation': self.conversation.id, 'after': self.messages[4].id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['content'] for item in response.data['results']], ["m5", "m6"])
+        self.assertEqual(response.data['cursor'], self.messages[6].id)
+        self.assertFalse(response.data['has_more'])
+
+        response = self.client.get(url, {'conversation': self.conversation.id, 'after': response.data['cursor']})
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['cursor'], self.messages[6].id)
+
+        self.assertEqual(self.client.get(url, {'conversation': self.conversation.id}).data['cursor'], self.messages[6].id)
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'conversation': self.conversation.id, 'after': 'x'}).status_code, 400)
 
-# Create your tests here.
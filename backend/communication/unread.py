@@ -0,0 +1,73 @@
+"""
+Per-user unread notification counters.
+
+The bell icon polls unread_count constantly, so the count is kept in the cache and
+adjusted as notifications are created and read instead of running COUNT(*) on every poll.
+A missing counter is recomputed once from the (recipient, is_read, created_at) index and
+cached; counters expire after UNREAD_COUNT_TIMEOUT, which bounds any drift from writes
+that bypass these helpers. Adjustments run on commit so rolled-back writes never count.
+The counters must live in the shared Redis cache (see CACHES in settings and users.checks),
+where increments are atomic; a per-process cache would serve and adjust its own copy.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+UNREAD_COUNT_TIMEOUT = 60 * 60
+# Above this many recipients a fan-out drops the counters instead of adjusting each one
+INCREMENT_LIMIT = 50
+
+
+def _key(user_id):
+    return f'communication:unread:{user_id}'
+
+
+def unread_count(user_id):
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.add(_key(user_id), count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def _adjust(user_id, delta):
+    try:
+        if cache.incr(_key(user_id), delta) < 0:
+            cache.delete(_key(user_id))
+    except ValueError:
+        # Not cached: the next read recomputes it
+        pass
+
+
+def notifications_created(recipient_ids):
+    """Account for new unread notifications (pass one id per notification)."""
+    counts = Counter(recipient_ids)
+    if not counts:
+        return
+
+    def apply():
+        if len(counts) > INCREMENT_LIMIT:
+            cache.delete_many([_key(user_id) for user_id in counts])
+            return
+        for user_id, created in counts.items():
+            _adjust(user_id, created)
+
+    transaction.on_commit(apply)
+
+
+def notification_read(user_id):
+    """Account for one notification of `user_id` going from unread to read."""
+    transaction.on_commit(lambda: _adjust(user_id, -1))
+
+
+def all_read(user_id):
+    transaction.on_commit(lambda: cache.set(_key(user_id), 0, UNREAD_COUNT_TIMEOUT))
+
+
+def invalidate(user_ids):
+    """Drop counters that can no longer be adjusted precisely (deletes, arbitrary updates)."""
+    keys = [_key(user_id) for user_id in set(user_ids)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,17 +1,45 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from django.db.models import Q, Count, Prefetch
+from django.db.models.functions import Coalesce
 from .models import Conversation, Message, Announcement, Notification
 from .serializers import ConversationSerializer, MessageSerializer, AnnouncementSerializer, NotificationSerializer
+from users import presence
 from users.models import User
+from .pagination import NotificationFeedPagination, MessageHistoryPagination
+from . import unread
 
 class ConversationViewSet(viewsets.ModelViewSet):
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return self.request.user.conversations.all().order_by('-updated_at')
+        user = self.request.user
+        return user.conversations.select_related(
+            'last_message__sender__profile'
+        ).prefetch_related(
+            Prefetch('participants', queryset=User.objects.select_related('profile__school_subject'))
+        ).annotate(
+            unread_messages_count=Count(
+                'messages', filter=Q(messages__is_read=False) & ~Q(messages__sender=user)
+            ),
+            # Same order as updated_at (bumped on every message) without scanning messages
+            activity_at=Coalesce('last_message_at', 'created_at'),
+        ).order_by('-activity_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        conversations = list(queryset if page is None else page)
+        # Online status of every participant on the page in one presence read,
+        # instead of one per conversation's participant list
+        participants = {user.id: user for conversation in conversations for user in conversation.participants.all()}
+        context = {**self.get_serializer_context(), 'online_ids': presence.online_user_ids(participants.values())}
+        serializer = self.get_serializer_class()(conversations, many=True, context=context)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def read(self, request, pk=None):
@@ -58,7 +86,7 @@ class MessageViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # Only show messages from conversations the user is part of
-        queryset = Message.objects.filter(conversation__participants=self.request.user)
+        queryset = Message.objects.filter(conversation__participants=self.request.user).select_related('sender__profile')
         
         # Filter by specific conversation if provided
         conversation_id = self.request.query_params.get('conversation')
@@ -67,14 +95,57 @@ class MessageViewSet(viewsets.ModelViewSet):
             
         return queryset
 
+    # Upper bound of messages returned by one "since" call
+    SINCE_LIMIT = 200
+
+    @property
+    def paginator(self):
+        """Page numbers by default; keyset pages with ?pagination=cursor (or a ?cursor= from a previous page)"""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = MessageHistoryPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+    @action(detail=False, methods=['get'])
+    def since(self, request):
+        """
+        Messages of a conversation newer than the client's last known message, oldest first
+        (?conversation=<id>&after=<message id>). Returns the next cursor and whether more are pending.
+        """
+        conversation_id = request.query_params.get('conversation')
+        if not conversation_id:
+            return Response({'error': 'conversation is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset()
+        after_id = request.query_params.get('after')
+        if after_id:
+            anchor = queryset.filter(id=after_id).values('created_at', 'id').first() if after_id.isdigit() else None
+            if anchor is None:
+                return Response({'error': 'Unknown message cursor'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(
+                Q(created_at__gt=anchor['created_at']) | Q(created_at=anchor['created_at'], id__gt=anchor['id'])
+            )
+
+        messages = list(queryset.order_by('created_at', 'id')[:self.SINCE_LIMIT + 1])
+        has_more = len(messages) > self.SINCE_LIMIT
+        messages = messages[:self.SINCE_LIMIT]
+        return Response({
+            'results': self.get_serializer(messages, many=True).data,
+            'cursor': messages[-1].id if messages else (int(after_id) if after_id else None),
+            'has_more': has_more,
+        })
+
     def perform_create(self, serializer):
         conversation = serializer.validated_data['conversation']
         if self.request.user not in conversation.participants.all():
             raise permissions.PermissionDenied("You are not a participant in this conversation")
         
         serializer.save(sender=self.request.user)
-        # Update conversation timestamp
-        conversation.save()
+        # Update conversation timestamp (last_message is kept by the Message signal)
+        conversation.save(update_fields=['updated_at'])
 
 class AnnouncementViewSet(viewsets.ModelViewSet):
     serializer_class = AnnouncementSerializer
@@ -105,19 +176,37 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        unread.invalidate([self.request.user.id])
+
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({'count': count})
+        return Response({'count': unread.unread_count(request.user.id)})
+
+    @action(detail=False, methods=['get'])
+    def feed(self, request):
+        """Cursor-paginated notification feed, newest first (?cursor=..., ?page_size=..., ?is_read=...)"""
+        queryset = Notification.objects.filter(recipient=request.user)
+        is_read = request.query_params.get('is_read')
+        if is_read in ('true', 'false'):
+            queryset = queryset.filter(is_read=is_read == 'true')
+        paginator = NotificationFeedPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        if not notification.is_read:
+            notification.is_read = True
+            notification.save()
+            unread.notification_read(request.user.id)
         return Response({'status': 'marked as read'})
 
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         self.get_queryset().filter(is_read=False).update(is_read=True)
+        unread.all_read(request.user.id)
         return Response({'status': 'all marked as read'})
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import (
-    FeeCategory, FeeStructure, Invoice, InvoiceItem, Payment,
+    FeeCategory, FeeStructure, Invoice, InvoiceItem, Payment, InvoiceGenerationJob,
     EmploymentContract, FinancialTransaction, PayrollPeriod, PayrollEntry,
     ExpenseRecord, BudgetCategory, Budget
 )
@@ -66,6 +66,13 @@ class InvoiceAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
 
 
+@admin.register(InvoiceGenerationJob)
+class InvoiceGenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'academic_year', 'status', 'progress', 'processed_units', 'total_units', 'created_invoices', 'created_at')
+    list_filter = ('status', 'academic_year')
+    readonly_fields = ('job_id', 'checkpoint', 'results', 'created_at', 'started_at', 'updated_at', 'completed_at')
+
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('id', 'invoice_id', 'amount', 'date', 'method', 'recorded_by')
@@ -0,0 +1,242 @@
+"""
+Bulk invoice generation.
+
+Invoices for a whole grade are built in memory and written with bulk_create: the
+(student, month) pairs that already have an invoice are fetched in one query, items are
+inserted in one batch and invoice totals are computed up front instead of through
+InvoiceItem.save() (which recalculates the invoice on every item).
+Multi-month / multi-grade runs go through InvoiceGenerationJob: a run claims the job first
+(claim_invoice_generation_job) and every checkpoint is conditional on that claim, so two runs
+of the same job never invoice the same chunk; the (student, month) constraint on Invoice backs
+this up at the database level.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from schools.models import Grade
+from users.models import StudentEnrollment
+from .models import FeeStructure, Invoice, InvoiceGenerationJob, InvoiceItem
+
+BULK_BATCH_SIZE = 500
+PREVIEW_LIMIT = 50
+
+
+class NoRecurringFeesError(Exception):
+    """Raised when a grade has no recurring fee structure for the academic year."""
+
+
+class InvoiceJobTakenOver(Exception):
+    """Raised (rolling back the chunk in flight) when another run claimed the job."""
+
+
+def get_recurring_fees(grade, academic_year):
+    fees = list(
+        FeeStructure.objects.filter(
+            grade=grade, academic_year=academic_year, category__fee_type='RECURRING'
+        ).select_related('category')
+    )
+    if not fees:
+        raise NoRecurringFeesError("No recurring fees defined for this grade")
+    return fees
+
+
+def build_invoice_lines(enrollment, fees):
+    """Return the (description, amount) lines of one student's monthly invoice."""
+    lines = []
+    for fee in fees:
+        # Transport fees only apply to students using the school transport
+        if 'transport' in fee.category.name.lower() and not enrollment.uses_transport:
+            continue
+        lines.append((fee.category.name, fee.amount))
+
+    # Apply invoice-wide discount if any
+    if enrollment.invoice_discount > 0:
+        lines.append(("Discount", -enrollment.invoice_discount))
+    return lines
+
+
+def generate_invoices(grade, academic_year, month, due_date, dry_run=False, fees=None, student_ids=None):
+    """
+    Issue the monthly invoices of every active student of `grade` who has none for `month`.
+
+    With dry_run=True nothing is written and the summary carries a preview of the invoices
+    that would be created. `student_ids` restricts generation to a subset of the grade.
+    Returns a summary dict: created/skipped counts, item count and total amount.
+    """
+    if fees is None:
+        fees = get_recurring_fees(grade, academic_year)
+
+    enrollments = StudentEnrollment.objects.filter(
+        school_class__grade=grade,
+        academic_year=academic_year,
+        is_active=True
+    ).select_related('student').order_by('student_id', 'id')
+    if student_ids is not None:
+        enrollments = enrollments.filter(student_id__in=student_ids)
+    enrollments = list(enrollments)
+
+    already_invoiced = set(
+        Invoice.objects.filter(
+            month=month, student_id__in={enrollment.student_id for enrollment in enrollments}
+        ).values_list('student_id', flat=True)
+    )
+
+    summary = {
+        'dry_run': dry_run,
+        'month': month.isoformat(),
+        'grade_id': grade.id,
+        'students': 0,
+        'created': 0,
+        'skipped_existing': 0,
+        'skipped_duplicate_enrollment': 0,
+        'items': 0,
+        'total_amount': Decimal('0'),
+    }
+    if dry_run:
+        summary['preview'] = []
+
+    planned = []  # (invoice, lines)
+    seen = set()
+    for enrollment in enrollments:
+        student_id = enrollment.student_id
+        if student_id in seen:
+            # Student enrolled in several classes of the grade: invoiced once
+            summary['skipped_duplicate_enrollment'] += 1
+            continue
+        seen.add(student_id)
+        summary['students'] += 1
+
+        if student_id in already_invoiced:
+            summary['skipped_existing'] += 1
+            continue
+
+        lines = build_invoice_lines(enrollment, fees)
+        total = sum((amount for _, amount in lines), Decimal('0'))
+        invoice = Invoice(
+            student_id=student_id,
+            academic_year=academic_year,
+            month=month,
+            due_date=due_date,
+            total_amount=total,
+            # Same outcome as Invoice.update_status() for an unpaid invoice
+            status=Invoice.Status.PAID if total <= 0 else Invoice.Status.ISSUED,
+        )
+        planned.append((invoice, lines))
+
+        summary['created'] += 1
+        summary['items'] += len(lines)
+        summary['total_amount'] += total
+        if dry_run and len(summary['preview']) < PREVIEW_LIMIT:
+            summary['preview'].append({
+                'student_id': student_id,
+                'student_name': enrollment.student.get_full_name(),
+                'total_amount': total,
+                'items': [{'description': description, 'amount': amount} for description, amount in lines],
+            })
+
+    if dry_run or not planned:
+        return summary
+
+    with transaction.atomic():
+        invoices = Invoice.objects.bulk_create([invoice for invoice, _ in planned], batch_size=BULK_BATCH_SIZE)
+        items = [
+            InvoiceItem(invoice=invoice, description=description, amount=amount)
+            for invoice, (_, lines) in zip(invoices, planned)
+            for description, amount in lines
+        ]
+        InvoiceItem.objects.bulk_create(items, batch_size=BULK_BATCH_SIZE)
+
+    return summary
+
+
+def month_due_date(month, due_day):
+    return month.replace(day=min(due_day, 28))
+
+
+def claim_invoice_generation_job(job, stale_after):
+    """
+    Claim `job` for a run: a conditional UPDATE that only succeeds if the job is pending,
+    failed or PROCESSING without progress for `stale_after`, and nobody claimed it since
+    `job` was read. Bumps `job.attempts` and returns True on success.
+    """
+    now = timezone.now()
+    runnable = Q(status__in=[InvoiceGenerationJob.Status.PENDING, InvoiceGenerationJob.Status.FAILED]) | Q(
+        status=InvoiceGenerationJob.Status.PROCESSING, updated_at__lt=now - stale_after
+    )
+    claimed = InvoiceGenerationJob.objects.filter(runnable, pk=job.pk, attempts=job.attempts).update(
+        status=InvoiceGenerationJob.Status.PROCESSING, attempts=F('attempts') + 1, updated_at=now
+    )
+    if claimed:
+        job.status = InvoiceGenerationJob.Status.PROCESSING
+        job.attempts += 1
+        job.updated_at = now
+    return bool(claimed)
+
+
+def run_invoice_generation_job(job):
+    """
+    Process a claimed InvoiceGenerationJob, resuming from its checkpoint.
+
+    Each (grade, month) unit is generated in chunks of `job.chunk_size` students; every
+    chunk commits together with its checkpoint, so a crash loses at most the chunk in flight
+    and a rerun neither duplicates invoices nor miscounts them. Raises InvoiceJobTakenOver
+    if another run claimed the job meanwhile.
+    """
+    grades = {grade.id: grade for grade in Grade.objects.filter(id__in=job.grade_ids)}
+    months = sorted(date.fromisoformat(value) for value in job.months)
+    units = [(grades[grade_id], month) for grade_id in job.grade_ids if grade_id in grades for month in months]
+
+    if not job.mark_started(len(units)):
+        raise InvoiceJobTakenOver(job.job_id)
+    done = job.completed_units
+    skipped_grades = []
+
+    for grade, month in units:
+        unit = f"{grade.id}:{month.isoformat()}"
+        if unit in done:
+            continue
+
+        try:
+            fees = get_recurring_fees(grade, job.academic_year)
+        except NoRecurringFeesError:
+            if grade.id not in skipped_grades:
+                skipped_grades.append(grade.id)
+            if not job.complete_unit(unit, f"Skipped {grade.name}: no recurring fees"):
+                raise InvoiceJobTakenOver(job.job_id)
+            continue
+
+        student_ids = (
+            StudentEnrollment.objects.filter(school_class__grade=grade, academic_year=job.academic_year, is_active=True)
+            .order_by('student_id')
+            .values_list('student_id', flat=True)
+            .distinct()
+        )
+        if job.checkpoint.get('unit') == unit:
+            student_ids = student_ids.filter(student_id__gt=job.checkpoint['last_student_id'])
+        student_ids = list(student_ids)
+
+        for start in range(0, len(student_ids), job.chunk_size):
+            chunk = student_ids[start:start + job.chunk_size]
+            with transaction.atomic():
+                summary = generate_invoices(
+                    grade, job.academic_year, month, month_due_date(month, job.due_day),
+                    fees=fees, student_ids=chunk,
+                )
+                if not job.record_chunk(unit, chunk[-1], summary):
+                    raise InvoiceJobTakenOver(job.job_id)
+
+        if not job.complete_unit(unit, f"Invoiced {grade.name} for {month.strftime('%Y-%m')}"):
+            raise InvoiceJobTakenOver(job.job_id)
+
+    if not job.mark_completed({
+        'created_invoices': job.created_invoices,
+        'skipped_invoices': job.skipped_invoices,
+        'units': job.total_units,
+        'skipped_grades': skipped_grades,
+    }):
+        raise InvoiceJobTakenOver(job.job_id)
+    return job
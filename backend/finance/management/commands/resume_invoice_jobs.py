@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from finance.invoicing import InvoiceJobTakenOver, claim_invoice_generation_job, run_invoice_generation_job
+from finance.models import InvoiceGenerationJob
+
+
+class Command(BaseCommand):
+    help = 'Resume invoice generation jobs interrupted by a crash or restart, from their checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=5,
+            help='Treat PROCESSING jobs without progress for this long as interrupted',
+        )
+        parser.add_argument('--include-failed', action='store_true', help='Also retry FAILED jobs')
+
+    def handle(self, *args, **options):
+        statuses = [InvoiceGenerationJob.Status.PENDING, InvoiceGenerationJob.Status.PROCESSING]
+        if options['include_failed']:
+            statuses.append(InvoiceGenerationJob.Status.FAILED)
+
+        stale_after = timedelta(minutes=options['stale_minutes'])
+        cutoff = timezone.now() - stale_after
+        jobs = InvoiceGenerationJob.objects.filter(status__in=statuses, updated_at__lt=cutoff).order_by('created_at')
+
+        resumed = 0
+        for job in jobs:
+            if not claim_invoice_generation_job(job, stale_after):
+                self.stdout.write(f'Skipping job {job.job_id}: claimed by another run')
+                continue
+            self.stdout.write(f'Resuming job {job.job_id} ({job.processed_units}/{job.total_units} units done)...')
+            try:
+                run_invoice_generation_job(job)
+            except InvoiceJobTakenOver:
+                self.stdout.write(self.style.WARNING(f'[WARN] Job {job.job_id} was taken over by another run'))
+                continue
+            except Exception as e:
+                job.mark_failed(str(e))
+                self.stdout.write(self.style.ERROR(f'[ERROR] Job {job.job_id} failed: {e}'))
+                continue
+            resumed += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'[OK] Job {job.job_id}: {job.created_invoices} invoices created, {job.skipped_invoices} skipped'
+            ))
+
+        self.stdout.write(self.style.SUCCESS(f'[OK] Resumed {resumed} job(s)'))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:54
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_migrate_historical_financial_data'),
+        ('schools', '0011_gasoilrecord_payment_method'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceGenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('grade_ids', models.JSONField(default=list, help_text='Grades to invoice')),
+                ('months', models.JSONField(default=list, help_text='First day of each month to invoice (ISO dates)')),
+                ('due_day', models.PositiveSmallIntegerField(default=10, help_text='Day of the month invoices are due')),
+                ('chunk_size', models.PositiveIntegerField(default=200, help_text='Students per transaction')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('progress', models.IntegerField(default=0, help_text='Progress percentage (0-100)')),
+                ('current_status', models.CharField(blank=True, help_text='Current operation status', max_length=255)),
+                ('total_units', models.IntegerField(default=0, help_text='Number of (grade, month) units')),
+                ('processed_units', models.IntegerField(default=0)),
+                ('created_invoices', models.IntegerField(default=0)),
+                ('skipped_invoices', models.IntegerField(default=0)),
+                ('checkpoint', models.JSONField(blank=True, default=dict)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('results', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoice_generation_jobs', to='schools.academicyear')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoice_generation_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Invoice Generation Job',
+                'verbose_name_plural': 'Invoice Generation Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
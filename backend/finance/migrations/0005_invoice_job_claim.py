@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_invoicegenerationjob'),
+        ('schools', '0011_gasoilrecord_payment_method'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoicegenerationjob',
+            name='attempts',
+            field=models.IntegerField(default=0, help_text='Number of times a run claimed this job'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(condition=models.Q(('month__isnull', False)), fields=('student', 'month'), name='unique_student_monthly_invoice'),
+        ),
+    ]
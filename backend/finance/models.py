@@ -4,6 +4,7 @@ from django.core.exceptions import ValidationError
 from django.contrib.contenttypes.fields import GenericRelation
 from datetime import date
 from decimal import Decimal
+import uuid
 from schools.models import AcademicYear, Grade
 from users.models import User
 
@@ -50,6 +51,14 @@ class Invoice(models.Model):
     due_date = models.DateField()
     notes = models.TextField(blank=True)
 
+    class Meta:
+        constraints = [
+            # One monthly invoice per student: concurrent generation runs cannot bill a month twice
+            models.UniqueConstraint(
+                fields=['student', 'month'], condition=models.Q(month__isnull=False), name='unique_student_monthly_invoice'
+            ),
+        ]
+
     def __str__(self):
         return f"INV-{self.id} - {self.student.get_full_name()}"
 
@@ -102,6 +111,122 @@ class Payment(models.Model):
         return f"{self.amount} - {self.invoice}"
 
 
+class InvoiceGenerationJob(models.Model):
+    """
+    Background generation of monthly invoices across several grades and months.
+    Work is split in (grade, month) units processed in student chunks; `checkpoint`
+    records finished units and the last student of the current one so an interrupted
+    job resumes where it stopped. A run first claims the job (finance.invoicing.claim_invoice_generation_job);
+    progress writes are conditional on that claim's `attempts`.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        PROCESSING = 'PROCESSING', 'Processing'
+        COMPLETED = 'COMPLETED', 'Completed'
+        FAILED = 'FAILED', 'Failed'
+
+    job_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='invoice_generation_jobs')
+
+    # Scope
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='invoice_generation_jobs')
+    grade_ids = models.JSONField(default=list, help_text="Grades to invoice")
+    months = models.JSONField(default=list, help_text="First day of each month to invoice (ISO dates)")
+    due_day = models.PositiveSmallIntegerField(default=10, help_text="Day of the month invoices are due")
+    chunk_size = models.PositiveIntegerField(default=200, help_text="Students per transaction")
+
+    # Progress tracking
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    progress = models.IntegerField(default=0, help_text="Progress percentage (0-100)")
+    current_status = models.CharField(max_length=255, blank=True, help_text="Current operation status")
+    total_units = models.IntegerField(default=0, help_text="Number of (grade, month) units")
+    processed_units = models.IntegerField(default=0)
+    created_invoices = models.IntegerField(default=0)
+    skipped_invoices = models.IntegerField(default=0)
+    checkpoint = models.JSONField(default=dict, blank=True)
+    attempts = models.IntegerField(default=0, help_text="Number of times a run claimed this job")
+
+    # Results and errors
+    error_message = models.TextField(blank=True, null=True)
+    results = models.JSONField(blank=True, null=True)
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Invoice Generation Job"
+        verbose_name_plural = "Invoice Generation Jobs"
+
+    def __str__(self):
+        return f"Invoice Generation Job {self.job_id} - {self.status}"
+
+    @property
+    def is_completed(self):
+        return self.status in [self.Status.COMPLETED, self.Status.FAILED]
+
+    @property
+    def completed_units(self):
+        return set(self.checkpoint.get('completed_units', []))
+
+    def _save_if_claimed(self, fields):
+        """
+        Write `fields` unless another run claimed the job since this instance did
+        (attempts changed, see finance.invoicing). Returns whether they were written.
+        """
+        from django.utils import timezone
+        self.updated_at = timezone.now()
+        return bool(InvoiceGenerationJob.objects.filter(pk=self.pk, attempts=self.attempts).update(
+            updated_at=self.updated_at, **{name: getattr(self, name) for name in fields}
+        ))
+
+    def mark_started(self, total_units):
+        from django.utils import timezone
+        self.status = self.Status.PROCESSING
+        self.total_units = total_units
+        self.error_message = None
+        if not self.started_at:
+            self.started_at = timezone.now()
+        return self._save_if_claimed(['status', 'total_units', 'error_message', 'started_at'])
+
+    def record_chunk(self, unit, last_student_id, summary):
+        """Checkpoint a committed student chunk of `unit` (call inside the chunk transaction)."""
+        self.checkpoint = {**self.checkpoint, 'unit': unit, 'last_student_id': last_student_id}
+        self.created_invoices += summary['created']
+        self.skipped_invoices += summary['skipped_existing']
+        return self._save_if_claimed(['checkpoint', 'created_invoices', 'skipped_invoices'])
+
+    def complete_unit(self, unit, status=None):
+        completed = self.checkpoint.get('completed_units', []) + [unit]
+        self.checkpoint = {'completed_units': completed}
+        self.processed_units = len(completed)
+        if self.total_units:
+            self.progress = min(100, int(self.processed_units * 100 / self.total_units))
+        if status:
+            self.current_status = status
+        return self._save_if_claimed(['checkpoint', 'processed_units', 'progress', 'current_status'])
+
+    def mark_completed(self, results=None):
+        from django.utils import timezone
+        self.status = self.Status.COMPLETED
+        self.progress = 100
+        self.completed_at = timezone.now()
+        if results:
+            self.results = results
+        return self._save_if_claimed(['status', 'progress', 'completed_at', 'results'])
+
+    def mark_failed(self, error_message):
+        from django.utils import timezone
+        self.status = self.Status.FAILED
+        self.error_message = error_message
+        self.completed_at = timezone.now()
+        return self._save_if_claimed(['status', 'error_message', 'completed_at'])
+
+
 # ==================== NEW FINANCIAL MANAGEMENT MODELS ====================
 
 class ContractType(models.TextChoices):
@@ -501,11 +626,16 @@ class PayrollPeriod(models.Model):
 
     def recalculate_totals(self):
         """Recalculate summary totals from all entries"""
-        entries = self.payroll_entries.all()
-        self.total_gross = sum(e.gross_salary for e in entries)
-        self.total_deductions = sum(e.total_deductions for e in entries)
-        self.total_net = sum(e.net_salary for e in entries)
-        self.employee_count = entries.count()
+        totals = self.payroll_entries.aggregate(
+            gross=models.Sum('gross_salary'),
+            deductions=models.Sum('total_deductions'),
+            net=models.Sum('net_salary'),
+            count=models.Count('id'),
+        )
+        self.total_gross = totals['gross'] or 0
+        self.total_deductions = totals['deductions'] or 0
+        self.total_net = totals['net'] or 0
+        self.employee_count = totals['count']
         self.save(update_fields=['total_gross', 'total_deductions', 'total_net', 'employee_count'])
 
 
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import (
-    FeeCategory, FeeStructure, Invoice, InvoiceItem, Payment,
+    FeeCategory, FeeStructure, Invoice, InvoiceItem, Payment, InvoiceGenerationJob,
     EmploymentContract, PayrollPeriod, PayrollEntry,
     ExpenseRecord, BudgetCategory, Budget, FinancialTransaction
 )
@@ -58,6 +58,57 @@ class BulkInvoiceGenerateSerializer(serializers.Serializer):
     month = serializers.DateField()
     due_date = serializers.DateField()
     academic_year_id = serializers.IntegerField()
+    dry_run = serializers.BooleanField(default=False, required=False)
+
+
+class InvoiceGenerationJobCreateSerializer(serializers.Serializer):
+    """Input for a multi-month / multi-grade invoice generation job"""
+    academic_year_id = serializers.IntegerField()
+    months = serializers.ListField(child=serializers.DateField(), allow_empty=False)
+    grade_ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False,
+        help_text="Defaults to every grade with recurring fees in the academic year"
+    )
+    due_day = serializers.IntegerField(min_value=1, max_value=28, default=10)
+    chunk_size = serializers.IntegerField(min_value=1, max_value=2000, default=200)
+
+    def validate_academic_year_id(self, value):
+        if not AcademicYear.objects.filter(id=value).exists():
+            raise serializers.ValidationError("Academic year not found")
+        return value
+
+    def validate_months(self, value):
+        # Invoices are keyed on the first day of the month
+        return sorted({month.replace(day=1) for month in value})
+
+    def validate(self, attrs):
+        grade_ids = attrs.get('grade_ids')
+        if grade_ids:
+            found = set(Grade.objects.filter(id__in=grade_ids).values_list('id', flat=True))
+            missing = sorted(set(grade_ids) - found)
+            if missing:
+                raise serializers.ValidationError({'grade_ids': f"Grades not found: {missing}"})
+        else:
+            attrs['grade_ids'] = list(
+                FeeStructure.objects.filter(
+                    academic_year_id=attrs['academic_year_id'], category__fee_type='RECURRING'
+                ).order_by('grade_id').values_list('grade_id', flat=True).distinct()
+            )
+        return attrs
+
+
+class InvoiceGenerationJobSerializer(serializers.ModelSerializer):
+    completed = serializers.BooleanField(source='is_completed', read_only=True)
+
+    class Meta:
+        model = InvoiceGenerationJob
+        fields = [
+            'job_id', 'academic_year', 'grade_ids', 'months', 'due_day', 'chunk_size',
+            'status', 'progress', 'current_status', 'total_units', 'processed_units',
+            'created_invoices', 'skipped_invoices', 'completed', 'error_message', 'results',
+            'created_at', 'started_at', 'updated_at', 'completed_at',
+        ]
+        read_only_fields = fields
 
 
 # ==================== PAYROLL SYSTEM SERIALIZERS ====================
@@ -224,6 +275,18 @@ class CalculateSalarySerializer(serializers.Serializer):
         required=False,
         help_text="For per-lesson contracts"
     )
+    period_start = serializers.DateField(
+        required=False,
+        help_text="With period_end: take hours/lessons from completed attendance sessions"
+    )
+    period_end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if bool(attrs.get('period_start')) != bool(attrs.get('period_end')):
+            raise serializers.ValidationError("period_start and period_end must be given together")
+        if attrs.get('period_start') and attrs['period_start'] > attrs['period_end']:
+            raise serializers.ValidationError("period_start must be before period_end")
+        return attrs
 
 
 # ==================== EXPENSE & BUDGET SERIALIZERS ====================
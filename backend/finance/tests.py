@@ -1,3 +1,372 @@
-from django.test import TestCase
+# finance/tests.py
 
-# Create your tests here.
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .invoicing import (
+    InvoiceJobTakenOver, claim_invoice_generation_job, generate_invoices, run_invoice_generation_job,
+)
+from .models import (
+    FeeCategory, FeeStructure, Invoice, InvoiceItem, InvoiceGenerationJob,
+    EmploymentContract, PayrollPeriod, PayrollEntry
+)
+from .utils import calculate_work_stats_bulk
+from attendance.models import SchoolTimetable, TimetableSession, AttendanceSession
+from users.models import StudentEnrollment
+from schools.models import AcademicYear, EducationalLevel, Grade, SchoolClass, Subject
+
+User = get_user_model()
+
+
+class InvoiceTestBase(APITestCase):
+    """Grade with tuition and transport fees; students are enrolled per test"""
+
+    def setUp(self):
+        self.academic_year = AcademicYear.objects.create(
+            year="2024-2025", start_date=date(2024, 9, 1),
+            end_date=date(2025, 6, 30), is_current=True
+        )
+        level = EducationalLevel.objects.create(level="PRIMARY", name="Primary", order=1)
+        self.grade = Grade.objects.create(educational_level=level, grade_number=1, name="1st Grade")
+        self.school_class = SchoolClass.objects.create(
+            grade=self.grade, academic_year=self.academic_year, section="A"
+        )
+        self.admin = User.objects.create_user(email="admin@test.com", password="testpass", role="ADMIN")
+
+        tuition = FeeCategory.objects.create(name="Tuition")
+        transport = FeeCategory.objects.create(name="Transport")
+        FeeStructure.objects.create(
+            academic_year=self.academic_year, grade=self.grade, category=tuition, amount=Decimal("500.00")
+        )
+        FeeStructure.objects.create(
+            academic_year=self.academic_year, grade=self.grade, category=transport, amount=Decimal("150.00")
+        )
+
+        self.month = date(2024, 10, 1)
+        self.due_date = date(2024, 10, 10)
+
+    def _enroll(self, count, **enrollment_kwargs):
+        students = []
+        for index in range(count):
+            student = User.objects.create_user(
+                email=f"student{User.objects.count()}@test.com", password="testpass", role="STUDENT"
+            )
+            StudentEnrollment.objects.create(
+                student=student, school_class=self.school_class,
+                academic_year=self.academic_year, **enrollment_kwargs
+            )
+            students.append(student)
+        return students
+
+
+class BulkInvoiceGenerationTest(InvoiceTestBase):
+    """Test bulk monthly invoice generation for a grade"""
+
+    def test_generates_items_and_totals(self):
+        plain = self._enroll(1)[0]
+        rider = self._enroll(1, uses_transport=True, invoice_discount=Decimal("50.00"))[0]
+
+        summary = generate_invoices(self.grade, self.academic_year, self.month, self.due_date)
+
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(summary['items'], 4)
+        self.assertEqual(summary['total_amount'], Decimal("1100.00"))
+
+        plain_invoice = Invoice.objects.get(student=plain, month=self.month)
+        self.assertEqual(plain_invoice.total_amount, Decimal("500.00"))
+        self.assertEqual(plain_invoice.status, Invoice.Status.ISSUED)
+        rider_invoice = Invoice.objects.get(student=rider, month=self.month)
+        self.assertEqual(rider_invoice.total_amount, Decimal("600.00"))
+        self.assertEqual(
+            sorted(rider_invoice.items.values_list('description', flat=True)),
+            ["Discount", "Transport", "Tuition"]
+        )
+
+    def test_skips_students_already_invoiced(self):
+        students = self._enroll(3)
+        existing = Invoice.objects.create(
+            student=students[0], academic_year=self.academic_year, month=self.month, due_date=self.due_date
+        )
+
+        summary = generate_invoices(self.grade, self.academic_year, self.month, self.due_date)
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(summary['skipped_existing'], 1)
+        self.assertEqual(Invoice.objects.filter(student=students[0]).count(), 1)
+        self.assertFalse(existing.items.exists())
+
+        rerun = generate_invoices(self.grade, self.academic_year, self.month, self.due_date)
+        self.assertEqual(rerun['created'], 0)
+        self.assertEqual(rerun['skipped_existing'], 3)
+
+    def test_query_count_is_independent_of_grade_size(self):
+        """Benchmark: generating 5 or 60 invoices costs the same number of queries."""
+        self._enroll(5)
+        with CaptureQueriesContext(connection) as small:
+            generate_invoices(self.grade, self.academic_year, self.month, self.due_date)
+
+        self._enroll(55)
+        with CaptureQueriesContext(connection) as large:
+            summary = generate_invoices(self.grade, self.academic_year, date(2024, 11, 1), self.due_date)
+
+        self.assertEqual(summary['created'], 60)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(InvoiceItem.objects.count(), 65)
+
+    def test_generate_bulk_dry_run_writes_nothing(self):
+        self._enroll(2)
+        self.client.force_authenticate(user=self.admin)
+        payload = {
+            'grade_id': self.grade.id,
+            'academic_year_id': self.academic_year.id,
+            'month': self.month.isoformat(),
+            'due_date': self.due_date.isoformat(),
+        }
+
+        response = self.client.post('/api/finance/invoices/generate_bulk/', {**payload, 'dry_run': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(len(response.data['preview']), 2)
+        self.assertFalse(Invoice.objects.exists())
+
+        response = self.client.post('/api/finance/invoices/generate_bulk/', payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['message'], "Generated 2 invoices")
+        self.assertEqual(Invoice.objects.count(), 2)
+
+
+class InvoiceGenerationJobTest(InvoiceTestBase):
+    """Test multi-month invoice generation jobs and their checkpoint resume"""
+
+    months = ["2024-09-01", "2024-10-01", "2024-11-01"]
+
+    def _job(self, **kwargs):
+        return InvoiceGenerationJob.objects.create(
+            created_by=self.admin, academic_year=self.academic_year,
+            grade_ids=[self.grade.id], months=self.months, chunk_size=2, **kwargs
+        )
+
+    def test_job_generates_every_month_in_chunks(self):
+        self._enroll(5)
+        job = run_invoice_generation_job(self._job())
+
+        self.assertEqual(job.status, InvoiceGenerationJob.Status.COMPLETED)
+        self.assertEqual(job.processed_units, 3)
+        self.assertEqual(job.created_invoices, 15)
+        self.assertEqual(Invoice.objects.count(), 15)
+        self.assertEqual(
+            set(Invoice.objects.values_list('due_date', flat=True)),
+            {date(2024, 9, 10), date(2024, 10, 10), date(2024, 11, 10)}
+        )
+
+    def test_job_resumes_from_checkpoint(self):
+        students = sorted(self._enroll(5), key=lambda student: student.id)
+        first_month = date(2024, 9, 1)
+        # Simulate a crash after the first chunk of the first month was committed
+        generate_invoices(
+            self.grade, self.academic_year, first_month, date(2024, 9, 10),
+            student_ids=[students[0].id, students[1].id]
+        )
+        job = self._job(
+            status=InvoiceGenerationJob.Status.PROCESSING, created_invoices=2,
+            checkpoint={'unit': f"{self.grade.id}:2024-09-01", 'last_student_id': students[1].id},
+        )
+
+        job = run_invoice_generation_job(job)
+
+        self.assertEqual(job.status, InvoiceGenerationJob.Status.COMPLETED)
+        self.assertEqual(job.created_invoices, 15)
+        self.assertEqual(job.skipped_invoices, 0)
+        self.assertEqual(Invoice.objects.filter(month=first_month).count(), 5)
+        self.assertEqual(Invoice.objects.count(), 15)
+
+    def test_running_job_is_claimed_once(self):
+        job = self._job()
+        competing = InvoiceGenerationJob.objects.get(pk=job.pk)
+
+        self.assertTrue(claim_invoice_generation_job(job, timedelta(minutes=5)))
+        # Read before the claim: the conditional UPDATE no longer matches
+        self.assertFalse(claim_invoice_generation_job(competing, timedelta(minutes=5)))
+        # Fresh read, but the job is PROCESSING and not stale yet
+        competing.refresh_from_db()
+        self.assertFalse(claim_invoice_generation_job(competing, timedelta(minutes=5)))
+        self.assertEqual(InvoiceGenerationJob.objects.get(pk=job.pk).attempts, 1)
+
+    def test_taken_over_run_rolls_back_its_chunk(self):
+        self._enroll(5)
+        job = self._job()
+        self.assertTrue(claim_invoice_generation_job(job, timedelta(minutes=5)))
+        # Another run reclaims the job as stale while this one is still going
+        InvoiceGenerationJob.objects.filter(pk=job.pk).update(attempts=job.attempts + 1)
+
+        with self.assertRaises(InvoiceJobTakenOver):
+            run_invoice_generation_job(job)
+
+        self.assertEqual(Invoice.objects.count(), 0)
+        self.assertEqual(InvoiceGenerationJob.objects.get(pk=job.pk).created_invoices, 0)
+
+    def test_monthly_invoice_is_unique_per_student(self):
+        student = self._enroll(1)[0]
+        generate_invoices(self.grade, self.academic_year, date(2024, 9, 1), date(2024, 9, 10))
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Invoice.objects.create(
+                student=student, academic_year=self.academic_year,
+                month=date(2024, 9, 1), due_date=date(2024, 9, 10),
+            )
+        # Invoices outside the monthly cycle are not constrained
+        for _ in range(2):
+            Invoice.objects.create(student=student, academic_year=self.academic_year, due_date=date(2024, 9, 10))
+
+    @mock.patch('finance.views.start_invoice_generation_job', side_effect=run_invoice_generation_job)
+    def test_create_and_poll_job(self, start_job):
+        self._enroll(3)
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.post('/api/finance/invoice-jobs/', {
+            'academic_year_id': self.academic_year.id,
+            'months': ["2024-09-15", "2024-10-01"],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        start_job.assert_called_once()
+
+        job_id = response.data['job_id']
+        response = self.client.get(f'/api/finance/invoice-jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['completed'])
+        self.assertEqual(response.data['progress'], 100)
+        self.assertEqual(response.data['grade_ids'], [self.grade.id])
+        self.assertEqual(response.data['created_invoices'], 6)
+
+        response = self.client.post(f'/api/finance/invoice-jobs/{job_id}/resume/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_resume_of_a_running_job_conflicts(self):
+        job = self._job(status=InvoiceGenerationJob.Status.FAILED)
+        self.client.force_authenticate(user=self.admin)
+
+        with mock.patch('finance.views.start_invoice_generation_job') as start_job:
+            first = self.client.post(f'/api/finance/invoice-jobs/{job.job_id}/resume/')
+            second = self.client.post(f'/api/finance/invoice-jobs/{job.job_id}/resume/')
+
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.status_code, status.HTTP_409_CONFLICT)
+        start_job.assert_called_once()
+
+
+class PayrollGenerationTest(InvoiceTestBase):
+    """Test set-based payroll generation for a period"""
+
+    def setUp(self):
+        super().setUp()
+        self.subject = Subject.objects.create(name="Math", code="MATH")
+        self.timetable = SchoolTimetable.objects.create(
+            school_class=self.school_class, academic_year=self.academic_year, created_by=self.admin
+        )
+        self.period = PayrollPeriod.objects.create(
+            academic_year=self.academic_year, period_start=date(2024, 10, 1),
+            period_end=date(2024, 10, 31), payment_date=date(2024, 11, 1)
+        )
+        self.slot = 0
+
+    def _teacher(self, contract_type, base_amount, sessions=0, minutes=60):
+        teacher = User.objects.create_user(
+            email=f"teacher{User.objects.count()}@test.com", password="testpass", role="TEACHER"
+        )
+        EmploymentContract.objects.create(
+            employee=teacher, contract_type=contract_type, contract_number=f"C-{teacher.id}",
+            start_date=date(2024, 9, 1), base_amount=Decimal(base_amount),
+            transportation_allowance=Decimal("100.00")
+        )
+        for index in range(sessions):
+            self.slot += 1
+            timetable_session = TimetableSession.objects.create(
+                timetable=self.timetable, subject=self.subject, teacher=teacher,
+                day_of_week=1 + index, session_order=self.slot,
+                start_time=time(8, 0), end_time=time(8 + minutes // 60, minutes % 60)
+            )
+            AttendanceSession.objects.create(
+                timetable_session=timetable_session, date=date(2024, 10, 1 + index),
+                teacher=teacher, status='completed'
+            )
+        return teacher
+
+    def test_work_stats_are_aggregated_per_teacher(self):
+        hourly = self._teacher('HOURLY', "80.00", sessions=3, minutes=90)
+        idle = self._teacher('HOURLY', "80.00")
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = calculate_work_stats_bulk([hourly.id, idle.id], self.period.period_start, self.period.period_end)
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(stats[hourly.id], {'hours': Decimal("4.50"), 'lessons': 3})
+        self.assertEqual(stats[idle.id], {'hours': Decimal("0.00"), 'lessons': 0})
+
+    def test_generate_creates_entries_and_totals_once(self):
+        monthly = self._teacher('FULL_TIME_MONTHLY', "6000.00")
+        hourly = self._teacher('HOURLY', "80.00", sessions=2, minutes=60)
+        per_lesson = self._teacher('PER_LESSON', "150.00", sessions=3)
+        already = self._teacher('FULL_TIME_MONTHLY', "5000.00")
+        PayrollEntry.objects.create(
+            payroll_period=self.period, employee=already,
+            contract=already.employment_contracts.get(), base_salary=Decimal("5000.00")
+        )
+
+        self.client.force_authenticate(user=self.admin)
+        url = f'/api/finance/payroll/periods/{self.period.id}/generate/'
+        response = self.client.post(url, {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created_count'], 3)
+        self.assertEqual(response.data['skipped_count'], 1)
+
+        self.assertEqual(PayrollEntry.objects.get(employee=hourly).hours_worked, Decimal("2.00"))
+        self.assertEqual(PayrollEntry.objects.get(employee=per_lesson).lessons_taught, 3)
+        entry = PayrollEntry.objects.get(employee=monthly)
+        self.assertEqual(entry.gross_salary, Decimal("6100.00"))
+        self.assertEqual(entry.net_salary, Decimal("6100.00"))
+
+        self.period.refresh_from_db()
+        self.assertEqual(self.period.employee_count, 4)
+        self.assertEqual(self.period.total_net, sum(PayrollEntry.objects.values_list('net_salary', flat=True)))
+
+    def test_preview_query_count_is_independent_of_staff_size(self):
+        """Benchmark: previewing 2 or 12 variable-pay contracts costs the same number of queries."""
+        self.client.force_authenticate(user=self.admin)
+        url = f'/api/finance/payroll/periods/{self.period.id}/preview/'
+        self._teacher('HOURLY', "80.00", sessions=2)
+        self._teacher('PER_LESSON', "150.00", sessions=1)
+
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(url)
+        self.assertEqual(response.data['employee_count'], 2)
+
+        for _ in range(5):
+            self._teacher('HOURLY', "80.00", sessions=2)
+            self._teacher('PER_LESSON', "150.00", sessions=1)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['employee_count'], 12)
+        self.assertEqual(len(small), len(large))
+        self.assertFalse(PayrollEntry.objects.exists())
+
+    def test_calculate_salary_uses_attendance_for_period(self):
+        teacher = self._teacher('HOURLY', "80.00", sessions=3, minutes=90)
+        contract = teacher.employment_contracts.get()
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.post(f'/api/finance/contracts/{contract.id}/calculate_salary/', {
+            'period_start': '2024-10-01', 'period_end': '2024-10-31'
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['hours_worked'], 4.5)
+        self.assertEqual(response.data['gross_monthly_salary'], 460.0)
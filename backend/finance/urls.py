@@ -2,6 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     FeeCategoryViewSet, FeeStructureViewSet, InvoiceViewSet, PaymentViewSet,
+    InvoiceGenerationJobViewSet,
     EmploymentContractViewSet, PayrollPeriodViewSet, PayrollEntryViewSet,
     ExpenseRecordViewSet, BudgetCategoryViewSet, BudgetViewSet,
     FinancialTransactionViewSet, ReportsViewSet
@@ -11,6 +12,7 @@ router = DefaultRouter()
 # Student fee management (existing)
 router.register(r'fee-categories', FeeCategoryViewSet)
 router.register(r'fee-structures', FeeStructureViewSet)
+router.register(r'invoice-jobs', InvoiceGenerationJobViewSet, basename='invoice-job')
 router.register(r'invoices', InvoiceViewSet)
 router.register(r'payments', PaymentViewSet)
 
@@ -1,47 +1,52 @@
 from decimal import Decimal
-from datetime import datetime, date, timedelta
-from django.db.models import Sum
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
 from attendance.models import AttendanceSession
 
 def calculate_work_stats(employee, start_date, end_date):
     """
     Calculate total hours worked and lessons taught for an employee
     within a specific date range based on COMPLETED attendance sessions.
-    
+    `employee` may be a User or a user id.
+
     Returns:
         dict: {'hours': Decimal, 'lessons': int}
     """
-    # 1. Filter relevant attendance sessions
-    sessions = AttendanceSession.objects.filter(
-        teacher=employee,
-        date__gte=start_date,
-        date__lte=end_date,
-        status='completed'  # Only count completed sessions
-    ).select_related('timetable_session')
+    employee_id = getattr(employee, 'pk', employee)
+    return calculate_work_stats_bulk([employee_id], start_date, end_date)[employee_id]
 
-    total_lessons = sessions.count()
-    total_seconds = 0
 
-    for session in sessions:
-        # Calculate duration of the session
-        ts = session.timetable_session
-        if ts.start_time and ts.end_time:
-            # Simple subtraction for time objects
-            # We convert to dummy datetime to subtract
-            dummy_date = date(2000, 1, 1)
-            start = datetime.combine(dummy_date, ts.start_time)
-            end = datetime.combine(dummy_date, ts.end_time)
-            
-            duration = end - start
-            total_seconds += duration.total_seconds()
+def calculate_work_stats_bulk(employee_ids, start_date, end_date):
+    """
+    Work stats of many employees in one grouped query: lesson counts and session durations
+    (TimetableSession end_time - start_time) are aggregated in the database per teacher.
 
-    # Convert seconds to hours (Decimal)
-    total_hours = Decimal(total_seconds) / Decimal(3600)
-    
-    # Round to 2 decimal places
-    total_hours = round(total_hours, 2)
+    Returns:
+        dict: {employee_id: {'hours': Decimal, 'lessons': int}}; employees without
+        completed sessions get zero hours and lessons.
+    """
+    rows = (
+        AttendanceSession.objects.filter(
+            teacher_id__in=employee_ids,
+            date__gte=start_date,
+            date__lte=end_date,
+            status='completed'  # Only count completed sessions
+        )
+        .values('teacher_id')
+        .annotate(
+            lessons=Count('id'),
+            duration=Sum(ExpressionWrapper(
+                F('timetable_session__end_time') - F('timetable_session__start_time'),
+                output_field=DurationField()
+            )),
+        )
+        .order_by()
+    )
 
-    return {
-        'hours': total_hours,
-        'lessons': total_lessons
-    }
+    stats = {employee_id: {'hours': Decimal('0.00'), 'lessons': 0} for employee_id in employee_ids}
+    for row in rows:
+        seconds = row['duration'].total_seconds() if row['duration'] else 0
+        stats[row['teacher_id']] = {
+            'hours': round(Decimal(seconds) / Decimal(3600), 2),
+            'lessons': row['lessons'],
+        }
+    return stats
@@ -1,19 +1,24 @@
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db import transaction
+from django.db import transaction, connection
 from django.db.models import Q, Sum, Count, Avg
 from django.db.models.functions import TruncMonth, TruncQuarter
-from datetime import date, datetime
+from django.utils import timezone
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import logging
+import threading
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet, CharFilter
 from .models import (
-    FeeCategory, FeeStructure, Invoice, InvoiceItem, Payment,
+    FeeCategory, FeeStructure, Invoice, Payment, InvoiceGenerationJob,
     EmploymentContract, PayrollPeriod, PayrollEntry,
     ExpenseRecord, BudgetCategory, Budget, FinancialTransaction, TransactionType
 )
 from .serializers import (
     FeeCategorySerializer, FeeStructureSerializer, InvoiceSerializer,
     InvoiceCreateSerializer, PaymentSerializer, BulkInvoiceGenerateSerializer,
+    InvoiceGenerationJobSerializer, InvoiceGenerationJobCreateSerializer,
     EmploymentContractSerializer, EmploymentContractCreateSerializer,
     PayrollPeriodSerializer, PayrollPeriodCreateSerializer, PayrollPeriodListSerializer,
     PayrollEntrySerializer, PayrollEntryCreateSerializer,
@@ -24,7 +29,11 @@ from .serializers import (
     RecordExpensePaymentSerializer, BatchApproveExpensesSerializer,
     FinancialTransactionSerializer
 )
-from .utils import calculate_work_stats
+from .utils import calculate_work_stats, calculate_work_stats_bulk
+from .invoicing import (
+    generate_invoices, claim_invoice_generation_job, run_invoice_generation_job,
+    InvoiceJobTakenOver, NoRecurringFeesError,
+)
 from .permissions import IsFinanceAdmin, CanViewPayroll, CanManageContracts, CanApproveExpenses
 from .filters import FinancialTransactionFilter, ExpenseRecordFilter
 from .pagination import CustomPageNumberPagination
@@ -33,6 +42,9 @@ from schools.models import Grade, AcademicYear
 from django.contrib.contenttypes.models import ContentType
 from media.models import MediaFile, MediaRelation
 
+logger = logging.getLogger(__name__)
+
+
 class IsAdminOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.method in permissions.SAFE_METHODS:
@@ -116,72 +128,23 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             month = serializer.validated_data['month']
             due_date = serializer.validated_data['due_date']
             academic_year_id = serializer.validated_data['academic_year_id']
+            dry_run = serializer.validated_data['dry_run']
 
             try:
                 grade = Grade.objects.get(id=grade_id)
                 academic_year = AcademicYear.objects.get(id=academic_year_id)
-                
-                # Get all students in this grade
-                # Assuming StudentEnrollment links student to class, and class to grade
-                # For now, let's assume we can filter Users by some means or through enrollments
-                # This part depends on how students are linked to grades in your system.
-                # Let's assume we look up enrollments.
-                from users.models import StudentEnrollment
-                enrollments = StudentEnrollment.objects.filter(
-                    school_class__grade=grade, 
-                    academic_year=academic_year,
-                    is_active=True
-                ).select_related('student')
-                
-                # Get fee structure for this grade
-                fees = FeeStructure.objects.filter(grade=grade, academic_year=academic_year, category__fee_type='RECURRING').select_related('category')
-                
-                if not fees.exists():
-                    return Response({"error": "No recurring fees defined for this grade"}, status=status.HTTP_400_BAD_REQUEST)
-
-                created_count = 0
-                with transaction.atomic():
-                    for enrollment in enrollments:
-                        student = enrollment.student
-                        # Check if invoice already exists for this month
-                        if Invoice.objects.filter(student=student, month=month).exists():
-                            continue
-                        
-                        invoice = Invoice.objects.create(
-                            student=student,
-                            academic_year=academic_year,
-                            month=month,
-                            due_date=due_date,
-                            status='ISSUED'
-                        )
-                        
-                        for fee in fees:
-                            # Check if this is a transport fee (case-insensitive check on name)
-                            is_transport = 'transport' in fee.category.name.lower()
-                            
-                            # Only add transport fee if student uses transport
-                            if is_transport and not enrollment.uses_transport:
-                                continue
-
-                            InvoiceItem.objects.create(
-                                invoice=invoice,
-                                description=fee.category.name,
-                                amount=fee.amount
-                            )
-                        
-                        # Apply invoice-wide discount if any
-                        if enrollment.invoice_discount > 0:
-                            InvoiceItem.objects.create(
-                                invoice=invoice,
-                                description="Discount",
-                                amount=-enrollment.invoice_discount
-                            )
-                        
-                        created_count += 1
-                
-                return Response({"message": f"Generated {created_count} invoices"}, status=status.HTTP_201_CREATED)
 
+                summary = generate_invoices(grade, academic_year, month, due_date, dry_run=dry_run)
+
+                if dry_run:
+                    summary['message'] = f"{summary['created']} invoices would be generated"
+                    return Response(summary, status=status.HTTP_200_OK)
+
+                summary['message'] = f"Generated {summary['created']} invoices"
+                return Response(summary, status=status.HTTP_201_CREATED)
 
+            except NoRecurringFeesError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
             except Grade.DoesNotExist:
                 return Response({"error": "Grade not found"}, status=status.HTTP_404_NOT_FOUND)
             except Exception as e:
@@ -189,6 +152,87 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _run_invoice_generation_async(job_id, attempts):
+    """Run a claimed invoice generation job in a background thread"""
+    try:
+        job = InvoiceGenerationJob.objects.select_related('academic_year').get(job_id=job_id, attempts=attempts)
+        run_invoice_generation_job(job)
+        logger.info(f"Invoice generation job {job_id} completed successfully")
+    except (InvoiceGenerationJob.DoesNotExist, InvoiceJobTakenOver):
+        logger.warning(f"Invoice generation job {job_id} was taken over by another run")
+    except Exception as e:
+        logger.error(f"Invoice generation job {job_id} failed: {str(e)}")
+        InvoiceGenerationJob.objects.filter(job_id=job_id, attempts=attempts).update(
+            status=InvoiceGenerationJob.Status.FAILED,
+            error_message=str(e),
+            completed_at=timezone.now()
+        )
+    finally:
+        connection.close()
+
+
+def start_invoice_generation_job(job):
+    """Run `job` in the background; the caller must have claimed it (claim_invoice_generation_job)."""
+    thread = threading.Thread(target=_run_invoice_generation_async, args=(job.job_id, job.attempts))
+    thread.daemon = True
+    thread.start()
+
+
+class InvoiceGenerationJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Multi-month / multi-grade invoice generation.
+    POST creates a job processed in the background; GET polls its progress;
+    POST <job_id>/resume/ restarts a failed or interrupted job from its checkpoint.
+    """
+    queryset = InvoiceGenerationJob.objects.all()
+    serializer_class = InvoiceGenerationJobSerializer
+    permission_classes = [IsAdminOrReadOnly]
+    lookup_field = 'job_id'
+
+    # A PROCESSING job without checkpoint activity for this long is considered interrupted
+    STALE_AFTER = timedelta(minutes=5)
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_authenticated and user.role in ['ADMIN', 'STAFF']:
+            return InvoiceGenerationJob.objects.all()
+        return InvoiceGenerationJob.objects.none()
+
+    def create(self, request):
+        serializer = InvoiceGenerationJobCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        job = InvoiceGenerationJob.objects.create(
+            created_by=request.user,
+            academic_year_id=data['academic_year_id'],
+            grade_ids=data['grade_ids'],
+            months=[month.isoformat() for month in data['months']],
+            due_day=data['due_day'],
+            chunk_size=data['chunk_size'],
+            total_units=len(data['grade_ids']) * len(data['months']),
+            current_status='Queued'
+        )
+        claim_invoice_generation_job(job, self.STALE_AFTER)
+        start_invoice_generation_job(job)
+
+        return Response(InvoiceGenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, job_id=None):
+        job = self.get_object()
+        if job.status == InvoiceGenerationJob.Status.COMPLETED:
+            return Response({"error": "Job already completed"}, status=status.HTTP_400_BAD_REQUEST)
+        # Conditional claim: of two concurrent resumes (or a resume racing the command) one wins
+        if not claim_invoice_generation_job(job, self.STALE_AFTER):
+            return Response({"error": "Job is still running"}, status=status.HTTP_409_CONFLICT)
+
+        job.current_status = 'Resuming...'
+        job._save_if_claimed(['current_status'])
+        start_invoice_generation_job(job)
+        return Response(InvoiceGenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
@@ -244,6 +288,7 @@ class EmploymentContractViewSet(viewsets.ModelViewSet):
         Calculate estimated monthly salary for a contract.
         POST /api/finance/contracts/{id}/calculate-salary/
         Body: {"hours_worked": 160, "lessons_taught": 20} (optional, for variable contracts)
+              or {"period_start": "2024-10-01", "period_end": "2024-10-31"} to use attendance data
         """
         contract = self.get_object()
         serializer = CalculateSalarySerializer(data=request.data)
@@ -252,6 +297,16 @@ class EmploymentContractViewSet(viewsets.ModelViewSet):
             hours_worked = serializer.validated_data.get('hours_worked')
             lessons_taught = serializer.validated_data.get('lessons_taught')
 
+            # Derive actual work from completed attendance sessions when a period is given
+            period_start = serializer.validated_data.get('period_start')
+            period_end = serializer.validated_data.get('period_end')
+            if period_start and period_end and contract.contract_type in ['HOURLY', 'PER_LESSON']:
+                stats = calculate_work_stats(contract.employee_id, period_start, period_end)
+                if hours_worked is None and contract.contract_type == 'HOURLY':
+                    hours_worked = stats['hours']
+                if lessons_taught is None and contract.contract_type == 'PER_LESSON':
+                    lessons_taught = stats['lessons']
+
             gross_salary = contract.calculate_gross_monthly_salary(
                 hours_worked=hours_worked,
                 lessons_taught=lessons_taught
@@ -313,6 +368,70 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
         """Set created_by when creating a period"""
         serializer.save(created_by=self.request.user)
 
+    def _period_contracts(self, period, include_ids=None, exclude_ids=None):
+        """Active contracts valid for the period, with optional include/exclude employee filters"""
+        contracts = EmploymentContract.objects.filter(
+            is_active=True,
+            start_date__lte=period.period_end
+        ).filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=period.period_start)
+        )
+
+        # Apply include/exclude filters
+        if include_ids:
+            contracts = contracts.filter(employee_id__in=include_ids)
+        if exclude_ids:
+            contracts = contracts.exclude(employee_id__in=exclude_ids)
+        return contracts
+
+    def _variable_work_stats(self, period, contracts):
+        """Hours and lessons of every variable-pay employee, in one grouped query"""
+        variable_employee_ids = {
+            contract.employee_id for contract in contracts
+            if contract.contract_type in ['HOURLY', 'PER_LESSON']
+        }
+        return calculate_work_stats_bulk(variable_employee_ids, period.period_start, period.period_end)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsFinanceAdmin])
+    def preview(self, request, pk=None):
+        """
+        Estimated gross salaries of every contract valid for the period, without creating entries.
+        GET /api/finance/payroll/periods/{id}/preview/
+        """
+        period = self.get_object()
+        contracts = list(
+            self._period_contracts(period).select_related('employee').order_by('employee_id', 'id')
+        )
+        work_stats = self._variable_work_stats(period, contracts)
+
+        rows = []
+        total_gross = Decimal('0')
+        for contract in contracts:
+            stats = work_stats.get(contract.employee_id, {})
+            hours_worked = stats.get('hours') if contract.contract_type == 'HOURLY' else None
+            lessons_taught = stats.get('lessons') if contract.contract_type == 'PER_LESSON' else None
+            gross_salary = contract.calculate_gross_monthly_salary(
+                hours_worked=hours_worked,
+                lessons_taught=lessons_taught
+            )
+            total_gross += gross_salary
+            rows.append({
+                'contract_id': contract.id,
+                'employee_id': contract.employee_id,
+                'employee_name': contract.employee.get_full_name(),
+                'contract_type': contract.contract_type,
+                'hours_worked': float(hours_worked) if hours_worked is not None else None,
+                'lessons_taught': lessons_taught,
+                'gross_monthly_salary': float(gross_salary),
+            })
+
+        return Response({
+            'period_id': period.id,
+            'employee_count': len(rows),
+            'total_gross': float(total_gross),
+            'entries': rows,
+        })
+
     @action(detail=True, methods=['post'], permission_classes=[IsFinanceAdmin])
     def generate(self, request, pk=None):
         """
@@ -335,59 +454,53 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
         include_ids = serializer.validated_data.get('include_employee_ids', [])
         exclude_ids = serializer.validated_data.get('exclude_employee_ids', [])
 
-        # Get active contracts that are valid for this period
-        contracts = EmploymentContract.objects.filter(
-            is_active=True,
-            start_date__lte=period.period_end
-        ).filter(
-            Q(end_date__isnull=True) | Q(end_date__gte=period.period_start)
+        contracts = list(self._period_contracts(period, include_ids, exclude_ids).order_by('employee_id', 'id'))
+        existing_employee_ids = set(
+            PayrollEntry.objects.filter(payroll_period=period).values_list('employee_id', flat=True)
         )
 
-        # Apply include/exclude filters
-        if include_ids:
-            contracts = contracts.filter(employee_id__in=include_ids)
-        if exclude_ids:
-            contracts = contracts.exclude(employee_id__in=exclude_ids)
+        work_stats = self._variable_work_stats(period, contracts)
 
-        created_count = 0
+        entries = []
         skipped_count = 0
+        for contract in contracts:
+            # Skip if entry already exists (or another contract of the employee was just used)
+            if contract.employee_id in existing_employee_ids:
+                skipped_count += 1
+                continue
+            existing_employee_ids.add(contract.employee_id)
+
+            # Calculate variable stats if applicable
+            hours_worked = None
+            lessons_taught = None
+
+            if contract.contract_type == 'HOURLY':
+                hours_worked = work_stats[contract.employee_id]['hours']
+            elif contract.contract_type == 'PER_LESSON':
+                lessons_taught = work_stats[contract.employee_id]['lessons']
+
+            entry = PayrollEntry(
+                payroll_period=period,
+                employee_id=contract.employee_id,
+                contract=contract,
+                base_salary=contract.base_amount,
+                transportation_allowance=contract.transportation_allowance,
+                housing_allowance=contract.housing_allowance,
+                other_allowances=contract.other_allowances,
+                hours_worked=hours_worked,
+                lessons_taught=lessons_taught,
+                # Deductions can be set manually later
+                social_security=0,
+                income_tax=0,
+            )
+            # bulk_create skips PayrollEntry.save(): compute the amounts here
+            entry.calculate_net()
+            entries.append(entry)
 
         with transaction.atomic():
-            for contract in contracts:
-                # Skip if entry already exists
-                if PayrollEntry.objects.filter(payroll_period=period, employee=contract.employee).exists():
-                    skipped_count += 1
-                    continue
-
-                # Calculate variable stats if applicable
-                hours_worked = None
-                lessons_taught = None
-
-                if contract.contract_type in ['HOURLY', 'PER_LESSON']:
-                    stats = calculate_work_stats(contract.employee, period.period_start, period.period_end)
-                    if contract.contract_type == 'HOURLY':
-                        hours_worked = stats['hours']
-                    elif contract.contract_type == 'PER_LESSON':
-                        lessons_taught = stats['lessons']
-
-                # Calculate base salary from contract (uses actual stats if provided)
-                base_salary = contract.calculate_gross_monthly_salary(hours_worked=hours_worked, lessons_taught=lessons_taught)
-
-                PayrollEntry.objects.create(
-                    payroll_period=period,
-                    employee=contract.employee,
-                    contract=contract,
-                    base_salary=contract.base_amount,
-                    transportation_allowance=contract.transportation_allowance,
-                    housing_allowance=contract.housing_allowance,
-                    other_allowances=contract.other_allowances,
-                    hours_worked=hours_worked,
-                    lessons_taught=lessons_taught,
-                    # Deductions can be set manually later
-                    social_security=0,
-                    income_tax=0,
-                )
-                created_count += 1
+            PayrollEntry.objects.bulk_create(entries, batch_size=500)
+            period.recalculate_totals()
+        created_count = len(entries)
 
         return Response({
             'message': f'Generated {created_count} payroll entries, skipped {skipped_count} existing',
@@ -17,7 +17,9 @@ from .models import (
     # Submission Models
     Submission, QuestionAnswer, AnswerFile, BookExerciseAnswer, BookExerciseFile,
     # Exercise Submission Models
-    ExerciseSubmission, ExerciseAnswer, ExerciseAnswerFile
+    ExerciseSubmission, ExerciseAnswer, ExerciseAnswerFile,
+    # Regrade Jobs
+    HomeworkRegradeJob
 )
 
 # Reward System Admin
@@ -321,3 +323,10 @@ class BookExerciseFileAdmin(admin.ModelAdmin):
     list_display = ['filename', 'book_exercise_answer', 'file_type', 'uploaded_at', 'uploaded_by']
     list_filter = ['file_type', 'uploaded_at']
     search_fields = ['filename', 'book_exercise_answer__submission__student__username']
+
+@admin.register(HomeworkRegradeJob)
+class HomeworkRegradeJobAdmin(admin.ModelAdmin):
+    list_display = ['job_id', 'homework', 'status', 'progress', 'processed_records', 'total_records', 'created_by', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['homework__title', 'created_by__email']
+    readonly_fields = ['job_id', 'results', 'created_at', 'started_at', 'completed_at']
@@ -0,0 +1,403 @@
+# homework/grading.py
+"""
+Set-based auto-grading for homework submissions.
+
+The answer key of a homework is loaded once (a handful of queries, whatever the number
+of questions) and cached under the homework's updated_at stamp; homework.signals bumps
+that stamp whenever a question or any part of its key changes. Submissions are then
+graded in a single pass over their answers and written back with bulk_update, so the
+number of queries per submission does not grow with the number of questions.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Homework, Question, QuestionChoice, FillBlankOption, OrderingItem, MatchingPair,
+    Submission, QuestionAnswer, AnswerFillBlankSelection, AnswerOrderingSelection, AnswerMatchingSelection,
+    StudentWallet, RewardTransaction,
+)
+from .rewards import get_reward_config, calculate_submission_rewards
+from .signals import submissions_regraded
+
+ANSWER_KEY_CACHE_TIMEOUT = 60 * 60
+
+CHOICE_TYPES = ('qcm_single', 'qcm_multiple', 'true_false')
+
+REGRADABLE_STATUSES = ('submitted', 'late', 'auto_graded', 'manually_graded')
+
+
+def _answer_key_cache_key(homework):
+    return f"homework:answer-key:{homework.pk}:{homework.updated_at.isoformat()}"
+
+
+def build_answer_key(homework_id):
+    """
+    Load the answer key of a homework into plain dicts keyed by question id:
+    {'type', 'points', 'correct_choices', 'blanks', 'ordering', 'pairs'}.
+    """
+    key = {}
+    for question_id, question_type, points in Question.objects.filter(
+        homework_id=homework_id,
+        question_type__in=Homework.AUTO_GRADE_SUPPORTED_TYPES,
+    ).values_list('id', 'question_type', 'points'):
+        key[question_id] = {
+            'type': question_type,
+            'points': points,
+            'correct_choices': set(),
+            'blanks': {},
+            'ordering': {},
+            'pairs': set(),
+        }
+
+    types = {entry['type'] for entry in key.values()}
+
+    if types & set(CHOICE_TYPES):
+        for question_id, choice_id in QuestionChoice.objects.filter(
+            question__homework_id=homework_id, is_correct=True
+        ).values_list('question_id', 'id'):
+            if question_id in key:
+                key[question_id]['correct_choices'].add(choice_id)
+
+    if 'fill_blank' in types:
+        for question_id, blank_id, option_id, is_correct in FillBlankOption.objects.filter(
+            blank__question__homework_id=homework_id
+        ).values_list('blank__question_id', 'blank_id', 'id', 'is_correct'):
+            if question_id in key:
+                correct = key[question_id]['blanks'].setdefault(blank_id, set())
+                if is_correct:
+                    correct.add(option_id)
+
+    if 'ordering' in types:
+        for question_id, item_id, position in OrderingItem.objects.filter(
+            question__homework_id=homework_id
+        ).values_list('question_id', 'id', 'correct_position'):
+            if question_id in key:
+                key[question_id]['ordering'][item_id] = position
+
+    if 'matching' in types:
+        for question_id, pair_id in MatchingPair.objects.filter(
+            question__homework_id=homework_id
+        ).values_list('question_id', 'id'):
+            if question_id in key:
+                key[question_id]['pairs'].add(pair_id)
+
+    return key
+
+
+def get_answer_key(homework):
+    """Return the (cached) answer key for a homework instance."""
+    cache_key = _answer_key_cache_key(homework)
+    key = cache.get(cache_key)
+    if key is None:
+        key = build_answer_key(homework.pk)
+        cache.set(cache_key, key, ANSWER_KEY_CACHE_TIMEOUT)
+    return key
+
+
+def _blank_selection_is_correct(entry, selection):
+    return selection.selected_option_id in entry['blanks'].get(selection.blank_id, ())
+
+
+def _grade_answer(entry, selected_choices, blank_selections, ordering_selections, matching_selections):
+    """Return True/False for one answer given its selections and the question's key entry."""
+    question_type = entry['type']
+
+    if question_type in ('qcm_single', 'true_false'):
+        # Single choice: must select exactly one correct answer
+        return len(selected_choices) == 1 and next(iter(selected_choices)) in entry['correct_choices']
+
+    if question_type == 'qcm_multiple':
+        # Multiple choice: must select all correct answers and no incorrect ones
+        return selected_choices == entry['correct_choices']
+
+    if question_type == 'fill_blank':
+        blanks = entry['blanks']
+        return bool(blanks) and len(blank_selections) == len(blanks) and all(
+            _blank_selection_is_correct(entry, selection) for selection in blank_selections
+        )
+
+    if question_type == 'ordering':
+        ordering = entry['ordering']
+        positions = {selection.item_id: selection.selected_position for selection in ordering_selections}
+        return bool(ordering) and all(
+            positions.get(item_id) == position for item_id, position in ordering.items()
+        )
+
+    if question_type == 'matching':
+        pairs = entry['pairs']
+        return bool(pairs) and len(matching_selections) == len(pairs) and all(
+            selection.left_pair_id == selection.selected_right_pair_id for selection in matching_selections
+        )
+
+    return False
+
+
+def grade_submissions(submissions, answer_key=None):
+    """
+    Auto-grade the answers of several submissions of the same homework.
+
+    Updates QuestionAnswer.is_correct/points_earned (and the per-selection is_correct
+    flags that depend on the key) with bulk_update and returns {submission_id: auto_score}.
+    Submission rows themselves are left to the caller.
+    """
+    submissions = list(submissions)
+    if not submissions:
+        return {}
+
+    homework_ids = {submission.homework_id for submission in submissions}
+    if len(homework_ids) != 1:
+        raise ValueError("grade_submissions expects submissions of a single homework")
+
+    if answer_key is None:
+        answer_key = get_answer_key(submissions[0].homework)
+
+    submission_ids = [submission.id for submission in submissions]
+    scores = {submission_id: Decimal('0') for submission_id in submission_ids}
+
+    answers = list(
+        QuestionAnswer.objects.filter(
+            submission_id__in=submission_ids,
+            question_id__in=list(answer_key),
+        ).only('id', 'submission_id', 'question_id', 'is_correct', 'points_earned')
+    )
+    if not answers:
+        return scores
+
+    answer_ids = [answer.id for answer in answers]
+    types = {answer_key[answer.question_id]['type'] for answer in answers}
+
+    selected_choices = defaultdict(set)
+    if types & set(CHOICE_TYPES):
+        through = QuestionAnswer.selected_choices.through
+        for answer_id, choice_id in through.objects.filter(
+            questionanswer_id__in=answer_ids
+        ).values_list('questionanswer_id', 'questionchoice_id'):
+            selected_choices[answer_id].add(choice_id)
+
+    blank_selections = defaultdict(list)
+    if 'fill_blank' in types:
+        for selection in AnswerFillBlankSelection.objects.filter(question_answer_id__in=answer_ids):
+            blank_selections[selection.question_answer_id].append(selection)
+
+    ordering_selections = defaultdict(list)
+    if 'ordering' in types:
+        for selection in AnswerOrderingSelection.objects.filter(question_answer_id__in=answer_ids):
+            ordering_selections[selection.question_answer_id].append(selection)
+
+    matching_selections = defaultdict(list)
+    if 'matching' in types:
+        for selection in AnswerMatchingSelection.objects.filter(question_answer_id__in=answer_ids):
+            matching_selections[selection.question_answer_id].append(selection)
+
+    changed_blank_selections = []
+    changed_ordering_selections = []
+
+    for answer in answers:
+        entry = answer_key[answer.question_id]
+
+        # Keep per-selection flags in line with the current key (they matter after regrades)
+        for selection in blank_selections[answer.id]:
+            is_correct = _blank_selection_is_correct(entry, selection)
+            if selection.is_correct != is_correct:
+                selection.is_correct = is_correct
+                changed_blank_selections.append(selection)
+        for selection in ordering_selections[answer.id]:
+            is_correct = entry['ordering'].get(selection.item_id) == selection.selected_position
+            if selection.is_correct != is_correct:
+                selection.is_correct = is_correct
+                changed_ordering_selections.append(selection)
+
+        is_correct = _grade_answer(
+            entry,
+            selected_choices[answer.id],
+            blank_selections[answer.id],
+            ordering_selections[answer.id],
+            matching_selections[answer.id],
+        )
+        answer.is_correct = is_correct
+        answer.points_earned = entry['points'] if is_correct else Decimal('0')
+        scores[answer.submission_id] += answer.points_earned
+
+    QuestionAnswer.objects.bulk_update(answers, ['is_correct', 'points_earned'], batch_size=500)
+    AnswerFillBlankSelection.objects.bulk_update(changed_blank_selections, ['is_correct'], batch_size=500)
+    AnswerOrderingSelection.objects.bulk_update(changed_ordering_selections, ['is_correct'], batch_size=500)
+
+    return scores
+
+
+def grade_submission(submission, answer_key=None):
+    """Auto-grade a single submission and return its auto score."""
+    return grade_submissions([submission], answer_key=answer_key)[submission.id]
+
+
+def _apply_reward_deltas(submissions, homework, reward_config, previous, awarded_by=None):
+    """
+    Re-run the reward rules for regraded submissions and award only the difference with what
+    was already granted, so repeated regrades never create duplicate RewardTransaction rows.
+    `previous` maps submission id -> (rewards_calculated, points_earned, coins_earned, was_perfect).
+    """
+    wallets = {
+        wallet.student_id: wallet
+        for wallet in StudentWallet.objects.filter(student_id__in={s.student_id for s in submissions})
+    }
+    new_wallets = {}
+    transactions = []
+    points_delta_total = 0
+
+    for submission in submissions:
+        already_awarded, old_points, old_coins, was_perfect = previous[submission.id]
+        points, coins = calculate_submission_rewards(submission, homework, reward_config)
+        delta_points = points - (old_points if already_awarded else 0)
+        delta_coins = coins - (old_coins if already_awarded else 0)
+        is_perfect = submission.total_score == homework.total_points
+
+        submission.points_earned = points
+        submission.coins_earned = coins
+        submission.rewards_calculated = True
+
+        if not (delta_points or delta_coins or not already_awarded or is_perfect != was_perfect):
+            continue
+
+        wallet = wallets.get(submission.student_id) or new_wallets.get(submission.student_id)
+        if wallet is None:
+            wallet = new_wallets[submission.student_id] = StudentWallet(student_id=submission.student_id)
+
+        wallet.total_points = max(0, wallet.total_points + delta_points)
+        wallet.weekly_points = max(0, wallet.weekly_points + delta_points)
+        wallet.total_coins = max(0, wallet.total_coins + delta_coins)
+        if not already_awarded:
+            wallet.assignments_completed += 1
+        if is_perfect != was_perfect:
+            wallet.perfect_scores = max(0, wallet.perfect_scores + (1 if is_perfect else -1))
+
+        if not already_awarded:
+            transaction_type, reason = 'earned', f"Completed homework: {homework.title}"
+        elif delta_points >= 0 and delta_coins >= 0:
+            transaction_type, reason = 'bonus', f"Regrade adjustment: {homework.title}"
+        else:
+            transaction_type, reason = 'penalty', f"Regrade adjustment: {homework.title}"
+
+        if delta_points or delta_coins or not already_awarded:
+            transactions.append(RewardTransaction(
+                student_id=submission.student_id,
+                homework=homework,
+                submission=submission,
+                transaction_type=transaction_type,
+                points_earned=delta_points,
+                coins_earned=delta_coins,
+                reason=reason,
+                awarded_by=awarded_by,
+            ))
+            points_delta_total += delta_points
+
+    wallet_fields = ['total_points', 'weekly_points', 'total_coins', 'assignments_completed', 'perfect_scores']
+    StudentWallet.objects.bulk_update(list(wallets.values()), wallet_fields, batch_size=500)
+    StudentWallet.objects.bulk_create(list(new_wallets.values()))
+    RewardTransaction.objects.bulk_create(transactions, batch_size=500)
+
+    return len(transactions), points_delta_total
+
+
+def regrade_homework(homework, job=None, chunk_size=200, awarded_by=None):
+    """
+    Regrade every submitted submission of a homework against its current answer key.
+
+    Works in chunks of `chunk_size` submissions, each in its own transaction: answers are
+    graded set-based, submissions are written with bulk_update and reward deltas applied.
+    Progress is reported on `job` (a HomeworkRegradeJob) when given. Returns a summary dict.
+    Totals keep any part the teacher graded by hand. Homework with auto_grade_qcm off only
+    gets its auto scores updated: statuses and rewards are left to the teacher.
+    """
+    if awarded_by is None and job is not None:
+        awarded_by = job.created_by
+
+    answer_key = build_answer_key(homework.pk)
+    cache.set(_answer_key_cache_key(homework), answer_key, ANSWER_KEY_CACHE_TIMEOUT)
+    reward_config = get_reward_config(homework)
+
+    submission_ids = list(
+        Submission.objects.filter(homework=homework, status__in=REGRADABLE_STATUSES)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    total = len(submission_ids)
+    if job is not None:
+        job.mark_started(total)
+
+    summary = {
+        'homework_id': homework.pk,
+        'submissions': total,
+        'scores_changed': 0,
+        'reward_transactions': 0,
+        'points_delta': 0,
+    }
+
+    for start in range(0, total, chunk_size):
+        chunk_ids = submission_ids[start:start + chunk_size]
+        with transaction.atomic():
+            submissions = list(Submission.objects.select_for_update().filter(id__in=chunk_ids))
+            for submission in submissions:
+                submission.homework = homework
+
+            scores = grade_submissions(submissions, answer_key=answer_key)
+
+            previous = {}
+            now = timezone.now()
+            for submission in submissions:
+                previous[submission.id] = (
+                    submission.rewards_calculated,
+                    submission.points_earned or 0,
+                    submission.coins_earned or 0,
+                    submission.rewards_calculated and submission.total_score == homework.total_points,
+                )
+                auto_score = scores[submission.id]
+                if submission.total_score is not None:
+                    # Only the auto-graded part moves: keeps a total the teacher set directly
+                    total_score = submission.total_score - (submission.auto_score or 0) + auto_score
+                elif homework.auto_grade_qcm:
+                    total_score = auto_score + (submission.manual_score or 0)
+                else:
+                    # Not graded yet and not meant to be graded automatically
+                    total_score = None
+                if submission.total_score != total_score:
+                    summary['scores_changed'] += 1
+                submission.auto_score = auto_score
+                submission.total_score = total_score
+                if homework.auto_grade_qcm and submission.status in ('submitted', 'late'):
+                    submission.status = 'auto_graded'
+                submission.updated_at = now
+
+            # Rewards follow automatic grading only, like the submit path
+            if homework.auto_grade_qcm:
+                transactions_created, points_delta = _apply_reward_deltas(
+                    submissions, homework, reward_config, previous, awarded_by=awarded_by
+                )
+                summary['reward_transactions'] += transactions_created
+                summary['points_delta'] += points_delta
+
+            Submission.objects.bulk_update(
+                submissions,
+                ['auto_score', 'total_score', 'status', 'points_earned', 'coins_earned',
+                 'rewards_calculated', 'updated_at'],
+                batch_size=500,
+            )
+
+            # bulk_update bypasses post_save; let listeners (e.g. report rollups) catch up
+            submissions_regraded.send(
+                sender=Submission,
+                homework_id=homework.pk,
+                student_ids=[submission.student_id for submission in submissions],
+            )
+
+        if job is not None:
+            processed = start + len(chunk_ids)
+            job.update_progress(processed, f"Regraded {processed} of {total} submissions")
+
+    if job is not None:
+        job.mark_completed(summary)
+    return summary
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from homework.grading import regrade_homework
+from homework.models import Homework, HomeworkRegradeJob
+
+
+class Command(BaseCommand):
+    help = 'Regrade every submission of a homework against its current answer key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('homework_id', type=int, help='ID of the homework to regrade')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Number of submissions regraded per transaction',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            homework = Homework.objects.get(pk=options['homework_id'])
+        except Homework.DoesNotExist:
+            raise CommandError(f"Homework {options['homework_id']} does not exist")
+
+        job = HomeworkRegradeJob.objects.create(homework=homework, current_status='Started from command line')
+        self.stdout.write(f'Regrading "{homework.title}" (job {job.job_id})...')
+
+        try:
+            summary = regrade_homework(homework, job=job, chunk_size=options['chunk_size'])
+        except Exception as e:
+            job.mark_failed(str(e))
+            raise CommandError(f'Regrade failed: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[OK] Regraded {summary['submissions']} submissions: "
+            f"{summary['scores_changed']} score changes, "
+            f"{summary['reward_transactions']} reward adjustments ({summary['points_delta']:+d} points)"
+        ))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:47
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homework', '0006_alter_bookexercise_book_title_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HomeworkRegradeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('progress', models.IntegerField(default=0, help_text='Progress percentage (0-100)')),
+                ('current_status', models.CharField(blank=True, help_text='Current operation status', max_length=255)),
+                ('total_records', models.IntegerField(default=0)),
+                ('processed_records', models.IntegerField(default=0)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('results', models.JSONField(blank=True, help_text='Regrade summary (score changes, reward deltas)', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='homework_regrade_jobs', to=settings.AUTH_USER_MODEL)),
+                ('homework', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='regrade_jobs', to='homework.homework')),
+            ],
+            options={
+                'verbose_name': 'Homework Regrade Job',
+                'verbose_name_plural': 'Homework Regrade Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -7,6 +7,7 @@ from django.db.models import Sum
 from django.utils import timezone
 from cloudinary.models import CloudinaryField
 import json
+import uuid
 from decimal import Decimal
 
 # =====================================
@@ -909,6 +910,87 @@ class BookExerciseFile(models.Model):
     def __str__(self):
         return f"{self.filename} - {self.book_exercise_answer}"
 
+# =====================================
+# REGRADE JOBS
+# =====================================
+
+class HomeworkRegradeJob(models.Model):
+    """Track progress of a batch regrade of every submission of a homework"""
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        PROCESSING = 'PROCESSING', 'Processing'
+        COMPLETED = 'COMPLETED', 'Completed'
+        FAILED = 'FAILED', 'Failed'
+
+    # Job identification
+    job_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    homework = models.ForeignKey(Homework, on_delete=models.CASCADE, related_name='regrade_jobs')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='homework_regrade_jobs')
+
+    # Progress tracking
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    progress = models.IntegerField(default=0, help_text="Progress percentage (0-100)")
+    current_status = models.CharField(max_length=255, blank=True, help_text="Current operation status")
+
+    # Regrade details
+    total_records = models.IntegerField(default=0)
+    processed_records = models.IntegerField(default=0)
+
+    # Results and errors
+    error_message = models.TextField(blank=True, null=True)
+    results = models.JSONField(blank=True, null=True, help_text="Regrade summary (score changes, reward deltas)")
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Homework Regrade Job"
+        verbose_name_plural = "Homework Regrade Jobs"
+
+    def __str__(self):
+        return f"Regrade Job {self.job_id} - {self.homework_id} - {self.status}"
+
+    @property
+    def is_completed(self):
+        return self.status in [self.Status.COMPLETED, self.Status.FAILED]
+
+    def mark_started(self, total_records):
+        """Mark job as processing"""
+        self.status = self.Status.PROCESSING
+        self.total_records = total_records
+        self.started_at = timezone.now()
+        self.save(update_fields=['status', 'total_records', 'started_at'])
+
+    def update_progress(self, processed_records, status=None):
+        """Update processed count, progress percentage and status"""
+        self.processed_records = processed_records
+        if self.total_records:
+            self.progress = min(100, max(0, int(processed_records * 100 / self.total_records)))
+        if status:
+            self.current_status = status
+        self.save(update_fields=['processed_records', 'progress', 'current_status'])
+
+    def mark_completed(self, results=None):
+        """Mark job as completed with results"""
+        self.status = self.Status.COMPLETED
+        self.progress = 100
+        self.completed_at = timezone.now()
+        if results:
+            self.results = results
+        self.save()
+
+    def mark_failed(self, error_message):
+        """Mark job as failed with error message"""
+        self.status = self.Status.FAILED
+        self.error_message = error_message
+        self.completed_at = timezone.now()
+        self.save()
+
 # =====================================
 # EXERCISE SUBMISSION MODELS
 # =====================================
@@ -0,0 +1,62 @@
+# homework/rewards.py
+"""
+Reward rules for homework submissions, shared by the submission views and batch regrades.
+"""
+
+from .models import HomeworkReward
+
+
+def get_reward_config(homework):
+    """Return the homework's reward config, creating one with default values if missing."""
+    reward_config = getattr(homework, 'reward_config', None)
+    if not reward_config:
+        reward_config = HomeworkReward.objects.create(
+            homework=homework,
+            completion_points=10,
+            completion_coins=1,
+            perfect_score_bonus=20,
+            high_score_bonus=10,
+            early_submission_bonus=10,
+            on_time_bonus=5,
+            difficulty_multiplier=1.00,
+            weekend_multiplier=1.50
+        )
+    return reward_config
+
+
+def calculate_submission_rewards(submission, homework, reward_config):
+    """Return the (points, coins) a submission earns under the given reward config."""
+    points = 0
+    coins = 0
+
+    # Base completion reward
+    points += reward_config.completion_points
+    coins += reward_config.completion_coins
+
+    # Performance bonus
+    if submission.total_score and homework.total_points:
+        score_percentage = (float(submission.total_score) / float(homework.total_points)) * 100
+
+        if score_percentage >= 100:
+            points += reward_config.perfect_score_bonus
+        elif score_percentage >= 90:
+            points += reward_config.high_score_bonus
+
+    # Time bonus
+    if not submission.is_late:
+        points += reward_config.on_time_bonus
+
+        # Early submission bonus (>24h early)
+        if submission.submitted_at and homework.due_date:
+            time_diff = homework.due_date - submission.submitted_at
+            if time_diff.total_seconds() > 86400:  # 24 hours
+                points += reward_config.early_submission_bonus
+
+    # Apply multipliers
+    points = int(points * float(reward_config.difficulty_multiplier))
+
+    # Weekend bonus
+    if homework.assigned_date.weekday() >= 5:  # Saturday/Sunday
+        points = int(points * float(reward_config.weekend_multiplier))
+
+    return points, coins
@@ -1,11 +1,18 @@
 # homework/signals.py
 
 from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
+from django.dispatch import receiver, Signal
 from django.utils import timezone
 from decimal import Decimal
 from django.db.models import Sum
-from .models import ExerciseSubmission, LessonProgress, Question, Homework
+from .models import (
+    ExerciseSubmission, LessonProgress, Question, Homework,
+    QuestionChoice, FillBlank, FillBlankOption, OrderingItem, MatchingPair,
+)
+
+# Sent after a batch regrade rewrote submissions with bulk_update (no post_save is fired).
+# Arguments: homework_id, student_ids
+submissions_regraded = Signal()
 
 
 @receiver(post_save, sender=ExerciseSubmission)
@@ -38,12 +45,13 @@ def update_lesson_progress_on_exercise_completion(sender, instance, created, **k
 def _recalculate_homework_points(homework_id: int):
     """
     Keep Homework.total_points in sync with its questions.
+    Also bumps updated_at, which versions the cached answer key (see homework.grading).
     """
     if not homework_id:
         return
 
     total = Question.objects.filter(homework_id=homework_id).aggregate(total=Sum('points'))['total'] or Decimal('0')
-    Homework.objects.filter(id=homework_id).update(total_points=total)
+    Homework.objects.filter(id=homework_id).update(total_points=total, updated_at=timezone.now())
 
 
 @receiver(post_save, sender=Question)
@@ -54,3 +62,39 @@ def update_homework_points_on_question_save(sender, instance, **kwargs):
 @receiver(post_delete, sender=Question)
 def update_homework_points_on_question_delete(sender, instance, **kwargs):
     _recalculate_homework_points(instance.homework_id)
+
+
+# Answer key parts: any change invalidates the cached answer key of the owning homework
+
+def _touch_homework(**lookup):
+    Homework.objects.filter(**lookup).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=QuestionChoice)
+@receiver(post_delete, sender=QuestionChoice)
+def touch_homework_on_choice_change(sender, instance, **kwargs):
+    _touch_homework(questions__id=instance.question_id)
+
+
+@receiver(post_save, sender=FillBlank)
+@receiver(post_delete, sender=FillBlank)
+def touch_homework_on_blank_change(sender, instance, **kwargs):
+    _touch_homework(questions__id=instance.question_id)
+
+
+@receiver(post_save, sender=FillBlankOption)
+@receiver(post_delete, sender=FillBlankOption)
+def touch_homework_on_blank_option_change(sender, instance, **kwargs):
+    _touch_homework(questions__blanks__id=instance.blank_id)
+
+
+@receiver(post_save, sender=OrderingItem)
+@receiver(post_delete, sender=OrderingItem)
+def touch_homework_on_ordering_item_change(sender, instance, **kwargs):
+    _touch_homework(questions__id=instance.question_id)
+
+
+@receiver(post_save, sender=MatchingPair)
+@receiver(post_delete, sender=MatchingPair)
+def touch_homework_on_matching_pair_change(sender, instance, **kwargs):
+    _touch_homework(questions__id=instance.question_id)
@@ -0,0 +1,238 @@
+# backend/homework/test_grading.py
+
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from reports.models import StudentHomeworkScore
+from schools.models import AcademicYear, EducationalLevel, Grade, SchoolClass, Subject
+
+from .grading import get_answer_key, grade_submission, regrade_homework
+from .models import (
+    HomeworkRegradeJob, RewardTransaction, StudentWallet, Homework, Question, QuestionChoice, FillBlank, FillBlankOption, OrderingItem, MatchingPair,
+    Submission, QuestionAnswer, AnswerFillBlankSelection, AnswerOrderingSelection, AnswerMatchingSelection,
+)
+
+User = get_user_model()
+
+
+class GradingFixtures:
+    """Shared homework/submission builders for the grading tests."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(email="teacher@test.com", password="pass123", role="TEACHER")
+        self.student = User.objects.create_user(email="student@test.com", password="pass123", role="STUDENT")
+        academic_year = AcademicYear.objects.create(
+            year="2024-2025", start_date=timezone.now().date(), end_date=timezone.now().date(), is_current=True
+        )
+        level = EducationalLevel.objects.create(name="Primary", order=1, level="P")
+        self.grade = Grade.objects.create(educational_level=level, grade_number=1, code="G1", name="Grade 1")
+        self.subject = Subject.objects.create(name="Math", code="MATH")
+        self.school_class = SchoolClass.objects.create(grade=self.grade, academic_year=academic_year, section="A")
+
+    def _homework(self, title="HW"):
+        return Homework.objects.create(
+            subject=self.subject, grade=self.grade, school_class=self.school_class, teacher=self.teacher,
+            title=title, description="d", instructions="i", homework_type="homework",
+            due_date=timezone.now(), estimated_duration=30, is_published=True,
+        )
+
+    def _qcm_submission(self, question_count, student=None):
+        """Homework of `question_count` single-choice questions; even questions answered correctly."""
+        homework = self._homework(title=f"QCM {question_count}")
+        submission = Submission.objects.create(homework=homework, student=student or self.student, status="submitted")
+        for index in range(question_count):
+            question = Question.objects.create(
+                homework=homework, question_type="qcm_single", question_text=f"Q{index}", points=1, order=index
+            )
+            right = QuestionChoice.objects.create(question=question, choice_text="right", is_correct=True)
+            wrong = QuestionChoice.objects.create(question=question, choice_text="wrong", is_correct=False)
+            answer = QuestionAnswer.objects.create(submission=submission, question=question)
+            answer.selected_choices.set([right if index % 2 == 0 else wrong])
+        homework.refresh_from_db()
+        return Submission.objects.select_related("homework").get(pk=submission.pk)
+
+
+class GradingEngineTests(GradingFixtures, TestCase):
+    """Set-based auto-grading engine (homework.grading)."""
+
+    def test_grades_every_supported_question_type(self):
+        homework = self._homework()
+        submission = Submission.objects.create(homework=homework, student=self.student, status="submitted")
+
+        multiple = Question.objects.create(homework=homework, question_type="qcm_multiple", question_text="m", points=2)
+        a = QuestionChoice.objects.create(question=multiple, choice_text="a", is_correct=True)
+        b = QuestionChoice.objects.create(question=multiple, choice_text="b", is_correct=True)
+        QuestionChoice.objects.create(question=multiple, choice_text="c", is_correct=False)
+        answer = QuestionAnswer.objects.create(submission=submission, question=multiple)
+        answer.selected_choices.set([a, b])
+
+        fill = Question.objects.create(homework=homework, question_type="fill_blank", question_text="f", points=3)
+        blank = FillBlank.objects.create(question=fill, order=1)
+        good = FillBlankOption.objects.create(blank=blank, option_text="good", is_correct=True)
+        answer = QuestionAnswer.objects.create(submission=submission, question=fill)
+        AnswerFillBlankSelection.objects.create(question_answer=answer, blank=blank, selected_option=good)
+
+        ordering = Question.objects.create(homework=homework, question_type="ordering", question_text="o", points=4)
+        first = OrderingItem.objects.create(question=ordering, text="1", correct_position=1)
+        second = OrderingItem.objects.create(question=ordering, text="2", correct_position=2)
+        answer = QuestionAnswer.objects.create(submission=submission, question=ordering)
+        AnswerOrderingSelection.objects.create(question_answer=answer, item=first, selected_position=2)
+        AnswerOrderingSelection.objects.create(question_answer=answer, item=second, selected_position=1)
+
+        matching = Question.objects.create(homework=homework, question_type="matching", question_text="x", points=5)
+        pair = MatchingPair.objects.create(question=matching, left_text="l", right_text="r")
+        answer = QuestionAnswer.objects.create(submission=submission, question=matching)
+        AnswerMatchingSelection.objects.create(question_answer=answer, left_pair=pair, selected_right_pair=pair)
+
+        open_question = Question.objects.create(homework=homework, question_type="open_short", question_text="?")
+        QuestionAnswer.objects.create(submission=submission, question=open_question, text_answer="essay")
+
+        submission = Submission.objects.select_related("homework").get(pk=submission.pk)
+        self.assertEqual(grade_submission(submission), Decimal("10"))
+
+        results = dict(QuestionAnswer.objects.filter(submission=submission).values_list("question_id", "is_correct"))
+        self.assertEqual(results, {
+            multiple.id: True, fill.id: True, ordering.id: False, matching.id: True, open_question.id: None,
+        })
+        self.assertTrue(AnswerFillBlankSelection.objects.get(blank=blank).is_correct)
+
+    def test_answer_key_cache_is_invalidated_by_key_changes(self):
+        submission = self._qcm_submission(2)
+        self.assertEqual(grade_submission(submission), Decimal("1"))
+
+        # Teacher fixes the key of the second question: the wrong choice was actually right
+        QuestionChoice.objects.filter(question__homework=submission.homework, choice_text="wrong").update(is_correct=True)
+        for choice in QuestionChoice.objects.filter(question__homework=submission.homework, choice_text="right"):
+            choice.is_correct = False
+            choice.save()
+
+        submission = Submission.objects.select_related("homework").get(pk=submission.pk)
+        self.assertEqual(grade_submission(submission), Decimal("1"))
+        results = list(
+            QuestionAnswer.objects.filter(submission=submission).order_by("question__order").values_list("is_correct", flat=True)
+        )
+        self.assertEqual(results, [False, True])
+        key = get_answer_key(submission.homework)
+        self.assertTrue(all(entry["correct_choices"] for entry in key.values()))
+
+    def test_queries_per_submission_do_not_grow_with_question_count(self):
+        """Benchmark: grading 5 or 40 questions costs the same number of queries."""
+        counts = {}
+        for question_count in (5, 40):
+            student = User.objects.create_user(
+                email=f"bench{question_count}@test.com", password="pass123", role="STUDENT"
+            )
+            submission = self._qcm_submission(question_count, student=student)
+            with CaptureQueriesContext(connection) as cold:
+                score = grade_submission(submission)
+            with CaptureQueriesContext(connection) as warm:
+                grade_submission(submission)
+            self.assertEqual(score, Decimal((question_count + 1) // 2))
+            counts[question_count] = (len(cold), len(warm))
+
+        self.assertEqual(counts[5], counts[40])
+        self.assertLess(counts[40][1], counts[40][0])
+
+
+class RegradeHomeworkTests(GradingFixtures, TestCase):
+    """Batch regrade of a whole homework (homework.grading.regrade_homework)."""
+
+    def _fix_key(self, homework):
+        """Swap the right/wrong choices of every question, as a teacher correcting the key would."""
+        for choice in QuestionChoice.objects.filter(question__homework=homework):
+            choice.is_correct = choice.choice_text == "wrong"
+            choice.save()
+
+    def test_regrade_updates_scores_rollup_and_rewards_once(self):
+        submission = self._qcm_submission(4)
+        homework = submission.homework
+        other = User.objects.create_user(email="other@test.com", password="pass123", role="STUDENT")
+        second = Submission.objects.create(homework=homework, student=other, status="submitted")
+        for question in homework.questions.all():
+            answer = QuestionAnswer.objects.create(submission=second, question=question)
+            answer.selected_choices.set(question.choices.filter(choice_text="right"))
+
+        first = regrade_homework(homework)
+        self.assertEqual(first["submissions"], 2)
+        self.assertEqual(first["reward_transactions"], 2)
+        self.assertEqual(
+            StudentHomeworkScore.objects.get(student=other, homework=homework).total_score, Decimal("4")
+        )
+
+        self._fix_key(homework)
+        homework.refresh_from_db()
+        summary = regrade_homework(homework)
+
+        # The first student answered half right either way; only the second score moves
+        self.assertEqual(summary["scores_changed"], 1)
+        self.assertEqual(Submission.objects.get(pk=submission.pk).total_score, Decimal("2"))
+        self.assertEqual(Submission.objects.get(pk=second.pk).total_score, Decimal("0"))
+        self.assertEqual(
+            StudentHomeworkScore.objects.get(student=other, homework=homework).total_score, Decimal("0")
+        )
+        penalty = RewardTransaction.objects.get(student=other, transaction_type="penalty")
+        self.assertLess(penalty.points_earned, 0)
+        wallet = StudentWallet.objects.get(student=other)
+        self.assertEqual(wallet.assignments_completed, 1)
+        self.assertEqual(wallet.perfect_scores, 0)
+        self.assertEqual(wallet.total_points, Submission.objects.get(pk=second.pk).points_earned)
+
+        # Rerunning with an unchanged key is a no-op for rewards
+        transactions = RewardTransaction.objects.count()
+        rerun = regrade_homework(homework)
+        self.assertEqual(rerun["scores_changed"], 0)
+        self.assertEqual(rerun["reward_transactions"], 0)
+        self.assertEqual(RewardTransaction.objects.count(), transactions)
+
+    def test_regrade_keeps_teacher_grades(self):
+        submission = self._qcm_submission(4)
+        homework = submission.homework
+        regrade_homework(homework)
+        # The teacher graded the total directly (SubmissionGradeSerializer), without a manual score
+        Submission.objects.filter(pk=submission.pk).update(total_score=Decimal("3.5"), status="manually_graded")
+
+        # Questions now worth 2 points: only the auto-graded part of the total moves
+        Question.objects.filter(homework=homework).update(points=2)
+        regrade_homework(homework)
+        submission.refresh_from_db()
+        self.assertEqual(submission.auto_score, Decimal("4"))
+        self.assertEqual(submission.total_score, Decimal("5.5"))
+
+    def test_regrade_leaves_manual_homework_to_the_teacher(self):
+        submission = self._qcm_submission(4)
+        homework = submission.homework
+        homework.auto_grade_qcm = False
+        homework.save()
+
+        summary = regrade_homework(homework)
+        submission.refresh_from_db()
+        self.assertEqual(submission.auto_score, Decimal("2"))
+        self.assertIsNone(submission.total_score)
+        self.assertEqual(submission.status, "submitted")
+        self.assertFalse(submission.rewards_calculated)
+        self.assertEqual(summary["reward_transactions"], 0)
+        self.assertFalse(RewardTransaction.objects.exists())
+
+    def test_regrade_job_and_command(self):
+        submission = self._qcm_submission(2)
+        job = HomeworkRegradeJob.objects.create(homework=submission.homework, created_by=self.teacher)
+        regrade_homework(submission.homework, job=job, chunk_size=1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, HomeworkRegradeJob.Status.COMPLETED)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.results["submissions"], 1)
+
+        out = StringIO()
+        call_command("regrade_homework", submission.homework.pk, stdout=out)
+        self.assertIn("[OK] Regraded 1 submissions", out.getvalue())
+        self.assertEqual(HomeworkRegradeJob.objects.filter(homework=submission.homework).count(), 2)
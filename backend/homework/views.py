@@ -8,10 +8,14 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection
 from django.db.models import Q, Avg, Count
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
+import logging
+import threading
 
 from .models import (
     # Reward Models
@@ -40,7 +44,10 @@ from .models import (
     ExerciseSubmission, ExerciseAnswer, ExerciseAnswerFile,
 
     # Progress Tracking Models
-    LessonProgress
+    LessonProgress,
+
+    # Regrade Jobs
+    HomeworkRegradeJob
 )
 
 from .serializers import (
@@ -76,6 +83,10 @@ from .serializers import (
     # Statistics Serializers
     StudentProgressSerializer
 )
+from .grading import grade_submission, regrade_homework
+from .rewards import get_reward_config, calculate_submission_rewards
+
+logger = logging.getLogger(__name__)
 
 # =====================================
 # REWARD SYSTEM VIEWS
@@ -589,6 +600,86 @@ class HomeworkViewSet(viewsets.ModelViewSet):
         serializer = HomeworkStatisticsSerializer(stats)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['post'])
+    def regrade(self, request, pk=None):
+        """Regrade every submission against the current answer key (runs in the background)"""
+        homework = self.get_object()
+        if request.user != homework.teacher and request.user.role not in ['ADMIN', 'STAFF']:
+            return Response({'error': 'Permission denied'}, status=403)
+
+        running = HomeworkRegradeJob.objects.filter(
+            homework=homework,
+            status__in=[HomeworkRegradeJob.Status.PENDING, HomeworkRegradeJob.Status.PROCESSING]
+        ).first()
+        if running:
+            return Response(
+                {'error': 'A regrade is already running for this homework', 'job_id': str(running.job_id)},
+                status=409
+            )
+
+        job = HomeworkRegradeJob.objects.create(
+            homework=homework,
+            created_by=request.user,
+            current_status='Initializing regrade...'
+        )
+
+        thread = threading.Thread(target=self._process_regrade_async, args=(job.job_id,))
+        thread.daemon = True
+        thread.start()
+
+        return Response({
+            'job_id': str(job.job_id),
+            'status': 'started',
+            'message': 'Regrade job started successfully'
+        })
+
+    @action(detail=True, methods=['get'], url_path='regrade-status')
+    def regrade_status(self, request, pk=None):
+        """Progress of a regrade job (?job_id=..., defaults to the latest job of this homework)"""
+        homework = self.get_object()
+        jobs = HomeworkRegradeJob.objects.filter(homework=homework)
+        job_id = request.query_params.get('job_id')
+        try:
+            job = jobs.get(job_id=job_id) if job_id else jobs.first()
+        except (HomeworkRegradeJob.DoesNotExist, DjangoValidationError):
+            job = None
+        if not job:
+            return Response({'error': 'Regrade job not found'}, status=404)
+
+        response_data = {
+            'job_id': str(job.job_id),
+            'status': job.status,
+            'progress': job.progress,
+            'current_status': job.current_status or 'Processing...',
+            'total_records': job.total_records,
+            'processed_records': job.processed_records,
+            'completed': job.is_completed,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'completed_at': job.completed_at,
+        }
+        if job.status == HomeworkRegradeJob.Status.FAILED:
+            response_data['error'] = job.error_message
+        if job.status == HomeworkRegradeJob.Status.COMPLETED and job.results:
+            response_data['results'] = job.results
+        return Response(response_data)
+
+    def _process_regrade_async(self, job_id):
+        """Run a regrade job in a background thread"""
+        try:
+            job = HomeworkRegradeJob.objects.select_related('homework', 'created_by').get(job_id=job_id)
+            regrade_homework(job.homework, job=job)
+            logger.info(f"Regrade job {job_id} completed successfully")
+        except Exception as e:
+            logger.error(f"Regrade job {job_id} failed: {str(e)}")
+            HomeworkRegradeJob.objects.filter(job_id=job_id).update(
+                status=HomeworkRegradeJob.Status.FAILED,
+                error_message=str(e),
+                completed_at=timezone.now()
+            )
+        finally:
+            connection.close()
+
     @action(detail=True, methods=['post'])
     def duplicate(self, request, pk=None):
         """Duplicate an assignment"""
@@ -970,100 +1061,13 @@ class SubmissionViewSet(viewsets.ModelViewSet):
     
     def _auto_grade_submission(self, submission):
         """Auto-grade QCM questions in a submission"""
-        auto_score = 0
-        
-        for answer in submission.answers.all():
-            question_type = answer.question.question_type
-
-            if question_type not in Homework.AUTO_GRADE_SUPPORTED_TYPES:
-                continue
-
-            if question_type in ['qcm_single', 'qcm_multiple', 'true_false']:
-                correct_choices = answer.question.choices.filter(is_correct=True)
-                selected_choices = answer.selected_choices.all()
-
-                if question_type == 'qcm_single':
-                    # Single choice: must select exactly one correct answer
-                    if (selected_choices.count() == 1 and 
-                        selected_choices.first() in correct_choices):
-                        answer.is_correct = True
-                        answer.points_earned = answer.question.points
-                        auto_score += float(answer.question.points)
-                    else:
-                        answer.is_correct = False
-                        answer.points_earned = 0
-
-                elif question_type == 'qcm_multiple':
-                    # Multiple choice: must select all correct answers and no incorrect ones
-                    if (set(selected_choices) == set(correct_choices)):
-                        answer.is_correct = True
-                        answer.points_earned = answer.question.points
-                        auto_score += float(answer.question.points)
-                    else:
-                        answer.is_correct = False
-                        answer.points_earned = 0
-
-                elif question_type == 'true_false':
-                    # True/False acts like single choice
-                    if (selected_choices.count() == 1 and
-                        selected_choices.first() in correct_choices):
-                        answer.is_correct = True
-                        answer.points_earned = answer.question.points
-                        auto_score += float(answer.question.points)
-                    else:
-                        answer.is_correct = False
-                        answer.points_earned = 0
-
-                answer.save()
-
-            elif question_type == 'fill_blank':
-                blanks = list(answer.question.blanks.all())
-                selections = list(answer.blank_selections.all())
-                if blanks and len(selections) == len(blanks) and all(sel.is_correct for sel in selections):
-                    answer.is_correct = True
-                    answer.points_earned = answer.question.points
-                    auto_score += float(answer.question.points)
-                else:
-                    answer.is_correct = False
-                    answer.points_earned = 0
-                answer.save()
-
-            elif question_type == 'ordering':
-                items = list(answer.question.ordering_items.all())
-                selections_by_item = {
-                    selection.item_id: selection for selection in answer.ordering_selections.all()
-                }
-                if items and all(
-                    selections_by_item.get(item.id) and selections_by_item[item.id].selected_position == item.correct_position
-                    for item in items
-                ):
-                    answer.is_correct = True
-                    answer.points_earned = answer.question.points
-                    auto_score += float(answer.question.points)
-                else:
-                    answer.is_correct = False
-                    answer.points_earned = 0
-                answer.save()
-
-            elif question_type == 'matching':
-                pairs = list(answer.question.matching_pairs.all())
-                selections = answer.matching_selections.all()
-                if pairs and selections.count() == len(pairs) and all(
-                    selection.left_pair_id == selection.selected_right_pair_id for selection in selections
-                ):
-                    answer.is_correct = True
-                    answer.points_earned = answer.question.points
-                    auto_score += float(answer.question.points)
-                else:
-                    answer.is_correct = False
-                    answer.points_earned = 0
-                answer.save()
+        auto_score = grade_submission(submission)
 
         submission.auto_score = auto_score
         if not submission.manual_score:
             submission.total_score = auto_score
         else:
-            submission.total_score = auto_score + float(submission.manual_score)
+            submission.total_score = auto_score + submission.manual_score
         
         submission.status = 'auto_graded'
         submission.save()
@@ -1076,55 +1080,8 @@ class SubmissionViewSet(viewsets.ModelViewSet):
             return
 
         homework = submission.homework
-
-        # Get or create reward config with default values
-        reward_config = getattr(homework, 'reward_config', None)
-        if not reward_config:
-            # Create default reward config if it doesn't exist
-            reward_config = HomeworkReward.objects.create(
-                homework=homework,
-                completion_points=10,
-                completion_coins=1,
-                perfect_score_bonus=20,
-                high_score_bonus=10,
-                early_submission_bonus=10,
-                on_time_bonus=5,
-                difficulty_multiplier=1.00,
-                weekend_multiplier=1.50
-            )
-
-        points = 0
-        coins = 0
-
-        # Base completion reward
-        points += reward_config.completion_points
-        coins += reward_config.completion_coins
-
-        # Performance bonus
-        if submission.total_score and homework.total_points:
-            score_percentage = (float(submission.total_score) / float(homework.total_points)) * 100
-
-            if score_percentage >= 100:
-                points += reward_config.perfect_score_bonus
-            elif score_percentage >= 90:
-                points += reward_config.high_score_bonus
-
-        # Time bonus
-        if not submission.is_late:
-            points += reward_config.on_time_bonus
-
-            # Early submission bonus (>24h early)
-            if submission.submitted_at and homework.due_date:
-                time_diff = homework.due_date - submission.submitted_at
-                if time_diff.total_seconds() > 86400:  # 24 hours
-                    points += reward_config.early_submission_bonus
-
-        # Apply multipliers
-        points = int(points * float(reward_config.difficulty_multiplier))
-
-        # Weekend bonus
-        if homework.assigned_date.weekday() >= 5:  # Saturday/Sunday
-            points = int(points * float(reward_config.weekend_multiplier))
+        reward_config = get_reward_config(homework)
+        points, coins = calculate_submission_rewards(submission, homework, reward_config)
 
         # Save rewards
         submission.points_earned = points
@@ -0,0 +1,120 @@
+# lessons/catalog.py
+"""
+Cached lesson catalog of a school class, for LessonViewSet.with_progress.
+
+Every student of a class sees the same lessons (the class grade, restricted to its track),
+serialized the same way and locked/unlocked by the class LessonAvailability rows. That
+catalog is built once, cached, and shared by the whole class; only the per-student progress
+overlay is computed live.
+
+Cache keys are versioned rather than deleted: a catalog key embeds the global lesson version
+(bumped by any Lesson, LessonResource, LessonTagging or Lesson.tracks change, since a lesson
+can move between grades and tracks) and the class version (bumped by LessonAvailability
+changes of that class). Bumping stores a fresh random token, so stale catalogs are never read
+again and simply expire after CATALOG_TIMEOUT. The timeout also bounds staleness from edits
+outside these models (subject or category names, lesson authors). The versions must live in
+the shared cache (see CACHES in settings) so that a bump made by the process handling a write
+is seen by every other process.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch, Q
+
+from .models import Lesson, LessonAvailability, LessonResource
+
+CATALOG_TIMEOUT = 60 * 60
+_LESSONS_VERSION_KEY = 'lessons:catalog:version'
+
+
+def _class_version_key(class_id):
+    return f'lessons:catalog:class:{class_id}:version'
+
+
+def _versions(class_id):
+    keys = [_LESSONS_VERSION_KEY, _class_version_key(class_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return versions[keys[0]], versions[keys[1]]
+
+
+def _bump(key):
+    cache.set(key, uuid.uuid4().hex, None)
+    # Again on commit: a catalog cached meanwhile by another request from the
+    # pre-commit rows must not survive the write
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def lessons_changed():
+    """Invalidate every class catalog (lesson content, resources, tags or tracks changed)."""
+    _bump(_LESSONS_VERSION_KEY)
+
+
+def availability_changed(class_id):
+    """Invalidate the catalog of one class (its lesson publishing changed)."""
+    _bump(_class_version_key(class_id))
+
+
+def build_catalog(school_class):
+    """
+    Serialize the lesson catalog of a class.
+    Returns {'lessons': [...], 'subjects': {subject_id: {...}}}; each lesson carries its `is_locked` flag.
+    """
+    from .serializers import LessonSerializer
+
+    lessons_filter = Q(grade_id=school_class.grade_id, is_active=True)
+    # Only filter by track if the class has a track assigned
+    if school_class.track_id:
+        lessons_filter &= Q(tracks=school_class.track_id)
+
+    lessons = list(
+        Lesson.objects.filter(lessons_filter)
+        .select_related('subject', 'grade', 'category__subject', 'created_by__profile')
+        .prefetch_related(
+            Prefetch('resources', queryset=LessonResource.objects.select_related('uploaded_by__profile')),
+            'tracks',
+        )
+    )
+
+    # No LessonAvailability row means locked
+    published = set(
+        LessonAvailability.objects.filter(
+            school_class_id=school_class.id, is_published=True
+        ).values_list('lesson_id', flat=True)
+    )
+
+    lessons_data = []
+    for lesson_data in LessonSerializer(lessons, many=True).data:
+        lesson_data = dict(lesson_data)
+        lesson_data['is_locked'] = lesson_data['id'] not in published
+        lessons_data.append(lesson_data)
+
+    subjects = {}
+    for lesson in lessons:
+        if lesson.subject_id not in subjects:
+            subjects[lesson.subject_id] = {
+                'id': lesson.subject_id,
+                'name': lesson.subject.name,
+                'name_arabic': lesson.subject.name_arabic,
+                'name_french': lesson.subject.name_french,
+            }
+
+    return {'lessons': lessons_data, 'subjects': subjects}
+
+
+def class_catalog(school_class):
+    """Cached build_catalog() of a class."""
+    lessons_version, class_version = _versions(school_class.id)
+    key = (
+        f'lessons:catalog:{school_class.id}:{school_class.grade_id}:{school_class.track_id}:'
+        f'{lessons_version}:{class_version}'
+    )
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = build_catalog(school_class)
+        cache.set(key, catalog, CATALOG_TIMEOUT)
+    return catalog
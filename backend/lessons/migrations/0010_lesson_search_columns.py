@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:36
+
+import unicodedata
+
+from django.db import migrations, models
+
+# Frozen copy of lessons.search.normalize_text / lesson_search_fields as of this migration,
+# so later changes to the live search code do not alter what the backfill wrote
+_TATWEEL = 'ـ'
+_LETTER_VARIANTS = str.maketrans({
+    'ى': 'ي',
+    'ة': 'ه',
+    'ٱ': 'ا',
+})
+
+
+def normalize_text(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char) and char != _TATWEEL)
+    return ' '.join(stripped.translate(_LETTER_VARIANTS).casefold().split())
+
+
+def lesson_search_fields(lesson):
+    titles = normalize_text(' '.join(filter(None, [lesson.title, lesson.title_arabic, lesson.title_french])))
+    body = normalize_text(' '.join(filter(None, [lesson.description, lesson.unit])))
+    return titles, ' '.join(filter(None, [titles, body]))
+
+
+def backfill_search_columns(apps, schema_editor):
+    Lesson = apps.get_model('lessons', 'Lesson')
+    batch = []
+    for lesson in Lesson.objects.only('title', 'title_arabic', 'title_french', 'description', 'unit').iterator(chunk_size=2000):
+        lesson.search_title, lesson.search_text = lesson_search_fields(lesson)
+        batch.append(lesson)
+        if len(batch) >= 2000:
+            Lesson.objects.bulk_update(batch, ['search_title', 'search_text'])
+            batch = []
+    Lesson.objects.bulk_update(batch, ['search_title', 'search_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0009_lesson_category_lesson_unit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='search_title',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_search_columns, migrations.RunPython.noop),
+    ]
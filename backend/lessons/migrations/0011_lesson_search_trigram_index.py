@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # PostgreSQL only: LIKE '%term%' on the normalized columns is served by pg_trgm GIN indexes
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS lessons_lesson_search_text_trgm "
+        "ON lessons_lesson USING GIN (search_text gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS lessons_lesson_search_title_trgm "
+        "ON lessons_lesson USING GIN (search_title gin_trgm_ops)"
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS lessons_lesson_search_text_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS lessons_lesson_search_title_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0010_lesson_search_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -4,6 +4,8 @@ from django.db import models
 from django.conf import settings
 from cloudinary.models import CloudinaryField
 
+from .search import lesson_search_fields
+
 class Lesson(models.Model):
     """Individual lessons/topics for each subject and grade level"""
     
@@ -53,6 +55,10 @@ class Lesson(models.Model):
         null=True, 
         related_name='created_lessons'
     )
+
+    # Normalized search columns, maintained in save() (see lessons/search.py)
+    search_title = models.TextField(blank=True, editable=False)
+    search_text = models.TextField(blank=True, editable=False)
     
     class Meta:
         unique_together = ['subject', 'grade', 'cycle', 'order']
@@ -64,6 +70,13 @@ class Lesson(models.Model):
         cycle_display = "الدورة الأولى" if self.cycle == 'first' else "الدورة الثانية"
         return f"{self.subject.name} - {self.grade.name} - {cycle_display} - {self.title}"
 
+    def save(self, *args, **kwargs):
+        self.search_title, self.search_text = lesson_search_fields(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'search_title', 'search_text'}
+        super().save(*args, **kwargs)
+
 class LessonResource(models.Model):
     """Resources for each lesson using Cloudinary for file storage"""
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='resources')
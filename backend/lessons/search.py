@@ -0,0 +1,67 @@
+# lessons/search.py
+"""
+Multilingual lesson search.
+
+Lesson.save() stores two normalized columns: search_title (the Arabic, French and default
+titles) and search_text (titles, description and unit). Normalization folds case, strips
+Latin accents and Arabic tashkeel/tatweel, and unifies hamza/alef variants (أ إ آ ٱ -> ا,
+ى -> ي, ة -> ه, ؤ -> و, ئ -> ي), so "الأعداد", "الاعداد" and "الأَعْدَاد" all match.
+
+Queries are normalized the same way and matched with a case-sensitive contains (LIKE) on the
+normalized column, which PostgreSQL serves from a pg_trgm GIN index (migration 0011).
+Results are ranked: a title containing the whole query as a phrase first, then terms found
+in titles, then terms found only in the description/unit.
+"""
+import re
+import unicodedata
+
+from django.db.models import Case, IntegerField, Value, When
+
+_TATWEEL = 'ـ'
+_LETTER_VARIANTS = str.maketrans({
+    'ى': 'ي',
+    'ة': 'ه',
+    'ٱ': 'ا',
+})
+
+
+def normalize_text(text):
+    """Normalized form of `text` used by the lesson search columns and queries."""
+    # NFKD splits accents, hamza and madda (أ = ا + ٔ) and Arabic presentation forms
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char) and char != _TATWEEL)
+    return ' '.join(stripped.translate(_LETTER_VARIANTS).casefold().split())
+
+
+def lesson_search_fields(lesson):
+    """(search_title, search_text) of a lesson."""
+    titles = normalize_text(' '.join(filter(None, [lesson.title, lesson.title_arabic, lesson.title_french])))
+    body = normalize_text(' '.join(filter(None, [lesson.description, lesson.unit])))
+    return titles, ' '.join(filter(None, [titles, body]))
+
+
+def search_terms(query):
+    return re.findall(r'\w+', normalize_text(query))
+
+
+def search_lessons(queryset, query):
+    """Filter `queryset` to lessons matching every term of `query`, annotated with `search_rank`."""
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    for term in terms:
+        queryset = queryset.filter(search_text__contains=term)
+
+    rank = Case(
+        When(search_title__contains=' '.join(terms), then=Value(len(terms) * 2 + 1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    for term in terms:
+        rank = rank + Case(
+            When(search_title__contains=term, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    return queryset.annotate(search_rank=rank)
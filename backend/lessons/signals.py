@@ -1,9 +1,10 @@
 # lessons/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Lesson, LessonAvailability
+from .catalog import availability_changed, lessons_changed
+from .models import Lesson, LessonAvailability, LessonResource, LessonTagging
 
 
 @receiver(post_save, sender=Lesson)
@@ -43,3 +44,27 @@ def create_lesson_availability_for_all_classes(sender, instance, created, **kwar
                 availability_records,
                 ignore_conflicts=True  # Ignore if already exists
             )
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=LessonResource)
+@receiver(post_delete, sender=LessonResource)
+@receiver(post_save, sender=LessonTagging)
+@receiver(post_delete, sender=LessonTagging)
+def invalidate_lesson_catalogs(sender, **kwargs):
+    """Lesson content changed: every cached class catalog is stale."""
+    lessons_changed()
+
+
+@receiver(m2m_changed, sender=Lesson.tracks.through)
+def invalidate_lesson_catalogs_on_tracks(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        lessons_changed()
+
+
+@receiver(post_save, sender=LessonAvailability)
+@receiver(post_delete, sender=LessonAvailability)
+def invalidate_class_catalog(sender, instance, **kwargs):
+    """Publishing changed for one class: only that class catalog is stale."""
+    availability_changed(instance.school_class_id)
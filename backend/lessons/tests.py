@@ -1,12 +1,23 @@
 # lessons/tests.py
 
+import os
+import time
+from datetime import date
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from users.models import User
-from schools.models import Subject, Grade, EducationalLevel
-from .models import Lesson, LessonResource, LessonTag
+from users.models import StudentEnrollment
+from schools.models import Subject, Grade, EducationalLevel, AcademicYear, SchoolClass
+from .models import Lesson, LessonAvailability, LessonResource, LessonTag
+from .search import lesson_search_fields, normalize_text, search_lessons
+
 
 class LessonModelTest(TestCase):
     """Test cases for Lesson model"""
@@ -351,4 +362,180 @@ class LessonResourceTest(TestCase):
             uploaded_by=self.user
         )
         
-        self.assertEqual(resource.file_url, 'https://example.com/resource')
\ No newline at end of file
+        self.assertEqual(resource.file_url, 'https://example.com/resource')
+
+class LessonSearchTest(APITestCase):
+    """Test the normalized multilingual lesson search"""
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            email='admin@madrasti.com', password=None, role=User.Role.ADMIN
+        )
+        self.level = EducationalLevel.objects.create(level='PRIMARY', name='Primaire', order=1)
+        self.grade = Grade.objects.create(
+            educational_level=self.level, grade_number=1, name='1ère Année Primaire'
+        )
+        self.subject = Subject.objects.create(name='Mathematics', code='MATH101')
+        self.numbers = Lesson.objects.create(
+            subject=self.subject, grade=self.grade, cycle='first', order=1,
+            title='Numbers', title_arabic='الأَعْدَادُ الطبيعية', title_french='Les nombres entiers',
+        )
+        self.fractions = Lesson.objects.create(
+            subject=self.subject, grade=self.grade, cycle='first', order=2,
+            title='Fractions', title_arabic='الكسور', title_french='Les fractions',
+            description='Les fractions et les nombres décimaux', unit='الأعداد',
+        )
+
+    def _search(self, user, query):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('lesson-search'), {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [lesson['id'] for lesson in response.data['results']]
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('الأَعْدَادُ'), 'الاعداد')
+        self.assertEqual(normalize_text('إسلامية  مـدرسة'), 'اسلاميه مدرسه')
+        self.assertEqual(normalize_text('آية ٱلمؤمن شاطئ على'), 'ايه المومن شاطي علي')
+        self.assertEqual(normalize_text('Équations DÉCIMAUX'), 'equations decimaux')
+
+    def test_search_columns_follow_saves(self):
+        self.assertIn('الاعداد', self.numbers.search_title)
+        self.fractions.title_arabic = 'الكُسور العشرية'
+        self.fractions.save(update_fields=['title_arabic'])
+        self.fractions.refresh_from_db()
+        self.assertIn('الكسور العشريه', self.fractions.search_title)
+
+    def test_arabic_variants_match_and_titles_rank_first(self):
+        # Unvocalized query without hamza: both lessons match, the title match ranks first
+        self.assertEqual(self._search(self.admin_user, 'الاعداد'), [self.numbers.id, self.fractions.id])
+        self.assertEqual(self._search(self.admin_user, 'nombres decimaux'), [self.fractions.id])
+        self.assertEqual(self._search(self.admin_user, 'Les fractions'), [self.fractions.id])
+        self.assertEqual(self._search(self.admin_user, 'الهندسة'), [])
+
+    def test_with_progress_uses_the_index(self):
+        year = AcademicYear.objects.create(
+            year='2024-2025', start_date=date(2024, 9, 1), end_date=date(2025, 6, 30), is_current=True
+        )
+        school_class = SchoolClass.objects.create(grade=self.grade, academic_year=year, section='A')
+        student = User.objects.create_user(email='student@madrasti.com', password=None, role=User.Role.STUDENT)
+        StudentEnrollment.objects.create(student=student, school_class=school_class, academic_year=year)
+
+        self.client.force_authenticate(user=student)
+        response = self.client.get('/api/lessons/lessons/with_progress/', {'search': 'الكسور'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([lesson['id'] for lesson in response.data['lessons']], [self.fractions.id])
+
+    @skipUnless(os.getenv('RUN_BENCHMARKS') == 'true', "benchmark: set RUN_BENCHMARKS=true to run it")
+    def test_search_benchmark_50k_lessons(self):
+        """Benchmark: normalized search over 50,000 lessons"""
+        lessons = []
+        for index in range(50000):
+            lesson = Lesson(
+                subject=self.subject, grade=self.grade, cycle='second', order=index,
+                title=f'Lesson {index}', title_arabic=f'الدرس {index}', description='تمارين',
+            )
+            lesson.search_title, lesson.search_text = lesson_search_fields(lesson)
+            lessons.append(lesson)
+        Lesson.objects.bulk_create(lessons, batch_size=2000)
+
+        started = time.perf_counter()
+        results = list(search_lessons(Lesson.objects.all(), 'الأعداد').order_by('-search_rank')[:20])
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual([lesson.id for lesson in results], [self.numbers.id, self.fractions.id])
+        self.assertLess(elapsed, 0.5)
+
+
+class LessonCatalogCacheTest(APITestCase):
+    """Test the cached per-class lesson catalog behind with_progress"""
+
+    def setUp(self):
+        cache.clear()
+        self.level = EducationalLevel.objects.create(level='PRIMARY', name='Primaire', order=1)
+        self.grade = Grade.objects.create(
+            educational_level=self.level, grade_number=1, name='1ère Année Primaire'
+        )
+        self.subject = Subject.objects.create(name='Mathematics', code='MATH101')
+        year = AcademicYear.objects.create(
+            year='2024-2025', start_date=date(2024, 9, 1), end_date=date(2025, 6, 30), is_current=True
+        )
+        self.school_class = SchoolClass.objects.create(grade=self.grade, academic_year=year, section='A')
+        self.students = []
+        for index in range(2):
+            student = User.objects.create_user(
+                email=f'student{index}@madrasti.com', password=None, role=User.Role.STUDENT
+            )
+            StudentEnrollment.objects.create(student=student, school_class=self.school_class, academic_year=year)
+            self.students.append(student)
+        self.lesson = self._create_lessons(1)[0]
+
+    def _create_lessons(self, count):
+        start = Lesson.objects.count()
+        return [
+            Lesson.objects.create(
+                subject=self.subject, grade=self.grade, cycle='first', order=start + index,
+                title=f'Lesson {start + index}'
+            )
+            for index in range(count)
+        ]
+
+    def _with_progress(self, student, **params):
+        self.client.force_authenticate(user=student)
+        response = self.client.get('/api/lessons/lessons/with_progress/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def _queries(self, student):
+        with CaptureQueriesContext(connection) as queries:
+            self._with_progress(student)
+        return len(queries)
+
+    def test_catalog_is_shared_by_the_class(self):
+        self._create_lessons(10)
+        self._with_progress(self.students[0])
+
+        # Warm catalog: enrollment, progress, wallet (+ auth), independent of the lesson count
+        warm = self._queries(self.students[1])
+        self.assertLessEqual(warm, 4)
+        self._create_lessons(20)
+        self._with_progress(self.students[0])
+        self.assertEqual(self._queries(self.students[1]), warm)
+
+        data = self._with_progress(self.students[1], page_size=50)
+        self.assertEqual(data['summary']['total_lessons'], 31)
+        self.assertEqual(data['subjects'], [{
+            'id': self.subject.id, 'name': 'Mathematics', 'name_arabic': '', 'name_french': '',
+        }])
+
+    def test_progress_overlay_is_per_student(self):
+        from homework.models import LessonProgress
+        LessonProgress.objects.create(
+            student=self.students[0], lesson=self.lesson, status='in_progress', total_time_spent=90
+        )
+        first = self._with_progress(self.students[0])
+        second = self._with_progress(self.students[1])
+        self.assertEqual(first['lessons'][0]['progress']['status'], 'in_progress')
+        self.assertEqual(first['summary']['study_time_hours'], 1.5)
+        self.assertEqual(second['lessons'][0]['progress']['status'], 'not_started')
+
+    def test_signals_invalidate_the_catalog(self):
+        data = self._with_progress(self.students[0])
+        self.assertTrue(data['lessons'][0]['is_locked'])
+
+        availability = LessonAvailability.objects.get(lesson=self.lesson, school_class=self.school_class)
+        availability.is_published = True
+        availability.save()
+        self.assertFalse(self._with_progress(self.students[0])['lessons'][0]['is_locked'])
+
+        self.lesson.title = 'Numbers'
+        self.lesson.save()
+        self.assertEqual(self._with_progress(self.students[0])['lessons'][0]['title'], 'Numbers')
+
+        LessonResource.objects.create(
+            lesson=self.lesson, title='Worksheet', resource_type='link', external_url='https://example.com'
+        )
+        self.assertEqual(len(self._with_progress(self.students[0])['lessons'][0]['resources']), 1)
+
+        self.lesson.delete()
+        self.assertEqual(self._with_progress(self.students[0])['lessons'], [])
+
@@ -6,10 +6,12 @@ from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Sum
+from django.db.models import Q, Count
 from django.utils import timezone
 from schools.models import Subject, Grade, SchoolClass
 from .models import Lesson, LessonResource, LessonTag, LessonAvailability, SubjectCategory
+from .catalog import class_catalog
+from .search import search_lessons, search_terms
 from .serializers import (
     LessonSerializer,
     LessonMinimalSerializer,
@@ -188,13 +190,8 @@ class LessonViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset()
         
         if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) |
-                Q(title_arabic__icontains=query) |
-                Q(title_french__icontains=query) |
-                Q(description__icontains=query) |
-                Q(unit__icontains=query)
-            )
+            # Normalized multilingual index, best matches first (lessons/search.py)
+            queryset = search_lessons(queryset, query).order_by('-search_rank', *self.ordering)
         
         if cycle:
             queryset = queryset.filter(cycle=cycle)
@@ -449,61 +446,36 @@ class LessonViewSet(viewsets.ModelViewSet):
                 'lessons': []
             })
 
-        grade = enrollment.school_class.grade
-        student_class = enrollment.school_class
-        track = student_class.track
-
-        # Query lessons (optimized with select_related/prefetch_related)
-        # Filter by grade AND track to ensure students only see lessons for their specific track
-        lessons_filter = Q(grade=grade, is_active=True)
-
-        # Only filter by track if the class has a track assigned
-        if track:
-            lessons_filter &= Q(tracks=track)
-
-        lessons = Lesson.objects.filter(
-            lessons_filter
-        ).select_related('subject', 'grade', 'category').prefetch_related('resources')
+        # The class catalog (serialized lessons, subjects, lock flags) is shared by every
+        # student of the class and cached; only the progress overlay below is per student
+        catalog = class_catalog(enrollment.school_class)
+        lessons = catalog['lessons']
 
         # Apply filters from query params
         subject_id = request.query_params.get('subject')
         search = request.query_params.get('search')
 
         if subject_id:
-            lessons = lessons.filter(subject_id=subject_id)
-        if search:
-            lessons = lessons.filter(
-                Q(title__icontains=search) |
-                Q(title_arabic__icontains=search) |
-                Q(title_french__icontains=search) |
-                Q(description__icontains=search)
+            lessons = [lesson for lesson in lessons if str(lesson['subject']) == subject_id]
+        if search and search_terms(search):
+            ranks = dict(
+                search_lessons(Lesson.objects.filter(id__in=[lesson['id'] for lesson in lessons]), search)
+                .values_list('id', 'search_rank')
+            )
+            # Stable sort: equal ranks keep the catalog order (subject, grade, cycle, order)
+            lessons = sorted(
+                (lesson for lesson in lessons if lesson['id'] in ranks),
+                key=lambda lesson: -ranks[lesson['id']]
             )
 
-        # Get total count before pagination
-        total_count = lessons.count()
-
-        # Extract all unique subjects from ALL lessons (for filter dropdown)
-        # This needs to be done before pagination to show all available subjects
-        all_subjects_qs = lessons.values(
-            'subject__id',
-            'subject__name',
-            'subject__name_arabic',
-            'subject__name_french'
-        )
+        total_count = len(lessons)
 
-        # Deduplicate by subject_id (distinct() doesn't work reliably across databases)
-        subjects_dict = {}
-        for subj in all_subjects_qs:
-            subject_id = subj['subject__id']
-            if subject_id and subject_id not in subjects_dict:
-                subjects_dict[subject_id] = {
-                    'id': subject_id,
-                    'name': subj['subject__name'],
-                    'name_arabic': subj['subject__name_arabic'],
-                    'name_french': subj['subject__name_french'],
-                }
-
-        subjects_list = list(subjects_dict.values())
+        # Unique subjects of the matching lessons (for filter dropdown), before pagination
+        subjects_list = []
+        for lesson in lessons:
+            subject = catalog['subjects'].get(lesson['subject'])
+            if subject and subject not in subjects_list:
+                subjects_list.append(subject)
 
         # Pagination (20 lessons per page)
         page = int(request.query_params.get('page', 1))
@@ -511,36 +483,20 @@ class LessonViewSet(viewsets.ModelViewSet):
         start = (page - 1) * page_size
         end = start + page_size
 
-        lessons = lessons[start:end]
-
-        # Get all progress data for student (O(1) lookup)
+        # Get all progress data for student over the whole catalog (O(1) lookup)
         from homework.models import LessonProgress
-        lesson_ids = [lesson.id for lesson in lessons]
         progress_map = {
             p.lesson_id: p
             for p in LessonProgress.objects.filter(
                 student=request.user,
-                lesson_id__in=lesson_ids
+                lesson_id__in=[lesson['id'] for lesson in catalog['lessons']]
             )
         }
 
-        # Get lesson availability for student's class
-        from .models import LessonAvailability
-        availability_map = {
-            avail.lesson_id: avail.is_published
-            for avail in LessonAvailability.objects.filter(
-                lesson_id__in=lesson_ids,
-                school_class=student_class
-            )
-        }
-
-        # Serialize all lessons at once (more efficient)
-        serializer = LessonSerializer(lessons, many=True)
-        lessons_data = serializer.data
-
         # Merge lesson + progress data
         results = []
-        for lesson_data in lessons_data:
+        for lesson in lessons[start:end]:
+            lesson_data = dict(lesson)
             progress = progress_map.get(lesson_data['id'])
 
             if progress:
@@ -560,12 +516,6 @@ class LessonViewSet(viewsets.ModelViewSet):
                     'time_spent_minutes': 0,
                 }
 
-            # Check if lesson is published/available for student's class
-            # If no LessonAvailability record exists, treat as locked
-            # If record exists, check is_published flag
-            is_published = availability_map.get(lesson_data['id'], False)
-            lesson_data['is_locked'] = not is_published
-
             results.append(lesson_data)
 
         # Calculate summary statistics (based on ALL lessons, not just current page)
@@ -576,31 +526,16 @@ class LessonViewSet(viewsets.ModelViewSet):
         except StudentWallet.DoesNotExist:
             total_points = 0
 
-        # Get all lesson IDs for summary calculation (with same track filter)
-        all_lessons_filter = Q(grade=grade, is_active=True)
-        if track:
-            all_lessons_filter &= Q(tracks=track)
-
-        all_lesson_ids = Lesson.objects.filter(
-            all_lessons_filter
-        ).values_list('id', flat=True)
-
-        # Get progress for ALL lessons
-        all_progress = LessonProgress.objects.filter(
-            student=request.user,
-            lesson_id__in=all_lesson_ids
-        )
-
-        total_lessons = len(all_lesson_ids)
-        completed = all_progress.filter(status='completed').count()
-        in_progress = all_progress.filter(status='in_progress').count()
+        total_lessons = len(catalog['lessons'])
+        completed = sum(1 for p in progress_map.values() if p.status == 'completed')
+        in_progress = sum(1 for p in progress_map.values() if p.status == 'in_progress')
 
         # Calculate study time (sum of time spent on ALL in-progress and completed lessons)
-        total_minutes = all_progress.filter(
-            status__in=['in_progress', 'completed']
-        ).aggregate(
-            total_time=Sum('total_time_spent')
-        )['total_time'] or 0
+        total_minutes = sum(
+            p.total_time_spent or 0
+            for p in progress_map.values()
+            if p.status in ['in_progress', 'completed']
+        )
         study_time_hours = round(total_minutes / 60, 1)
 
         # Find next recommended lesson
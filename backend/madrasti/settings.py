@@ -231,3 +231,53 @@ CORS_ALLOW_METHODS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+
+# Shared cache. Unread notification counters, lesson catalog versions and user presence live
+# in the cache and must be the same for every web and worker process; the counters also rely on
+# atomic increments. Production requires Redis: set REDIS_URL (e.g. redis://localhost:6379/0,
+# needs the `redis` package). Without it the per-process LocMemCache is used, which is only fit
+# for development and tests; with REQUIRE_SHARED_CACHE (on whenever DEBUG is off) the users.E001
+# system check stops the project from starting on such a cache.
+REQUIRE_SHARED_CACHE = os.getenv('REQUIRE_SHARED_CACHE', str(not DEBUG)).lower() == 'true'
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Absence notifications are fanned out by a background worker once a session is completed;
+# set to false to send them inside the request (the test suite does).
+ATTENDANCE_NOTIFICATIONS_ASYNC = os.getenv('ATTENDANCE_NOTIFICATIONS_ASYNC', 'true').lower() == 'true'
+
+# Activity log entries are buffered and written in bulk by a background thread once the
+# request transaction commits; set ACTIVITY_LOG_ASYNC to false to write them synchronously.
+# Only the activity_log tests do: elsewhere TestCase never commits, so nothing is enqueued.
+ACTIVITY_LOG_ASYNC = os.getenv('ACTIVITY_LOG_ASYNC', 'true').lower() == 'true'
+ACTIVITY_LOG_BATCH_SIZE = 200
+ACTIVITY_LOG_FLUSH_INTERVAL = 2.0
+ACTIVITY_LOG_MAX_BUFFER = 10000
+
+# Heartbeats update the presence store in the shared cache at once and users_user.last_seen/
+# is_online in batches every PRESENCE_FLUSH_INTERVAL seconds; set PRESENCE_ASYNC to false to
+# write every heartbeat (the test suite does).
+PRESENCE_ASYNC = os.getenv('PRESENCE_ASYNC', 'true').lower() == 'true'
+PRESENCE_FLUSH_INTERVAL = float(os.getenv('PRESENCE_FLUSH_INTERVAL', '30'))
+
+# Retention of the activity log: older entries are moved to compressed monthly archives
+# by `manage.py archive_activity_logs` (run it from cron)
+ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv('ACTIVITY_LOG_RETENTION_DAYS', '180'))
+ACTIVITY_LOG_ARCHIVE_DIR = Path(os.getenv('ACTIVITY_LOG_ARCHIVE_DIR', BASE_DIR / 'archives' / 'activity_log'))
+
+# Student bulk imports are queued on BulkImportJob and run by `manage.py run_import_worker`
+# (keep it running under a process supervisor next to the web server). A job whose worker
+# has not checkpointed for this many seconds is resumed by the next worker.
+BULK_IMPORT_STALE_AFTER = int(os.getenv('BULK_IMPORT_STALE_AFTER', '300'))
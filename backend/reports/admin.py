@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import StudentHomeworkScore
+
+
+@admin.register(StudentHomeworkScore)
+class StudentHomeworkScoreAdmin(admin.ModelAdmin):
+    list_display = ['student', 'homework', 'school_class', 'subject', 'status', 'score_pct', 'is_late', 'updated_at']
+    list_filter = ['academic_year', 'status', 'is_late', 'is_published']
+    search_fields = ['student__email', 'student__first_name', 'student__last_name', 'homework__title']
+    raw_id_fields = ['student', 'homework', 'teacher']
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.rollup import check_consistency
+
+
+class Command(BaseCommand):
+    help = 'Verify that the StudentHomeworkScore report rollup matches Submission data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Repair missing, stale and orphaned rollup rows',
+        )
+
+    def handle(self, *args, **options):
+        report = check_consistency(fix=options['fix'])
+
+        self.stdout.write(f"Checked {report['checked']} submission rows")
+        self.stdout.write(f"Missing rollup rows: {report['missing']}")
+        self.stdout.write(f"Stale rollup rows: {report['stale']}")
+        self.stdout.write(f"Orphaned rollup rows: {report['orphaned']}")
+
+        problems = report['missing'] + report['stale'] + report['orphaned']
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('[OK] Rollup is consistent'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'[OK] Repaired {problems} rollup rows'))
+        else:
+            raise CommandError(f'Rollup has {problems} inconsistent rows; run with --fix to repair')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from reports.rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the StudentHomeworkScore report rollup from scratch using Submission data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rollup rows inserted per bulk_create batch',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding student homework score rollup...')
+        written = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'[OK] Rebuilt rollup with {written} rows'))
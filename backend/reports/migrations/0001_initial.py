@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('homework', '0006_alter_bookexercise_book_title_and_more'),
+        ('schools', '0011_gasoilrecord_payment_method'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentHomeworkScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_published', models.BooleanField(default=False)),
+                ('due_date', models.DateTimeField()),
+                ('attempt_number', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(max_length=20)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('is_late', models.BooleanField(default=False)),
+                ('total_score', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('score_pct', models.DecimalField(blank=True, decimal_places=2, help_text='total_score as a percentage of homework total points (null until scored)', max_digits=8, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='homework_scores', to='schools.academicyear')),
+                ('grade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='homework_scores', to='schools.grade')),
+                ('homework', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_rollups', to='homework.homework')),
+                ('school_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='homework_scores', to='schools.schoolclass')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='homework_scores', to=settings.AUTH_USER_MODEL)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='homework_scores', to='schools.subject')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='taught_homework_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Student Homework Score',
+                'verbose_name_plural': 'Student Homework Scores',
+                'indexes': [models.Index(fields=['academic_year', 'school_class', 'subject'], name='reports_stu_academi_cd613a_idx'), models.Index(fields=['academic_year', 'grade'], name='reports_stu_academi_9c5bc7_idx'), models.Index(fields=['teacher', 'academic_year'], name='reports_stu_teacher_d46b4d_idx'), models.Index(fields=['student', 'submitted_at'], name='reports_stu_student_9f0dca_idx')],
+                'unique_together': {('student', 'homework')},
+            },
+        ),
+    ]
@@ -1,3 +1,53 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class StudentHomeworkScore(models.Model):
+    """
+    Materialized per-student/per-homework score row used by the performance reports.
+    Holds the student's latest attempt, denormalized with the homework dimensions
+    (subject, class, grade, teacher, academic year) so reports never touch Submission.
+    Maintained by reports.signals; rebuilt with `manage.py rebuild_score_rollup`.
+    """
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='homework_scores'
+    )
+    homework = models.ForeignKey('homework.Homework', on_delete=models.CASCADE, related_name='score_rollups')
+
+    # Denormalized homework dimensions
+    academic_year = models.ForeignKey('schools.AcademicYear', on_delete=models.CASCADE, related_name='homework_scores')
+    school_class = models.ForeignKey('schools.SchoolClass', on_delete=models.CASCADE, related_name='homework_scores')
+    grade = models.ForeignKey('schools.Grade', on_delete=models.CASCADE, related_name='homework_scores')
+    subject = models.ForeignKey('schools.Subject', on_delete=models.CASCADE, related_name='homework_scores')
+    teacher = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='taught_homework_scores'
+    )
+    is_published = models.BooleanField(default=False)
+    due_date = models.DateTimeField()
+
+    # Latest submission snapshot
+    attempt_number = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=20)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    is_late = models.BooleanField(default=False)
+    total_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    score_pct = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True,
+        help_text="total_score as a percentage of homework total points (null until scored)"
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'homework']
+        indexes = [
+            models.Index(fields=['academic_year', 'school_class', 'subject']),
+            models.Index(fields=['academic_year', 'grade']),
+            models.Index(fields=['teacher', 'academic_year']),
+            models.Index(fields=['student', 'submitted_at']),
+        ]
+        verbose_name = "Student Homework Score"
+        verbose_name_plural = "Student Homework Scores"
+
+    def __str__(self):
+        return f"{self.student_id} - {self.homework_id}: {self.score_pct}"
@@ -0,0 +1,216 @@
+# reports/rollup.py
+"""
+Maintenance of the StudentHomeworkScore rollup table.
+
+Submission/Homework/Question signals call the refresh_* helpers so the rollup is kept
+incrementally; rebuild() and check_consistency() back the management commands.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+
+from homework.models import Homework, Submission
+
+from .models import StudentHomeworkScore
+
+SUBMITTED_STATUSES = ("submitted", "auto_graded", "manually_graded", "late")
+
+# Fields copied from Submission/Homework onto a rollup row
+ROLLUP_FIELDS = [
+    "academic_year",
+    "school_class",
+    "grade",
+    "subject",
+    "teacher",
+    "is_published",
+    "due_date",
+    "attempt_number",
+    "status",
+    "submitted_at",
+    "is_late",
+    "total_score",
+    "score_pct",
+]
+
+_ROLLUP_ATTNAMES = [StudentHomeworkScore._meta.get_field(name).attname for name in ROLLUP_FIELDS]
+
+
+def score_percentage(total_score, total_points):
+    """Mirror of reports.views._score_pct_expression: None until scored, 0 without total points."""
+    if total_score is None:
+        return None
+    if not total_points or total_points <= 0:
+        return Decimal("0.00")
+    pct = Decimal(total_score) * Decimal("100") / Decimal(total_points)
+    return pct.quantize(Decimal("0.01"))
+
+
+def build_row(submission):
+    """Build an unsaved rollup row from a submission (homework__school_class must be loaded)."""
+    homework = submission.homework
+    return StudentHomeworkScore(
+        student_id=submission.student_id,
+        homework_id=submission.homework_id,
+        academic_year_id=homework.school_class.academic_year_id,
+        school_class_id=homework.school_class_id,
+        grade_id=homework.grade_id,
+        subject_id=homework.subject_id,
+        teacher_id=homework.teacher_id,
+        is_published=homework.is_published,
+        due_date=homework.due_date,
+        attempt_number=submission.attempt_number,
+        status=submission.status,
+        submitted_at=submission.submitted_at,
+        is_late=submission.is_late,
+        total_score=submission.total_score,
+        score_pct=score_percentage(submission.total_score, homework.total_points),
+    )
+
+
+def refresh_student_homework(homework_id, student_id):
+    """Re-derive the rollup row for one (homework, student) from the latest attempt."""
+    latest = (
+        Submission.objects.filter(homework_id=homework_id, student_id=student_id)
+        .select_related("homework__school_class")
+        .order_by("-attempt_number")
+        .first()
+    )
+    if latest is None:
+        StudentHomeworkScore.objects.filter(homework_id=homework_id, student_id=student_id).delete()
+        return None
+
+    row = build_row(latest)
+    row, _ = StudentHomeworkScore.objects.update_or_create(
+        homework_id=homework_id,
+        student_id=student_id,
+        defaults={attname: getattr(row, attname) for attname in _ROLLUP_ATTNAMES},
+    )
+    return row
+
+
+def refresh_students(homework_id, student_ids):
+    """Set-based refresh of the rows of several students of one homework (used after bulk regrades)."""
+    student_ids = set(student_ids)
+    existing = {
+        row.student_id: row
+        for row in StudentHomeworkScore.objects.filter(homework_id=homework_id, student_id__in=student_ids)
+    }
+    to_create, to_update = [], []
+    for row in iter_expected_rows([homework_id], student_ids=student_ids):
+        current = existing.pop(row.student_id, None)
+        if current is None:
+            to_create.append(row)
+        else:
+            row.pk = current.pk
+            to_update.append(row)
+
+    StudentHomeworkScore.objects.bulk_create(to_create, batch_size=500)
+    StudentHomeworkScore.objects.bulk_update(to_update, ROLLUP_FIELDS, batch_size=500)
+    if existing:
+        StudentHomeworkScore.objects.filter(pk__in=[row.pk for row in existing.values()]).delete()
+    return len(to_create) + len(to_update)
+
+
+def refresh_homework(homework_id):
+    """Propagate homework-level changes (dimensions, publish flag, total points) to its rows."""
+    homework = Homework.objects.select_related("school_class").filter(id=homework_id).first()
+    if homework is None:
+        return 0
+
+    rows = list(StudentHomeworkScore.objects.filter(homework_id=homework_id))
+    for row in rows:
+        row.academic_year_id = homework.school_class.academic_year_id
+        row.school_class_id = homework.school_class_id
+        row.grade_id = homework.grade_id
+        row.subject_id = homework.subject_id
+        row.teacher_id = homework.teacher_id
+        row.is_published = homework.is_published
+        row.due_date = homework.due_date
+        row.score_pct = score_percentage(row.total_score, homework.total_points)
+
+    StudentHomeworkScore.objects.bulk_update(
+        rows,
+        ["academic_year", "school_class", "grade", "subject", "teacher", "is_published", "due_date", "score_pct"],
+        batch_size=500,
+    )
+    return len(rows)
+
+
+def iter_expected_rows(homework_ids=None, chunk_size=2000, student_ids=None):
+    """Yield the rollup rows implied by Submission, one per (homework, student) latest attempt."""
+    submissions = Submission.objects.select_related("homework__school_class").order_by(
+        "homework_id", "student_id", "-attempt_number"
+    )
+    if homework_ids is not None:
+        submissions = submissions.filter(homework_id__in=homework_ids)
+    if student_ids is not None:
+        submissions = submissions.filter(student_id__in=student_ids)
+
+    last_key = None
+    for submission in submissions.iterator(chunk_size=chunk_size):
+        key = (submission.homework_id, submission.student_id)
+        if key == last_key:
+            continue
+        last_key = key
+        yield build_row(submission)
+
+
+def rebuild(batch_size=1000):
+    """Truncate and repopulate the rollup from Submission. Returns the number of rows written."""
+    written = 0
+    batch = []
+    with transaction.atomic():
+        StudentHomeworkScore.objects.all().delete()
+        for row in iter_expected_rows(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                StudentHomeworkScore.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            StudentHomeworkScore.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def check_consistency(fix=False, homework_batch_size=200):
+    """
+    Compare the rollup against Submission, homework by homework.
+    Returns counts of checked/missing/stale/orphaned rows; with fix=True they are repaired.
+    """
+    report = {"checked": 0, "missing": 0, "stale": 0, "orphaned": 0}
+
+    homework_ids = set(Submission.objects.values_list("homework_id", flat=True).distinct())
+    homework_ids.update(StudentHomeworkScore.objects.values_list("homework_id", flat=True).distinct())
+    homework_ids = sorted(homework_ids)
+
+    for start in range(0, len(homework_ids), homework_batch_size):
+        batch_ids = homework_ids[start:start + homework_batch_size]
+        existing = {
+            (row.homework_id, row.student_id): row
+            for row in StudentHomeworkScore.objects.filter(homework_id__in=batch_ids)
+        }
+        to_create, to_update = [], []
+
+        for expected in iter_expected_rows(batch_ids):
+            report["checked"] += 1
+            current = existing.pop((expected.homework_id, expected.student_id), None)
+            if current is None:
+                report["missing"] += 1
+                to_create.append(expected)
+            elif any(getattr(current, attname) != getattr(expected, attname) for attname in _ROLLUP_ATTNAMES):
+                report["stale"] += 1
+                expected.pk = current.pk
+                to_update.append(expected)
+
+        report["orphaned"] += len(existing)
+
+        if fix:
+            with transaction.atomic():
+                StudentHomeworkScore.objects.bulk_create(to_create, batch_size=500)
+                StudentHomeworkScore.objects.bulk_update(to_update, ROLLUP_FIELDS, batch_size=500)
+                if existing:
+                    StudentHomeworkScore.objects.filter(pk__in=[row.pk for row in existing.values()]).delete()
+
+    return report
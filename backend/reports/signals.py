@@ -0,0 +1,48 @@
+# reports/signals.py
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from homework.models import Homework, Question, Submission
+from homework.signals import submissions_regraded
+
+from .rollup import refresh_homework, refresh_student_homework, refresh_students
+
+
+@receiver(post_save, sender=Submission)
+def update_score_rollup_on_submission_save(sender, instance, raw=False, **kwargs):
+    """Keep the StudentHomeworkScore row in sync whenever a submission is saved or graded."""
+    if raw:
+        return
+    refresh_student_homework(instance.homework_id, instance.student_id)
+
+
+@receiver(post_delete, sender=Submission)
+def update_score_rollup_on_submission_delete(sender, instance, **kwargs):
+    refresh_student_homework(instance.homework_id, instance.student_id)
+
+
+@receiver(submissions_regraded)
+def update_score_rollup_on_regrade(sender, homework_id, student_ids, **kwargs):
+    refresh_students(homework_id, student_ids)
+
+
+@receiver(post_save, sender=Homework)
+def update_score_rollup_on_homework_save(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    refresh_homework(instance.id)
+
+
+@receiver(post_save, sender=Question)
+def update_score_rollup_on_question_save(sender, instance, raw=False, **kwargs):
+    # homework.signals has already refreshed Homework.total_points at this point
+    if raw or not instance.homework_id:
+        return
+    refresh_homework(instance.homework_id)
+
+
+@receiver(post_delete, sender=Question)
+def update_score_rollup_on_question_delete(sender, instance, **kwargs):
+    if instance.homework_id:
+        refresh_homework(instance.homework_id)
@@ -1,3 +1,6 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
@@ -6,6 +9,8 @@ from django.contrib.auth import get_user_model
 
 from schools.models import AcademicYear, EducationalLevel, Grade, SchoolClass, Subject
 from homework.models import Homework, Submission
+from reports.models import StudentHomeworkScore
+from reports.rollup import check_consistency, rebuild
 
 
 class StudentPerformanceReportTests(TestCase):
@@ -40,9 +45,7 @@ class StudentPerformanceReportTests(TestCase):
         self.grade = Grade.objects.create(
             educational_level=self.level, grade_number=1, code="G1", name="Grade 1"
         )
-        self.subject = Subject.objects.create(
-            name="Math", code="MATH", grade=self.grade
-        )
+        self.subject = Subject.objects.create(name="Math", code="MATH")
         self.school_class = SchoolClass.objects.create(
             grade=self.grade, academic_year=self.academic_year, section="A"
         )
@@ -147,3 +150,46 @@ class StudentPerformanceReportTests(TestCase):
         self.assertIn("top_students", data)
         # Missing submissions should still reflect only this teacher's scope
         self.assertGreaterEqual(data["summary"]["missing_submissions"], 0)
+
+    def test_rollup_tracks_submission_grading(self):
+        row = StudentHomeworkScore.objects.get(student=self.student, homework=self.hw1)
+        self.assertEqual(row.score_pct, 80)
+        self.assertEqual(row.academic_year_id, self.academic_year.id)
+
+        submission = Submission.objects.get(homework=self.hw1, student=self.student)
+        submission.total_score = 45
+        submission.status = "manually_graded"
+        submission.save()
+
+        row.refresh_from_db()
+        self.assertEqual(row.score_pct, 45)
+        self.assertEqual(row.status, "manually_graded")
+
+        self.hw1.total_points = 50
+        self.hw1.save()
+        row.refresh_from_db()
+        self.assertEqual(row.score_pct, 90)
+
+        submission.delete()
+        self.assertFalse(StudentHomeworkScore.objects.filter(homework=self.hw1).exists())
+
+    def test_report_reads_rollup(self):
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.get(reverse("student-performance-report"))
+        data = resp.json()
+        self.assertEqual(data["summary"]["average_score"], 80.0)
+        self.assertEqual(data["summary"]["missing_submissions"], 1)
+        self.assertEqual(data["top_students"][0]["student_id"], self.student.id)
+        self.assertEqual(sum(bucket["count"] for bucket in data["grade_distribution"]), 1)
+
+    def test_rebuild_and_consistency_check(self):
+        StudentHomeworkScore.objects.all().update(score_pct=10)
+        report = check_consistency()
+        self.assertEqual(report["stale"], 1)
+
+        self.assertEqual(rebuild(), 1)
+        self.assertEqual(check_consistency(), {"checked": 1, "missing": 0, "stale": 0, "orphaned": 0})
+
+        StudentHomeworkScore.objects.all().delete()
+        call_command("check_score_rollup", "--fix", stdout=StringIO())
+        self.assertEqual(StudentHomeworkScore.objects.get(homework=self.hw1).score_pct, 80)
@@ -24,6 +24,9 @@ from schools.models import SchoolClass
 from users.models import StudentEnrollment
 from homework.models import LessonProgress
 
+from .models import StudentHomeworkScore
+from .rollup import SUBMITTED_STATUSES
+
 
 def _parse_int(value):
     try:
@@ -88,7 +91,9 @@ def _role_scoped_homework(user, base_queryset):
         return base_queryset.filter(Q(teacher=user) | Q(school_class__teachers=user)).distinct()
 
     if role == "STUDENT":
-        return base_queryset.filter(submissions__student=user).distinct()
+        return base_queryset.filter(
+            id__in=StudentHomeworkScore.objects.filter(student=user).values("homework_id")
+        )
 
     if role == "PARENT":
         # Parent scope is limited to explicit student_id filtering (enforced upstream)
@@ -97,15 +102,16 @@ def _role_scoped_homework(user, base_queryset):
     return base_queryset.none()
 
 
-def _role_scoped_submissions(user, base_queryset, student_id=None):
+def _role_scoped_scores(user, base_queryset, student_id=None):
     role = getattr(user, "role", "").upper()
 
     if role in {"ADMIN", "STAFF"}:
         return base_queryset
 
     if role == "TEACHER":
+        # Subquery instead of a join on the teachers M2M so rows are not duplicated
         return base_queryset.filter(
-            Q(homework__teacher=user) | Q(homework__school_class__teachers=user)
+            Q(teacher=user) | Q(school_class_id__in=SchoolClass.objects.filter(teachers=user).values("id"))
         )
 
     if role == "STUDENT":
@@ -119,7 +125,7 @@ def _role_scoped_submissions(user, base_queryset, student_id=None):
 
 class StudentPerformanceReportView(APIView):
     """
-    Cohort-level student performance reports based on Homework + Submission + LessonProgress.
+    Cohort-level student performance reports based on the StudentHomeworkScore rollup + LessonProgress.
     Filters: date_range, academic_year, grade, class, subject, teacher, student.
     """
 
@@ -140,55 +146,51 @@ class StudentPerformanceReportView(APIView):
             if child.parent_id != request.user.id:
                 return Response({"detail": "Not authorized for this student"}, status=403)
 
-        # Base homework scope
+        # Base homework scope (used for assigned counts and recent assessments)
         homework_qs = Homework.objects.filter(is_published=True).select_related(
             "grade", "school_class", "subject", "teacher"
         )
         homework_qs = _role_scoped_homework(request.user, homework_qs)
 
+        # Score rows scoped to role/student, filtered on the denormalized dimensions
+        scores_scope = StudentHomeworkScore.objects.filter(is_published=True)
+        scores_scope = _role_scoped_scores(request.user, scores_scope, params["student_id"])
+
         if params["academic_year_id"]:
             homework_qs = homework_qs.filter(school_class__academic_year_id=params["academic_year_id"])
+            scores_scope = scores_scope.filter(academic_year_id=params["academic_year_id"])
         if params["grade_id"]:
             homework_qs = homework_qs.filter(grade_id=params["grade_id"])
+            scores_scope = scores_scope.filter(grade_id=params["grade_id"])
         if params["class_id"]:
             homework_qs = homework_qs.filter(school_class_id=params["class_id"])
+            scores_scope = scores_scope.filter(school_class_id=params["class_id"])
         if params["subject_id"]:
             homework_qs = homework_qs.filter(subject_id=params["subject_id"])
+            scores_scope = scores_scope.filter(subject_id=params["subject_id"])
         if params["teacher_id"]:
             homework_qs = homework_qs.filter(teacher_id=params["teacher_id"])
+            scores_scope = scores_scope.filter(teacher_id=params["teacher_id"])
 
-        # Submissions scoped to role/student
-        submissions_qs = Submission.objects.filter(homework__in=homework_qs).select_related(
-            "homework", "student", "homework__school_class", "homework__subject"
-        )
-        submissions_qs = _role_scoped_submissions(request.user, submissions_qs, params["student_id"])
-
-        # Date filters on submissions
+        # Date filters on submission time
+        scores_qs = scores_scope
         if params["date_start"] and params["date_end"]:
-            submissions_qs = submissions_qs.filter(
+            scores_qs = scores_qs.filter(
                 submitted_at__date__gte=params["date_start"].date(),
                 submitted_at__date__lte=params["date_end"].date(),
             )
 
-        submissions_prev = Submission.objects.none()
+        scores_prev = StudentHomeworkScore.objects.none()
         if params.get("prev_date_start") and params.get("prev_date_end"):
-            submissions_prev = Submission.objects.filter(homework__in=homework_qs).select_related(
-                "homework", "student", "homework__school_class", "homework__subject"
-            )
-            submissions_prev = _role_scoped_submissions(request.user, submissions_prev, params["student_id"])
-            submissions_prev = submissions_prev.filter(
+            scores_prev = scores_scope.filter(
                 submitted_at__date__gte=params["prev_date_start"].date(),
                 submitted_at__date__lte=params["prev_date_end"].date(),
             )
 
-        scored_submissions = submissions_qs.filter(total_score__isnull=False).annotate(
-            score_pct=_score_pct_expression()
-        )
-        scored_prev = submissions_prev.filter(total_score__isnull=False).annotate(
-            score_pct=_score_pct_expression()
-        )
+        scored_scores = scores_qs.filter(score_pct__isnull=False)
+        scored_prev = scores_prev.filter(score_pct__isnull=False)
 
-        data = self._build_payload(homework_qs, submissions_qs, scored_submissions, scored_prev, params)
+        data = self._build_payload(homework_qs, scores_qs, scored_scores, scored_prev, params)
         return Response(data)
 
     def _parse_filters(self, request):
@@ -220,10 +222,10 @@ class StudentPerformanceReportView(APIView):
             "ordering": request.GET.get("ordering"),
         }
 
-    def _build_payload(self, homework_qs, submissions_qs, scored_submissions, scored_prev, params):
+    def _build_payload(self, homework_qs, scores_qs, scored_scores, scored_prev, params):
         assigned_count = homework_qs.count()
-        submitted_homeworks = submissions_qs.filter(
-            status__in=["submitted", "auto_graded", "manually_graded", "late"]
+        submitted_homeworks = scores_qs.filter(
+            status__in=SUBMITTED_STATUSES
         ).values("homework_id").distinct().count()
         missing_submissions = max(0, assigned_count - submitted_homeworks)
         completion_rate = (submitted_homeworks / assigned_count * 100) if assigned_count else 0
@@ -231,23 +233,24 @@ class StudentPerformanceReportView(APIView):
         pass_flag = Case(When(score_pct__gte=50, then=1), default=0, output_field=DecimalField())
         on_time_flag = Case(When(is_late=False, then=1), default=0, output_field=DecimalField())
 
-        avg_score = scored_submissions.aggregate(avg=Avg("score_pct"))["avg"] or 0
-        prev_avg_score = scored_prev.aggregate(avg=Avg("score_pct"))["avg"] if scored_prev.exists() else None
+        current = scored_scores.aggregate(avg=Avg("score_pct"), rate=Avg(pass_flag), total=Count("id"))
+        previous = scored_prev.aggregate(avg=Avg("score_pct"), total=Count("id"))
+
+        avg_score = current["avg"] or 0
+        prev_avg_score = previous["avg"] if previous["total"] else None
         trend_delta = None
         if prev_avg_score is not None:
             trend_delta = round(float(avg_score or 0) - float(prev_avg_score or 0), 2)
-        pass_rate = (
-            scored_submissions.aggregate(rate=Avg(pass_flag))["rate"] * 100 if scored_submissions.exists() else 0
-        )
+        pass_rate = current["rate"] * 100 if current["total"] else 0
         accuracy_pct = 0
 
-        grade_distribution = self._grade_distribution(scored_submissions)
+        grade_distribution = self._grade_distribution(scored_scores)
         top_students, at_risk_students, pagination = self._student_leaderboards(
-            homework_qs, submissions_qs, scored_submissions, scored_prev, pass_flag, params
+            homework_qs, scores_qs, scored_scores, scored_prev, pass_flag, params
         )
-        subject_breakdown = self._subject_breakdown(scored_submissions, pass_flag, on_time_flag)
-        class_breakdown = self._class_breakdown(scored_submissions, pass_flag)
-        recent_assessments = self._recent_assessments(homework_qs, submissions_qs)
+        subject_breakdown = self._subject_breakdown(scored_scores, pass_flag, on_time_flag)
+        class_breakdown = self._class_breakdown(scored_scores, pass_flag)
+        recent_assessments = self._recent_assessments(homework_qs, scores_qs)
 
         return {
             "summary": {
@@ -268,7 +271,7 @@ class StudentPerformanceReportView(APIView):
             "pagination": pagination,
         }
 
-    def _grade_distribution(self, scored_submissions):
+    def _grade_distribution(self, scored_scores):
         buckets = [
             {"label": "<60", "min": 0, "max": 59.99},
             {"label": "60-69", "min": 60, "max": 69.99},
@@ -276,10 +279,18 @@ class StudentPerformanceReportView(APIView):
             {"label": "80-89", "min": 80, "max": 89.99},
             {"label": "90-100", "min": 90, "max": 100},
         ]
-        total = scored_submissions.count() or 1
+        # One pass over the rollup instead of a COUNT per bucket
+        counts = scored_scores.aggregate(
+            total=Count("id"),
+            **{
+                f"bucket_{index}": Count("id", filter=Q(score_pct__gte=bucket["min"], score_pct__lte=bucket["max"]))
+                for index, bucket in enumerate(buckets)
+            },
+        )
+        total = counts["total"] or 1
         results = []
-        for bucket in buckets:
-            count = scored_submissions.filter(score_pct__gte=bucket["min"], score_pct__lte=bucket["max"]).count()
+        for index, bucket in enumerate(buckets):
+            count = counts[f"bucket_{index}"]
             results.append(
                 {
                     "label": bucket["label"],
@@ -289,16 +300,16 @@ class StudentPerformanceReportView(APIView):
             )
         return results
 
-    def _student_leaderboards(self, homework_qs, submissions_qs, scored_submissions, scored_prev, pass_flag, params):
+    def _student_leaderboards(self, homework_qs, scores_qs, scored_scores, scored_prev, pass_flag, params):
         per_student_qs = (
-            scored_submissions.values(
+            scored_scores.values(
                 "student_id",
                 "student__first_name",
                 "student__last_name",
-                "homework__school_class__name",
-                "homework__school_class_id",
-                "homework__subject__name",
-                "homework__subject_id",
+                "school_class__name",
+                "school_class_id",
+                "subject__name",
+                "subject_id",
             )
             .annotate(
                 avg_score=Avg("score_pct"),
@@ -309,23 +320,13 @@ class StudentPerformanceReportView(APIView):
         )
         per_student = list(per_student_qs)
 
-        prev_map = {}
-        if scored_prev.exists():
-            prev_rows = (
-                scored_prev.values("student_id")
-                .annotate(prev_avg=Avg("score_pct"))
-            )
-            prev_map = {row["student_id"]: float(row["prev_avg"] or 0) for row in prev_rows}
+        prev_rows = (
+            scored_prev.values("student_id")
+            .annotate(prev_avg=Avg("score_pct"))
+        )
+        prev_map = {row["student_id"]: float(row["prev_avg"] or 0) for row in prev_rows}
 
-        # Build enrollment map for student -> class ids
         student_ids = [row["student_id"] for row in per_student]
-        enrollment_map = {}
-        if student_ids:
-            enrolls = StudentEnrollment.objects.filter(student_id__in=student_ids).values(
-                "student_id", "school_class_id"
-            )
-            for e in enrolls:
-                enrollment_map.setdefault(e["student_id"], set()).add(e["school_class_id"])
 
         # Homework counts per class/subject
         hw_counts = {}
@@ -338,12 +339,12 @@ class StudentPerformanceReportView(APIView):
 
         # Submitted counts per student/class/subject (any submitted/graded)
         submitted_rows = (
-            submissions_qs.filter(status__in=["submitted", "auto_graded", "manually_graded", "late"])
-            .values("student_id", "homework__school_class_id", "homework__subject_id")
+            scores_qs.filter(status__in=SUBMITTED_STATUSES)
+            .values("student_id", "school_class_id", "subject_id")
             .annotate(total=Count("homework", distinct=True))
         )
         submitted_map = {
-            (row["student_id"], row["homework__school_class_id"], row["homework__subject_id"]): row["total"]
+            (row["student_id"], row["school_class_id"], row["subject_id"]): row["total"]
             for row in submitted_rows
         }
 
@@ -362,17 +363,9 @@ class StudentPerformanceReportView(APIView):
         at_risk = []
 
         for row in per_student:
-            class_ids = enrollment_map.get(row["student_id"], set())
-            if class_ids:
-                assigned_for_student = 0
-                assigned_for_student += hw_counts.get((row.get("homework__school_class_id"), row.get("homework__subject_id")), 0)
-            else:
-                assigned_for_student = hw_counts.get((row.get("homework__school_class_id"), row.get("homework__subject_id")), 0)
-
-            submitted_for_student = submitted_map.get(
-                (row["student_id"], row.get("homework__school_class_id"), row.get("homework__subject_id")),
-                0,
-            )
+            class_subject = (row.get("school_class_id"), row.get("subject_id"))
+            assigned_for_student = hw_counts.get(class_subject, 0)
+            submitted_for_student = submitted_map.get((row["student_id"],) + class_subject, 0)
 
             missing = max(0, assigned_for_student - submitted_for_student)
             name = f"{row.get('student__first_name', '')} {row.get('student__last_name', '')}".strip() or "Student"
@@ -380,7 +373,7 @@ class StudentPerformanceReportView(APIView):
             improvement = None
             if row["student_id"] in prev_map:
                 improvement = round(current_avg - prev_map[row["student_id"]], 2)
-            accuracy = accuracy_map.get((row["student_id"], row.get("homework__subject_id")))
+            accuracy = accuracy_map.get((row["student_id"], row.get("subject_id")))
 
             students.append({
                 "student_id": row["student_id"],
@@ -389,8 +382,8 @@ class StudentPerformanceReportView(APIView):
                 "pass_rate": round(float(row["pass_rate"] or 0), 2),
                 "missing_submissions": missing,
                 "late_count": row["late_count"],
-                "subject": row.get("homework__subject__name") or "",
-                "class_name": row.get("homework__school_class__name") or "",
+                "subject": row.get("subject__name") or "",
+                "class_name": row.get("school_class__name") or "",
                 "improvement": improvement,
                 "accuracy": accuracy,
             })
@@ -423,9 +416,9 @@ class StudentPerformanceReportView(APIView):
             "total_students": len(students),
         }
 
-    def _subject_breakdown(self, scored_submissions, pass_flag, on_time_flag):
+    def _subject_breakdown(self, scored_scores, pass_flag, on_time_flag):
         breakdown = (
-            scored_submissions.values("homework__subject_id", "homework__subject__name")
+            scored_scores.values("subject_id", "subject__name")
             .annotate(
                 avg_score=Avg("score_pct"),
                 pass_rate=Avg(pass_flag) * 100,
@@ -436,8 +429,8 @@ class StudentPerformanceReportView(APIView):
         )
         return [
             {
-                "subject_id": row["homework__subject_id"],
-                "subject_name": row["homework__subject__name"],
+                "subject_id": row["subject_id"],
+                "subject_name": row["subject__name"],
                 "average_score": round(float(row["avg_score"] or 0), 2),
                 "pass_rate": round(float(row["pass_rate"] or 0), 2),
                 "on_time_rate": round(float(row["on_time_rate"] or 0), 2),
@@ -446,20 +439,20 @@ class StudentPerformanceReportView(APIView):
             for row in breakdown
         ]
 
-    def _class_breakdown(self, scored_submissions, pass_flag):
+    def _class_breakdown(self, scored_scores, pass_flag):
         breakdown = (
-            scored_submissions.values("homework__school_class_id", "homework__school_class__name")
+            scored_scores.values("school_class_id", "school_class__name")
             .annotate(
                 avg_score=Avg("score_pct"),
                 pass_rate=Avg(pass_flag) * 100,
                 submission_count=Count("id"),
             )
-            .order_by("homework__school_class__name")
+            .order_by("school_class__name")
         )
         return [
             {
-                "class_id": row["homework__school_class_id"],
-                "class_name": row["homework__school_class__name"],
+                "class_id": row["school_class_id"],
+                "class_name": row["school_class__name"],
                 "average_score": round(float(row["avg_score"] or 0), 2),
                 "pass_rate": round(float(row["pass_rate"] or 0), 2),
                 "submission_count": row["submission_count"],
@@ -467,7 +460,7 @@ class StudentPerformanceReportView(APIView):
             for row in breakdown
         ]
 
-    def _recent_assessments(self, homework_qs, submissions_qs, limit=6):
+    def _recent_assessments(self, homework_qs, scores_qs, limit=6):
         recent_homework = (
             homework_qs.select_related("subject", "school_class")
             .order_by("-due_date")[:limit]
@@ -475,12 +468,11 @@ class StudentPerformanceReportView(APIView):
 
         homework_ids = [hw.id for hw in recent_homework]
         score_map = (
-            submissions_qs.filter(homework_id__in=homework_ids, total_score__isnull=False)
-            .annotate(score_pct=_score_pct_expression())
+            scores_qs.filter(homework_id__in=homework_ids, score_pct__isnull=False)
             .values("homework_id")
             .annotate(
                 avg_score=Avg("score_pct"),
-                submitted=Count("id", filter=Q(status__in=["submitted", "auto_graded", "manually_graded", "late"])),
+                submitted=Count("id", filter=Q(status__in=SUBMITTED_STATUSES)),
                 std_dev=StdDev("score_pct"),
             )
         )
@@ -11,16 +11,13 @@ class EmailBackend(BaseBackend):
         if not email:
             return None
         try:
-            user = UserModel.objects.get(email=email)
+            # The login response and token claims read the profile
+            user = UserModel.objects.select_related('profile__school_subject').get(email=email)
             if user.check_password(password):
                 return user
             else:
                 return None
         except UserModel.DoesNotExist:
-            all_users = UserModel.objects.all()
-            all_emails = [u.email for u in all_users]
-            for db_email in all_emails:
-                print(f"    - {repr(db_email)}")
             return None
 
     def get_user(self, user_id):
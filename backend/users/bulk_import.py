@@ -0,0 +1,436 @@
+# backend/users/bulk_import.py
+"""
+Bulk student import engine behind StudentBulkImportView.
+
+The sheet is validated column-wise with pandas (required names, dates, field lengths)
+rather than row by row. Generated emails come from users.emails.EmailAllocator, preloaded
+with one query per role domain. Passwords are hashed in a thread pool (PBKDF2 releases the
+GIL), then parents, students, profiles, enrollments and parent relations are written with
+bulk_create, one transaction per chunk of rows. A chunk rejected by the email unique
+constraint (a concurrent registration) is retried once with freshly loaded domains; a chunk
+that still fails is written again one row at a time, each row in its own savepoint, so only
+the offending rows are reported and the rest of the import carries on.
+
+bulk_create bypasses the post_save signal that creates profiles, so profiles are created
+here with the imported data. Job progress is written at most every PROGRESS_INTERVAL seconds.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pandas as pd
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+
+from attendance.models import StudentParentRelation
+from .emails import EmailAllocator, email_base, email_domain
+from .models import Profile, StudentEnrollment, User
+
+DEFAULT_PASSWORD = 'defaultStrongPassword25'
+IMPORT_CHUNK_SIZE = 200
+PROGRESS_INTERVAL = 0.5
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+REQUIRED_COLUMNS = {
+    'Student First Name': 'Student first name',
+    'Student Last Name': 'Student last name',
+    'Arabic First Name': 'Arabic first name',
+    'Arabic Last Name': 'Arabic last name',
+}
+# Profile field -> sheet column
+PROFILE_COLUMNS = {
+    'phone': 'Student Phone',
+    'address': 'Address',
+    'bio': 'Notes',
+    'emergency_contact_name': 'Emergency Contact Name',
+    'emergency_contact_phone': 'Emergency Contact Phone',
+}
+PARENT_COLUMNS = {
+    'parent_first_name': 'Parent First Name',
+    'parent_last_name': 'Parent Last Name',
+    'parent_phone': 'Parent Phone',
+}
+DATE_OF_BIRTH = 'Date of Birth'
+
+_MAX_LENGTHS = {
+    'Student First Name': User._meta.get_field('first_name').max_length,
+    'Student Last Name': User._meta.get_field('last_name').max_length,
+    'Arabic First Name': Profile._meta.get_field('ar_first_name').max_length,
+    'Arabic Last Name': Profile._meta.get_field('ar_last_name').max_length,
+    'Student Phone': Profile._meta.get_field('phone').max_length,
+    'Emergency Contact Name': Profile._meta.get_field('emergency_contact_name').max_length,
+    'Emergency Contact Phone': Profile._meta.get_field('emergency_contact_phone').max_length,
+    'Parent First Name': User._meta.get_field('first_name').max_length,
+    'Parent Last Name': User._meta.get_field('last_name').max_length,
+    'Parent Phone': Profile._meta.get_field('phone').max_length,
+}
+
+class ImportInterrupted(Exception):
+    """Raised by an on_chunk callback to stop the import; the chunk in flight is rolled back."""
+
+
+class ProgressReporter:
+    """
+    Throttled BulkImportJob.update_progress: at most one write every `interval` seconds.
+    Each write also refreshes the worker heartbeat; it raises ImportInterrupted if another
+    worker claimed the job meanwhile.
+    """
+
+    def __init__(self, job, interval=PROGRESS_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self._last = None
+
+    def update(self, progress, status=None, force=False):
+        now = time.monotonic()
+        if force or self._last is None or now - self._last >= self.interval:
+            if not self.job.update_progress(int(progress), status):
+                raise ImportInterrupted(f"Import job {self.job.job_id} was taken over by another worker")
+            self._last = now
+
+    def heartbeat(self):
+        """Refresh the heartbeat now, outside any transaction (e.g. before retrying a slow chunk)."""
+        self.update(self.job.progress, force=True)
+
+
+def hash_passwords(count, password=DEFAULT_PASSWORD):
+    """`count` independently salted hashes of `password`."""
+    if count <= 1:
+        return [make_password(password) for _ in range(count)]
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        return list(pool.map(make_password, [password] * count))
+
+
+def _text(df, column):
+    """Column as stripped strings ('' for empty cells or a missing column)."""
+    if column not in df:
+        return pd.Series('', index=df.index, dtype=object)
+    values = df[column]
+    return values.astype(object).where(values.notna(), '').astype(str).str.strip()
+
+
+def prepare_rows(df):
+    """
+    Validate the sheet column-wise.
+    Returns (rows, errors, processed_rows): the valid rows as records of cleaned values,
+    the row errors, and the number of non-empty rows.
+    """
+    # Rows without a student name are blank template rows
+    df = df[df['Student First Name'].notna() & df['Student Last Name'].notna()]
+
+    text = {
+        column: _text(df, column)
+        for column in [*REQUIRED_COLUMNS, *PROFILE_COLUMNS.values(), *PARENT_COLUMNS.values()]
+    }
+    messages = pd.Series('', index=df.index, dtype=object)
+
+    for column, display_name in REQUIRED_COLUMNS.items():
+        messages += (text[column] == '').map({True: f'{display_name} is required. ', False: ''})
+
+    if DATE_OF_BIRTH in df:
+        dates = pd.to_datetime(df[DATE_OF_BIRTH], errors='coerce', format='mixed')
+        invalid_dates = df[DATE_OF_BIRTH].notna() & dates.isna()
+        messages += invalid_dates.map({True: 'Invalid date format for Date of Birth. Use YYYY-MM-DD. ', False: ''})
+    else:
+        dates = pd.Series(pd.NaT, index=df.index)
+
+    for column, max_length in _MAX_LENGTHS.items():
+        too_long = text[column].str.len() > max_length
+        messages += too_long.map({True: f'{column} must be at most {max_length} characters. ', False: ''})
+
+    # Rows whose names cannot make a valid email (e.g. a last name without Latin letters)
+    student_domain = email_domain('STUDENT')
+    for position, (first_name, last_name) in enumerate(zip(text['Student First Name'], text['Student Last Name'])):
+        if messages.iat[position]:
+            continue
+        try:
+            validate_email(f"{email_base(first_name, last_name)}{student_domain}")
+        except ValidationError as e:
+            messages.iat[position] = f"Validation failed: {{'email': {e.messages}}}"
+
+    row_numbers = df.index + 2  # Excel row number (accounting for header)
+    errors = [
+        {'row': int(row_number), 'error': message.strip()}
+        for row_number, message in zip(row_numbers, messages)
+        if message
+    ]
+
+    valid = (messages == '').to_numpy()
+    rows = []
+    for position in valid.nonzero()[0]:
+        row = {'row_number': int(row_numbers[position])}
+        for column in text:
+            row[column] = text[column].iat[position]
+        birth_date = dates.iat[position]
+        row[DATE_OF_BIRTH] = None if pd.isna(birth_date) else birth_date.date()
+        rows.append(row)
+    return rows, errors, len(df)
+
+
+def _has_parent(row):
+    return bool(row['Parent First Name'] and row['Parent Last Name'])
+
+
+def _results(total_rows, preview_mode):
+    return {
+        'total_rows': total_rows,
+        'processed_rows': 0,
+        'successful_imports': 0,
+        'errors': [],
+        'warnings': [],
+        'preview_data': [] if preview_mode else None,
+        'created_students': [] if not preview_mode else None,
+        'created_parents': [] if not preview_mode else None,
+    }
+
+
+def preview_students(df):
+    """Validate the sheet and predict the generated emails, without writing anything."""
+    results = _results(len(df), preview_mode=True)
+    rows, results['errors'], results['processed_rows'] = prepare_rows(df)
+    students, parents = EmailAllocator('STUDENT', preload=True), EmailAllocator('PARENT', preload=True)
+
+    for row in rows:
+        student_email = students.allocate(row['Student First Name'], row['Student Last Name'])
+        predicted_parent_email = None
+        if _has_parent(row):
+            predicted_parent_email = parents.allocate(row['Parent First Name'], row['Parent Last Name'])
+        results['preview_data'].append({
+            'row_number': row['row_number'],
+            'student_name': f"{row['Student First Name']} {row['Student Last Name']}",
+            'arabic_name': f"{row['Arabic First Name']} {row['Arabic Last Name']}",
+            'parent_name': f"{row['Parent First Name']} {row['Parent Last Name']}".strip(),
+            'predicted_student_email': student_email,
+            'predicted_parent_email': predicted_parent_email or 'No parent data provided',
+        })
+    return results
+
+
+def _existing_parents(rows):
+    """(first name, last name, phone) -> id of the existing parents the import can link to."""
+    phones = {row['Parent Phone'] for row in rows if _has_parent(row) and row['Parent Phone']}
+    if not phones:
+        return {}
+    parents = {}
+    for parent_id, first_name, last_name, phone in (
+        User.objects.filter(role=User.Role.PARENT, profile__phone__in=phones)
+        .order_by('id')
+        .values_list('id', 'first_name', 'last_name', 'profile__phone')
+    ):
+        parents.setdefault((first_name, last_name, phone), parent_id)
+    return parents
+
+
+def _profile(user, **fields):
+    profile = Profile(**{name: value or None for name, value in fields.items()})
+    profile.user = user
+    return profile
+
+
+def _import_chunk(rows, educational_structure, allocators, known_parents):
+    """
+    Write one chunk of validated rows in the caller's transaction.
+    Returns (created students with their row, newly created parents by key).
+    """
+    students, parents = allocators
+    new_parents = {}
+    parent_keys = {}
+    parent_users = []
+
+    for row in rows:
+        if not _has_parent(row):
+            continue
+        first_name, last_name, phone = row['Parent First Name'], row['Parent Last Name'], row['Parent Phone']
+        # Parents are matched on name and phone; without a phone a new account is always created
+        key = (first_name, last_name, phone) if phone else ('row', row['row_number'])
+        parent_keys[row['row_number']] = key
+        if key in known_parents or key in new_parents:
+            continue
+        parent = User(
+            email=parents.allocate(first_name, last_name),
+            first_name=first_name,
+            last_name=last_name,
+            role=User.Role.PARENT,
+        )
+        parent._import_phone = phone
+        new_parents[key] = parent
+        parent_users.append(parent)
+
+    student_users = []
+    for row in rows:
+        student = User(
+            email=students.allocate(row['Student First Name'], row['Student Last Name']),
+            first_name=row['Student First Name'],
+            last_name=row['Student Last Name'],
+            role=User.Role.STUDENT,
+        )
+        student._import_row = row
+        student_users.append(student)
+
+    passwords = hash_passwords(len(parent_users) + len(student_users))
+    for user, password in zip(parent_users + student_users, passwords):
+        user.password = password
+
+    User.objects.bulk_create(parent_users)
+    Profile.objects.bulk_create([_profile(parent, phone=parent._import_phone) for parent in parent_users])
+
+    def parent_id(row):
+        key = parent_keys.get(row['row_number'])
+        if key is None:
+            return None
+        return known_parents[key] if key in known_parents else new_parents[key].id
+
+    for student in student_users:
+        student.parent_id = parent_id(student._import_row)
+    User.objects.bulk_create(student_users)
+
+    profiles = []
+    enrollments = []
+    relations = []
+    for student in student_users:
+        row = student._import_row
+        profiles.append(_profile(
+            student,
+            ar_first_name=row['Arabic First Name'],
+            ar_last_name=row['Arabic Last Name'],
+            date_of_birth=row[DATE_OF_BIRTH],
+            **{field: row[column] for field, column in PROFILE_COLUMNS.items()},
+        ))
+        if educational_structure:
+            enrollments.append(StudentEnrollment(
+                student=student,
+                school_class_id=educational_structure['class_id'],
+                academic_year_id=educational_structure['academic_year_id'],
+                enrollment_date=date.today(),
+                is_active=True,
+            ))
+        if student.parent_id:
+            relations.append(StudentParentRelation(
+                student=student,
+                parent_id=student.parent_id,
+                relationship_type='father',
+                is_primary_contact=True,
+            ))
+
+    Profile.objects.bulk_create(profiles)
+    StudentEnrollment.objects.bulk_create(enrollments)
+    StudentParentRelation.objects.bulk_create(relations, ignore_conflicts=True)
+
+    return student_users, new_parents
+
+
+def import_students(df, educational_structure=None, progress=None, chunk_size=IMPORT_CHUNK_SIZE,
+                    start=0, partial=None, on_chunk=None):
+    """
+    Import the students (and their parents) of the sheet.
+    Returns the same results dictionary as the preview, with created_students/created_parents.
+
+    on_chunk(done, partial) runs inside the transaction of each chunk with the number of
+    validated rows done and the results so far, so a caller can checkpoint them atomically
+    with the rows; passing them back as `start` and `partial` resumes an interrupted import.
+    Validation is deterministic, so the same sheet always yields the same validated rows.
+    """
+    results = _results(len(df), preview_mode=False)
+    if progress:
+        progress.update(5, "Validating data...", force=True)
+    rows, validation_errors, results['processed_rows'] = prepare_rows(df)
+
+    allocators = (EmailAllocator('STUDENT', preload=True), EmailAllocator('PARENT', preload=True))
+    # Includes the parents created by the chunks of an interrupted run
+    known_parents = _existing_parents(rows)
+    partial = partial or {'successful_imports': 0, 'created_students': [], 'parent_ids': [], 'errors': []}
+
+    def write_rows(chunk):
+        """Write the rows of a chunk one at a time; returns (students, new parents, errors)."""
+        students, new_parents, errors = [], {}, []
+        linkable = dict(known_parents)
+        for row in chunk:
+            try:
+                with transaction.atomic():
+                    row_students, row_parents = _import_chunk([row], educational_structure, allocators, linkable)
+            except Exception as save_error:
+                errors.append({'row': row['row_number'], 'error': f"Save Error: {save_error}"})
+                continue
+            students += row_students
+            new_parents.update(row_parents)
+            # Later rows of the chunk link to the parent created by this one
+            linkable.update({key: parent.id for key, parent in row_parents.items()})
+        return students, new_parents, errors
+
+    def write_chunk(chunk, done, row_by_row=False):
+        with transaction.atomic():
+            if row_by_row:
+                students, new_parents, errors = write_rows(chunk)
+            else:
+                students, new_parents = _import_chunk(chunk, educational_structure, allocators, known_parents)
+                errors = []
+            chunk_partial = {
+                'successful_imports': partial['successful_imports'] + len(students),
+                'created_students': partial['created_students'] + [
+                    {
+                        'id': student.id,
+                        'email': student.email,
+                        'full_name': student.full_name,
+                        'row_number': student._import_row['row_number'],
+                    }
+                    for student in students
+                ],
+                'parent_ids': partial['parent_ids'] + [student.parent_id for student in students if student.parent_id],
+                'errors': partial['errors'] + errors,
+            }
+            if on_chunk:
+                on_chunk(done, chunk_partial)
+        # Later chunks link to the parents created by this one
+        known_parents.update({key: parent.id for key, parent in new_parents.items()})
+        return chunk_partial
+
+    for chunk_start in range(start, len(rows), chunk_size):
+        chunk = rows[chunk_start:chunk_start + chunk_size]
+        done = chunk_start + len(chunk)
+        try:
+            try:
+                partial = write_chunk(chunk, done)
+            except IntegrityError:
+                # Most likely a concurrent registration took one of the allocated emails:
+                # reload the domains and retry the chunk once
+                for allocator in allocators:
+                    allocator.reset()
+                if progress:
+                    progress.heartbeat()
+                partial = write_chunk(chunk, done)
+        except ImportInterrupted:
+            raise
+        except Exception:
+            # Some row cannot be saved: fall back to one savepoint per row so that only
+            # the offending rows fail
+            for allocator in allocators:
+                allocator.reset()
+            if progress:
+                progress.heartbeat()
+            partial = write_chunk(chunk, done, row_by_row=True)
+
+        if progress:
+            progress.update(10 + done / max(len(rows), 1) * 85, f"Processing student {done} of {len(rows)}...")
+
+    results['successful_imports'] = partial['successful_imports']
+    results['created_students'] = partial['created_students']
+    parent_ids = set(partial['parent_ids'])
+    if parent_ids:
+        children = dict(
+            User.objects.filter(parent_id__in=parent_ids).values('parent_id')
+            .annotate(count=Count('id')).values_list('parent_id', 'count')
+        )
+        for parent in User.objects.filter(id__in=parent_ids).order_by('id'):
+            results['created_parents'].append({
+                'id': parent.id,
+                'email': parent.email,
+                'full_name': f"{parent.first_name} {parent.last_name}".strip(),
+                'children_count': children.get(parent.id, 0),
+            })
+
+    results['errors'] = sorted(validation_errors + partial['errors'], key=lambda error: error['row'])
+    return results
@@ -0,0 +1,34 @@
+# backend/users/checks.py
+"""
+System check for the shared cache.
+
+Presence (users.presence), unread notification counters (communication.unread) and lesson
+catalog versions (lessons.catalog) live in the default cache and are adjusted with atomic
+increments, so every web and worker process must see the same store. The development default
+(LocMemCache) is per process; with REQUIRE_SHARED_CACHE (the default outside DEBUG) the
+project refuses to start without Redis.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+SHARED_CACHE_BACKENDS = {
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+}
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    if not settings.REQUIRE_SHARED_CACHE:
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in SHARED_CACHE_BACKENDS:
+        return []
+    return [
+        Error(
+            f"The default cache ({backend}) is not shared between processes or has no atomic increments.",
+            hint="Set REDIS_URL: presence, unread counters and lesson catalog versions need a shared Redis cache.",
+            id='users.E001',
+        )
+    ]
@@ -0,0 +1,111 @@
+# backend/users/emails.py
+"""
+Allocation of generated account emails: initial.lastname[N]@madrasti-<role>.com
+
+The first account of a base gets the unnumbered address, later ones the next suffix after
+the highest one in use (2, 3, ...). EmailAllocator loads the addresses of a base with one
+prefix query the first time the base is seen (or a whole role domain at once for imports)
+and then hands out suffixes from memory. Allocation alone cannot stop a concurrent request
+from taking the same address, so callers create the account with create_with_unique_email(),
+which retries with the next suffix when the email unique constraint rejects the insert.
+"""
+import re
+from string import digits
+
+from django.db import IntegrityError, transaction
+
+from .models import User
+
+_ROLE_DOMAINS = {'STUDENT': 'students', 'PARENT': 'parents', 'TEACHER': 'teachers', 'ADMIN': 'team', 'STAFF': 'team'}
+
+
+def email_domain(role):
+    return f"@madrasti-{_ROLE_DOMAINS.get(role, 'users')}.com"
+
+
+def email_base(first_name, last_name):
+    """Local part of a generated email: initial.lastname"""
+    clean_last_name = re.sub(r'[^a-z0-9]', '', last_name.lower().replace(' ', '')).strip()
+    initial = first_name[0].lower() if first_name else 'u'
+    return f"{initial}.{clean_last_name}"
+
+
+def _suffix(local_part, base):
+    """Suffix of `local_part` as an address of `base` (1 for the unnumbered one), or None."""
+    if not local_part.startswith(base):
+        return None
+    rest = local_part[len(base):]
+    if not rest:
+        return 1
+    return int(rest) if rest.isdigit() else None
+
+
+class EmailAllocator:
+    """
+    Hands out generated emails of one role.
+    With preload=True every address of the role domain is fetched in one query up front
+    (bulk imports); otherwise each base is fetched with one prefix query when first needed.
+    """
+
+    def __init__(self, role, preload=False):
+        self.domain = email_domain(role)
+        self.preload = preload
+        self.reset()
+
+    def reset(self):
+        """Forget what was loaded and allocated, e.g. after a rolled-back insert."""
+        self._max_suffix = {}
+        self._domain_locals = None
+        if self.preload:
+            # Grouped by local part without trailing digits, where every address of a base lands
+            self._domain_locals = {}
+            for email in User.objects.filter(email__endswith=self.domain).values_list('email', flat=True):
+                local_part = email[:-len(self.domain)]
+                self._domain_locals.setdefault(local_part.rstrip(digits), []).append(local_part)
+
+    def _load(self, base):
+        if self._domain_locals is not None:
+            local_parts = self._domain_locals.get(base.rstrip(digits), [])
+        else:
+            local_parts = [
+                email[:-len(self.domain)]
+                for email in User.objects.filter(
+                    email__startswith=base, email__endswith=self.domain
+                ).values_list('email', flat=True)
+            ]
+        suffixes = [suffix for suffix in (_suffix(local_part, base) for local_part in local_parts) if suffix]
+        # 0: the unnumbered address is free
+        return max(suffixes, default=0)
+
+    def allocate(self, first_name, last_name):
+        base = email_base(first_name, last_name)
+        if base not in self._max_suffix:
+            self._max_suffix[base] = self._load(base)
+        suffix = self._max_suffix[base] = self._max_suffix[base] + 1
+        # Second address gets 2 (the first one has no number)
+        if suffix == 1:
+            return f"{base}{self.domain}"
+        return f"{base}{suffix}{self.domain}"
+
+    def release(self, first_name, last_name):
+        """Reload a base whose allocated address turned out to be taken."""
+        self._max_suffix.pop(email_base(first_name, last_name), None)
+        if self._domain_locals is not None:
+            self.reset()
+
+
+def create_with_unique_email(role, first_name, last_name, create, allocator=None, attempts=5):
+    """
+    Call create(email) with a generated email and return its result.
+    If a concurrent registration took the address first, retry with a fresh allocation.
+    """
+    allocator = allocator or EmailAllocator(role)
+    for attempt in range(attempts):
+        email = allocator.allocate(first_name, last_name)
+        try:
+            with transaction.atomic():
+                return create(email)
+        except IntegrityError:
+            if attempt == attempts - 1 or not User.objects.filter(email=email).exists():
+                raise
+            allocator.release(first_name, last_name)
@@ -0,0 +1,124 @@
+# backend/users/import_jobs.py
+"""
+DB-backed queue of student bulk imports.
+
+StudentBulkImportView stores the uploaded sheet on a PENDING BulkImportJob (enqueue_import)
+and the `run_import_worker` management command runs queued jobs one at a time with
+users.bulk_import. Every chunk of rows is committed together with the job checkpoint (rows
+done and results so far), so a worker that dies mid-import loses at most the chunk in
+flight. A PROCESSING job whose heartbeat is older than BULK_IMPORT_STALE_AFTER seconds is
+claimed again by the next worker, which resumes from the checkpoint. The heartbeat is
+refreshed by every checkpoint and progress write and before each retry pass of a chunk; like
+the checkpoints it is conditional on the claiming attempt, so a slow worker that lost its job
+rolls back instead of importing rows twice. A job that keeps killing its worker is failed
+after MAX_ATTEMPTS starts.
+"""
+import json
+import logging
+from datetime import timedelta
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .bulk_import import ImportInterrupted, ProgressReporter, import_students
+from .models import BulkImportJob
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+
+def enqueue_import(user, df, educational_structure):
+    """Queue the import of a sheet; the worker picks it up from the database."""
+    return BulkImportJob.objects.create(
+        created_by=user,
+        total_records=len(df),
+        current_status='Waiting for the import worker...',
+        payload={
+            # 'split' keeps the index, so error row numbers survive the round trip
+            'sheet': json.loads(df.to_json(orient='split', date_format='iso')),
+            'educational_structure': educational_structure,
+        },
+    )
+
+
+def claim_next_job(stale_after=None):
+    """Mark the oldest runnable job as PROCESSING for this worker and return it (None if there is none)."""
+    if stale_after is None:
+        stale_after = getattr(settings, 'BULK_IMPORT_STALE_AFTER', 300)
+    now = timezone.now()
+    runnable = Q(status=BulkImportJob.Status.PENDING) | Q(
+        status=BulkImportJob.Status.PROCESSING, heartbeat_at__lt=now - timedelta(seconds=stale_after)
+    )
+    with transaction.atomic():
+        job = (
+            BulkImportJob.objects.select_for_update(skip_locked=True)
+            .filter(runnable, payload__isnull=False)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = BulkImportJob.Status.PROCESSING
+        job.attempts += 1
+        job.heartbeat_at = now
+        job.started_at = job.started_at or now
+        job.save(update_fields=['status', 'attempts', 'heartbeat_at', 'started_at'])
+    return job
+
+
+def _taken_over(job):
+    logger.warning(f"Import job {job.job_id} was taken over by another worker")
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """Run (or resume) a claimed job up to COMPLETED or FAILED."""
+    if job.attempts > MAX_ATTEMPTS:
+        if not job.mark_failed(f"Import stopped after {MAX_ATTEMPTS} interrupted attempts"):
+            return _taken_over(job)
+        return job
+
+    def checkpoint(done, partial):
+        # Conditional on our attempt: if another worker took the job over, roll the chunk back
+        updated = BulkImportJob.objects.filter(pk=job.pk, attempts=job.attempts).update(
+            checkpoint=done, results=partial, heartbeat_at=timezone.now()
+        )
+        if not updated:
+            raise ImportInterrupted(f"Import job {job.job_id} was taken over by another worker")
+        job.checkpoint, job.results = done, partial
+
+    try:
+        df = pd.DataFrame(**job.payload['sheet'])
+        results = import_students(
+            df,
+            job.payload['educational_structure'],
+            progress=ProgressReporter(job),
+            start=job.checkpoint,
+            partial=job.results if job.checkpoint else None,
+            on_chunk=checkpoint,
+        )
+    except ImportInterrupted:
+        return _taken_over(job)
+    except Exception as e:
+        logger.error(f"Import job {job.job_id} failed: {str(e)}")
+        if not job.mark_failed(str(e)):
+            return _taken_over(job)
+        return job
+
+    # Update job statistics
+    job.successful_records = results['successful_imports']
+    job.failed_records = len(results['errors'])
+    job.processed_records = results['processed_rows']
+    job.current_status = f"Import completed: {results['successful_imports']} students created"
+    # The sheet holds personal data and is no longer needed
+    job.payload = None
+    # Conditional like the checkpoints: a worker that lost the job must not overwrite the new owner's state
+    if not job.mark_completed(results):
+        return _taken_over(job)
+    logger.info(f"Import job {job.job_id} completed successfully")
+    return job
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.import_jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued student bulk imports (keep it running under a process supervisor)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between checks of an empty queue',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Import job {job.job_id}: attempt {job.attempts}, resuming at row {job.checkpoint}")
+            job = run_job(job)
+            if job.status == job.Status.COMPLETED:
+                self.stdout.write(self.style.SUCCESS(
+                    f"[OK] Import job {job.job_id}: {job.successful_records} students created, {job.failed_records} errors"
+                ))
+            elif job.status == job.Status.FAILED:
+                self.stdout.write(self.style.ERROR(f"Import job {job.job_id} failed: {job.error_message}"))
+            else:
+                self.stdout.write(f"Import job {job.job_id}: taken over by another worker")
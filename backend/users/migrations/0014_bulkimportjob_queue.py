@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_set_default_transport_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkimportjob',
+            name='attempts',
+            field=models.IntegerField(default=0, help_text='Number of times a worker started this job'),
+        ),
+        migrations.AddField(
+            model_name='bulkimportjob',
+            name='checkpoint',
+            field=models.IntegerField(default=0, help_text='Validated rows already imported'),
+        ),
+        migrations.AddField(
+            model_name='bulkimportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last time the worker committed progress', null=True),
+        ),
+        migrations.AddField(
+            model_name='bulkimportjob',
+            name='payload',
+            field=models.JSONField(blank=True, help_text='Sheet rows and educational structure to import', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bulkimportjob',
+            index=models.Index(fields=['status', 'created_at'], name='bulkimport_queue_idx'),
+        ),
+    ]
@@ -85,10 +85,25 @@ class User(AbstractUser):
             return f"{self.first_name} {self.last_name}".strip()
 
     def update_last_seen(self):
-        """Update the last seen timestamp to now."""
+        """Record activity now: the presence store is updated at once, the row by a batched write."""
+        from .presence import touch
+        touch(self)
+
+    def record_login(self, force_password_change=False):
+        """
+        Record a successful login with a single UPDATE of last_login, the online status and
+        (when asked) the forced password change flag, and put the user in the presence store.
+        """
         from django.utils import timezone
-        self.last_seen = timezone.now()
-        self.save(update_fields=['last_seen'])
+        from .presence import mark_online
+        now = timezone.now()
+        self.last_login = self.last_seen = now
+        self.is_online = True
+        self.force_password_change = self.force_password_change or force_password_change
+        User.objects.filter(pk=self.pk).update(
+            last_login=now, last_seen=now, is_online=True, force_password_change=self.force_password_change
+        )
+        mark_online(self.id, now)
 
     def set_online_status(self, is_online=True):
         """Set user online status and update last seen if going online."""
@@ -391,6 +406,12 @@ class BulkImportJob(models.Model):
     # Results and errors
     error_message = models.TextField(blank=True, null=True)
     results = models.JSONField(blank=True, null=True, help_text="Import results data")
+
+    # Queued work and resume point (see users.import_jobs)
+    payload = models.JSONField(blank=True, null=True, help_text="Sheet rows and educational structure to import")
+    checkpoint = models.IntegerField(default=0, help_text="Validated rows already imported")
+    attempts = models.IntegerField(default=0, help_text="Number of times a worker started this job")
+    heartbeat_at = models.DateTimeField(blank=True, null=True, help_text="Last time the worker committed progress")
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -400,6 +421,9 @@ class BulkImportJob(models.Model):
     class Meta:
         db_table = 'users_bulkimportjob'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='bulkimport_queue_idx'),
+        ]
         verbose_name = "Bulk Import Job"
         verbose_name_plural = "Bulk Import Jobs"
     
@@ -411,29 +435,45 @@ class BulkImportJob(models.Model):
         return self.status in [self.Status.COMPLETED, self.Status.FAILED]
     
     def update_progress(self, progress, status=None):
-        """Update job progress and status"""
+        """Update job progress and status and refresh the heartbeat; returns False if another worker owns the job"""
+        from django.utils import timezone
         self.progress = min(100, max(0, progress))
         if status:
             self.current_status = status
-        self.save(update_fields=['progress', 'current_status'])
-    
+        self.heartbeat_at = timezone.now()
+        return self._save_if_claimed(['progress', 'current_status', 'heartbeat_at'])
+    
+    def _save_if_claimed(self, fields):
+        """
+        Write `fields` unless another worker claimed the job since this instance did
+        (attempts changed, see users.import_jobs). Returns whether they were written.
+        """
+        return bool(BulkImportJob.objects.filter(pk=self.pk, attempts=self.attempts).update(
+            **{name: getattr(self, name) for name in fields}
+        ))
+
     def mark_completed(self, results=None):
-        """Mark job as completed with results"""
+        """Mark job as completed with results; returns False if another worker owns the job"""
         from django.utils import timezone
         self.status = self.Status.COMPLETED
         self.progress = 100
         self.completed_at = timezone.now()
         if results:
             self.results = results
-        self.save()
+        return self._save_if_claimed([
+            'status', 'progress', 'current_status', 'completed_at', 'results', 'payload',
+            'processed_records', 'successful_records', 'failed_records',
+        ])
     
     def mark_failed(self, error_message):
-        """Mark job as failed with error message"""
+        """Mark job as failed with error message; returns False if another worker owns the job"""
         from django.utils import timezone
         self.status = self.Status.FAILED
         self.error_message = error_message
         self.completed_at = timezone.now()
-        self.save()
+        # The sheet holds personal data and cannot be retried from a failed job
+        self.payload = None
+        return self._save_if_claimed(['status', 'error_message', 'completed_at', 'payload'])
 
 
 # Django Signals
@@ -0,0 +1,169 @@
+# backend/users/presence.py
+"""
+User presence: heartbeats, last_seen and "who is online".
+
+Clients send a heartbeat every few seconds while logged in. Instead of an UPDATE on
+users_user per heartbeat, touch() records the time in the cache (the presence store, read by
+is_online()/online_user_ids()) and in a per-process buffer that a daemon thread writes every
+PRESENCE_FLUSH_INTERVAL seconds with one bulk UPDATE of last_seen/is_online. Only the latest
+heartbeat of each user in the interval is written, so the database sees at most one write per
+online user per interval. A user is online while their last heartbeat is younger than
+ONLINE_TIMEOUT, the same window CleanupInactiveUsersView applies to the stored columns.
+
+The presence store must be the shared cache (see CACHES in settings), since heartbeats of one
+user reach any web process. Users missing from it (evicted, cache restarted) fall back to
+their stored last_seen/is_online. Logging out leaves an "offline since" marker there, so a
+heartbeat still buffered by another process is not written back as online.
+
+With PRESENCE_ASYNC disabled, touch() writes the row immediately.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+ONLINE_TIMEOUT = timedelta(minutes=10)
+
+
+def _key(user_id):
+    return f'users:presence:{user_id}'
+
+
+def _offline_key(user_id):
+    return f'users:presence:{user_id}:offline'
+
+
+class PresenceBuffer:
+    def __init__(self, flush_interval=30.0, batch_size=500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._worker = None
+
+    def record(self, user_id, seen_at):
+        """Remember the latest heartbeat of a user until the next flush."""
+        with self._lock:
+            if self._pending.get(user_id) is None or self._pending[user_id] < seen_at:
+                self._pending[user_id] = seen_at
+        self._ensure_worker()
+
+    def discard(self, user_id):
+        with self._lock:
+            self._pending.pop(user_id, None)
+
+    def flush(self):
+        """Write the buffered heartbeats now. Returns the number of users updated."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            # Drop the heartbeats older than a logout handled by any process
+            offline = cache.get_many([_offline_key(user_id) for user_id in batch])
+            batch = {
+                user_id: seen_at for user_id, seen_at in batch.items()
+                if offline.get(_offline_key(user_id)) is None or offline[_offline_key(user_id)] < seen_at
+            }
+            if not batch:
+                return 0
+            users = [User(id=user_id, last_seen=seen_at, is_online=True) for user_id, seen_at in batch.items()]
+            try:
+                User.objects.bulk_update(users, ['last_seen', 'is_online'], batch_size=self.batch_size)
+            except Exception as e:
+                logger.error(f"Failed to write the presence of {len(batch)} users: {str(e)}")
+                # Keep them for the next flush unless a newer heartbeat arrived meanwhile
+                with self._lock:
+                    for user_id, seen_at in batch.items():
+                        self._pending.setdefault(user_id, seen_at)
+                return 0
+            return len(batch)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='presence-writer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+
+buffer = PresenceBuffer(flush_interval=getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 30.0))
+
+# Do not lose the last heartbeats on a clean shutdown
+atexit.register(buffer.flush)
+
+
+def touch(user):
+    """Record a heartbeat of `user` now; sets user.last_seen and user.is_online."""
+    now = timezone.now()
+    cache.set(_key(user.id), now, ONLINE_TIMEOUT.total_seconds())
+    user.last_seen = now
+    user.is_online = True
+    if getattr(settings, 'PRESENCE_ASYNC', False):
+        buffer.record(user.id, now)
+    else:
+        User.objects.filter(pk=user.pk).update(last_seen=now, is_online=True)
+    return now
+
+
+def mark_online(user_id, seen_at=None):
+    """Put a user in the presence store (their row is written by the caller)."""
+    cache.set(_key(user_id), seen_at or timezone.now(), ONLINE_TIMEOUT.total_seconds())
+
+
+def mark_offline(user_id):
+    """
+    Remove a user from the presence store (logout). The heartbeats buffered before now, by
+    this process or any other, are not written.
+    """
+    cache.delete(_key(user_id))
+    # Outlives any buffered heartbeat (PRESENCE_FLUSH_INTERVAL is well below ONLINE_TIMEOUT)
+    cache.set(_offline_key(user_id), timezone.now(), ONLINE_TIMEOUT.total_seconds())
+    buffer.discard(user_id)
+
+
+def last_seen_many(user_ids):
+    """Map user id -> last heartbeat, for the users currently in the presence store."""
+    user_ids = list(user_ids)
+    found = cache.get_many([_key(user_id) for user_id in user_ids])
+    return {user_id: found[_key(user_id)] for user_id in user_ids if _key(user_id) in found}
+
+
+def online_user_ids(users):
+    """
+    Ids of the `users` seen in the last ONLINE_TIMEOUT: their last heartbeat from the presence
+    store, or their stored last_seen/is_online when the store does not have them.
+    """
+    users = list(users)
+    seen = last_seen_many(user.id for user in users)
+    threshold = timezone.now() - ONLINE_TIMEOUT
+    online = set()
+    for user in users:
+        seen_at = seen.get(user.id)
+        if seen_at is None and user.is_online:
+            seen_at = user.last_seen
+        if seen_at is not None and seen_at >= threshold:
+            online.add(user.id)
+    return online
+
+
+def is_online(user):
+    return user.id in online_user_ids([user])
@@ -1,6 +1,9 @@
 # backend/users/serializers.py
 
+from django.db import models
 from rest_framework import serializers
+from . import presence
+from .emails import create_with_unique_email
 from .models import User, Profile, StudentEnrollment
 from attendance.models import StudentParentRelation
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
@@ -123,61 +126,6 @@ class UserRegisterSerializer(serializers.ModelSerializer):
             'parent_name', 'parent_first_name', 'parent_last_name', 'parent_phone'
         ]
 
-    def _generate_unique_email(self, first_name, last_name, role):
-        """Generate a unique email using initials + lastname approach with simple incremental numbers"""
-        import re
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        # Clean the last name
-        clean_last_name = re.sub(r'[^a-z0-9]', '', last_name.lower().replace(' ', '')).strip()
-        school_name = 'madrasti'  # This could be fetched from school config
-        clean_school_name = re.sub(r'[^a-z0-9]', '', school_name.lower().replace(' ', '')).strip()
-        
-        # Get first letter of first name
-        initial = first_name[0].lower() if first_name else 'u'  # 'u' for user if no first name
-        
-        # Determine email domain suffix based on role
-        role_suffix_map = {
-            'STUDENT': 'students',
-            'PARENT': 'parents', 
-            'TEACHER': 'teachers',
-            'ADMIN': 'team',
-            'STAFF': 'team'
-        }
-        domain_suffix = role_suffix_map.get(role, 'users')
-        
-        logger.error(f"EMAIL GENERATION: first_name={first_name}, last_name={last_name}, role={role}, initial={initial}, clean_last_name={clean_last_name}")
-        
-        # Try different email formats until we find a unique one
-        unique_email = None
-        counter = 0
-        
-        while not unique_email:
-            if counter == 0:
-                # First try: initial.lastname@school-suffix.com
-                candidate_email = f"{initial}.{clean_last_name}@{clean_school_name}-{domain_suffix}.com"
-            else:
-                # Subsequent tries: initial.lastname{counter}@school-suffix.com
-                candidate_email = f"{initial}.{clean_last_name}{counter}@{clean_school_name}-{domain_suffix}.com"
-            
-            logger.error(f"EMAIL GENERATION: Trying candidate_email={candidate_email}")
-            
-            # Check if this email already exists
-            if not User.objects.filter(email=candidate_email).exists():
-                unique_email = candidate_email
-                logger.error(f"EMAIL GENERATION: Found unique email={unique_email}")
-            else:
-                logger.error(f"EMAIL GENERATION: Email {candidate_email} already exists, incrementing counter")
-                counter += 1
-                # Safety break to avoid infinite loop (very unlikely to reach)
-                if counter > 1000:
-                    unique_email = f"{initial}.{clean_last_name}{counter}@{clean_school_name}-{domain_suffix}.com"
-                    logger.error(f"EMAIL GENERATION: Hit counter limit, using={unique_email}")
-                    break
-        
-        return unique_email
-
     def create(self, validated_data):
         from datetime import date
         
@@ -316,16 +264,16 @@ class UserRegisterSerializer(serializers.ModelSerializer):
                     defaults={'relationship_type': 'father', 'is_primary_contact': True}
                 )
             else:
-                # Generate unique parent email using the helper function
-                parent_email = self._generate_unique_email(parent_first_name, parent_last_name, 'PARENT')
-                
-                # Create parent user account
-                parent_user = User.objects.create_user(
-                    email=parent_email,
-                    password='defaultStrongPassword25',  # Same default password as student
-                    first_name=parent_first_name,
-                    last_name=parent_last_name,
-                    role=User.Role.PARENT
+                # Create parent user account with a generated unique email
+                parent_user = create_with_unique_email(
+                    'PARENT', parent_first_name, parent_last_name,
+                    lambda parent_email: User.objects.create_user(
+                        email=parent_email,
+                        password='defaultStrongPassword25',  # Same default password as student
+                        first_name=parent_first_name,
+                        last_name=parent_last_name,
+                        role=User.Role.PARENT
+                    )
                 )
                 
                 # Update parent profile with phone if provided
@@ -628,12 +576,27 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         return (language or 'en').split('-')[0]
 
 
+class PresenceListSerializer(serializers.ListSerializer):
+    """
+    Looks up the online status of every listed user with one presence store read, unless the
+    view resolved it for the whole response (`online_ids` in the serializer context).
+    """
+
+    def to_representation(self, data):
+        if 'online_ids' in self.context:
+            return super().to_representation(data)
+        users = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.online_ids = presence.online_user_ids(users)
+        return super().to_representation(users)
+
+
 class UserBasicSerializer(serializers.ModelSerializer):
     """
     Basic user serializer for displaying minimal user info.
     Useful for lists where you don't need all profile details.
     """
     full_name = serializers.ReadOnlyField()
+    is_online = serializers.SerializerMethodField()
     ar_first_name = serializers.CharField(source='profile.ar_first_name', read_only=True)
     ar_last_name = serializers.CharField(source='profile.ar_last_name', read_only=True)
     profile_picture_url = serializers.SerializerMethodField()
@@ -649,6 +612,13 @@ class UserBasicSerializer(serializers.ModelSerializer):
             'role', 'is_active', 'is_online', 'last_seen', 'last_login', 'profile_picture_url',
             'phone', 'position', 'position_label', 'school_subject'
         )
+        list_serializer_class = PresenceListSerializer
+
+    def get_is_online(self, obj):
+        online_ids = self.context.get('online_ids', getattr(self, 'online_ids', None))
+        if online_ids is None:
+            return presence.is_online(obj)
+        return obj.id in online_ids
 
     def get_profile_picture_url(self, obj):
         try:
@@ -1,9 +1,32 @@
 # backend/users/test_views.py
 
+import io
+import os
+import time
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+
+import pandas as pd
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
-from users.models import User
+from attendance.models import StudentParentRelation
+from schools.models import AcademicYear, EducationalLevel, Grade, SchoolClass
+from users import bulk_import, presence
+from users.checks import check_shared_cache
+from users.bulk_import import ProgressReporter, import_students, preview_students
+from users.emails import EmailAllocator, create_with_unique_email
+from users.import_jobs import claim_next_job, enqueue_import, run_job
+from users.models import BulkImportJob, StudentEnrollment, User
+from users.serializers import UserBasicSerializer, UserRegisterSerializer
+
+
 
 class UserAPITests(APITestCase):
     """
@@ -87,4 +110,461 @@ class UserAPITests(APITestCase):
         self.user.refresh_from_db()
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(self.user.first_name, 'UpdatedFirstName')
\ No newline at end of file
+        self.assertEqual(self.user.first_name, 'UpdatedFirstName')
+
+class BulkImportFixtures:
+    """School structure and sheets shared by the bulk import tests."""
+
+    def setUp(self):
+        level = EducationalLevel.objects.create(level='PRIMARY', name='Primaire', order=1)
+        grade = Grade.objects.create(educational_level=level, grade_number=1, name='1ère Année Primaire')
+        self.year = AcademicYear.objects.create(
+            year='2024-2025', start_date=date(2024, 9, 1), end_date=date(2025, 6, 30), is_current=True
+        )
+        self.school_class = SchoolClass.objects.create(grade=grade, academic_year=self.year, section='A')
+        self.structure = {
+            'level_id': level.id, 'grade_id': grade.id,
+            'class_id': self.school_class.id, 'academic_year_id': self.year.id,
+        }
+
+    def _sheet(self, count, **overrides):
+        rows = {
+            'Student First Name': [f'Ahmed{index}' for index in range(count)],
+            'Student Last Name': [f'Smith{index}' for index in range(count)],
+            'Arabic First Name': ['أحمد'] * count,
+            'Arabic Last Name': ['سميث'] * count,
+            'Date of Birth': ['2010-05-15'] * count,
+            'Parent First Name': [f'Mohamed{index}' for index in range(count)],
+            'Parent Last Name': [f'Smith{index}' for index in range(count)],
+            'Parent Phone': [f'06{index:08d}' for index in range(count)],
+        }
+        rows.update(overrides)
+        return pd.DataFrame(rows)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class StudentBulkImportTest(BulkImportFixtures, APITestCase):
+    """
+    Test suite for the bulk student import engine.
+    """
+
+    def test_import_creates_students_parents_and_enrollments(self):
+        User.objects.create_user(email='a.smith@madrasti-students.com', password=None)
+        df = pd.DataFrame({
+            'Student First Name': ['Ahmed', 'Amina', 'Omar', None, 'Sara'],
+            'Student Last Name': ['Smith', 'Smith', 'Haddad', None, 'Alaoui'],
+            'Arabic First Name': ['أحمد', 'أمينة', 'عمر', None, None],
+            'Arabic Last Name': ['سميث', 'سميث', 'حداد', None, 'العلوي'],
+            'Date of Birth': ['2010-05-15', '2011-02-01', 'not a date', None, None],
+            'Parent First Name': ['Mohamed', 'Mohamed', None, None, None],
+            'Parent Last Name': ['Smith', 'Smith', None, None, None],
+            'Parent Phone': ['0600000001', '0600000001', None, None, None],
+        })
+
+        results = import_students(df, self.structure)
+
+        self.assertEqual(results['processed_rows'], 4)
+        self.assertEqual(results['successful_imports'], 2)
+        self.assertEqual([error['row'] for error in results['errors']], [4, 6])
+        self.assertIn('Invalid date format', results['errors'][0]['error'])
+        self.assertIn('Arabic first name is required.', results['errors'][1]['error'])
+
+        emails = [student['email'] for student in results['created_students']]
+        self.assertEqual(emails, ['a.smith2@madrasti-students.com', 'a.smith3@madrasti-students.com'])
+        ahmed = User.objects.select_related('profile', 'parent').get(email=emails[0])
+        self.assertEqual(ahmed.profile.ar_first_name, 'أحمد')
+        self.assertEqual(ahmed.profile.date_of_birth, date(2010, 5, 15))
+        self.assertTrue(ahmed.check_password('defaultStrongPassword25'))
+        self.assertTrue(StudentEnrollment.objects.filter(student=ahmed, school_class=self.school_class).exists())
+
+        # Siblings share the parent matched on name and phone
+        self.assertEqual(results['created_parents'], [{
+            'id': ahmed.parent.id, 'email': 'm.smith@madrasti-parents.com',
+            'full_name': 'Mohamed Smith', 'children_count': 2,
+        }])
+        self.assertEqual(ahmed.parent.profile.phone, '0600000001')
+        self.assertEqual(StudentParentRelation.objects.filter(parent=ahmed.parent).count(), 2)
+
+    def test_preview_predicts_the_imported_emails(self):
+        df = self._sheet(3)
+        preview = preview_students(df)
+        self.assertEqual(User.objects.count(), 0)
+        results = import_students(df, self.structure)
+        self.assertEqual(
+            [row['predicted_student_email'] for row in preview['preview_data']],
+            [student['email'] for student in results['created_students']]
+        )
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def queries(count, offset):
+            df = self._sheet(count, **{'Student Last Name': [f'Doe{offset + index}' for index in range(count)]})
+            with CaptureQueriesContext(connection) as context:
+                results = import_students(df, self.structure)
+            self.assertEqual(results['successful_imports'], count)
+            return len(context)
+
+        # Sizes within one SQLite insert batch (bulk_create splits on its parameter limit)
+        self.assertEqual(queries(5, 0), queries(30, 5))
+
+    def test_a_row_that_cannot_be_saved_fails_alone(self):
+        import_chunk = bulk_import._import_chunk
+
+        def failing(rows, *args):
+            if any(row['Student Last Name'] == 'Smith3' for row in rows):
+                raise IntegrityError("row 3 cannot be saved")
+            return import_chunk(rows, *args)
+
+        with mock.patch.object(bulk_import, '_import_chunk', side_effect=failing):
+            results = import_students(self._sheet(10), self.structure, chunk_size=5)
+
+        self.assertEqual(results['successful_imports'], 9)
+        self.assertEqual(len(results['errors']), 1)
+        self.assertIn('row 3 cannot be saved', results['errors'][0]['error'])
+        self.assertFalse(User.objects.filter(last_name='Smith3', role=User.Role.STUDENT).exists())
+        self.assertEqual(User.objects.filter(role=User.Role.STUDENT).count(), 9)
+
+    def test_progress_writes_are_throttled(self):
+        job = BulkImportJob.objects.create(created_by=User.objects.create_user(email='admin@madrasti.com', password=None))
+        with mock.patch.object(job, 'update_progress') as update_progress:
+            import_students(self._sheet(100), self.structure, progress=ProgressReporter(job, interval=60), chunk_size=5)
+        # The forced "Validating data..." write, then nothing for 60 seconds
+        self.assertEqual(update_progress.call_count, 1)
+
+    @skipUnless(os.getenv('RUN_BENCHMARKS') == 'true', "benchmark: set RUN_BENCHMARKS=true to run it")
+    def test_import_benchmark_2000_students(self):
+        """Benchmark: import 2,000 students with their parents"""
+        started = time.perf_counter()
+        results = import_students(self._sheet(2000), self.structure)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(results['successful_imports'], 2000)
+        self.assertEqual(User.objects.filter(role=User.Role.PARENT).count(), 2000)
+        self.assertLess(elapsed, 20)
+
+
+class EmailAllocatorTest(APITestCase):
+    """
+    Test suite for the generated email allocator.
+    """
+
+    def test_allocates_after_the_highest_suffix_with_one_query(self):
+        for email in ['a.smith@madrasti-students.com', 'a.smith2@madrasti-students.com',
+                      'a.smith5@madrasti-students.com', 'a.smithson@madrasti-students.com']:
+            User.objects.create_user(email=email, password=None)
+        allocator = EmailAllocator('STUDENT')
+        with self.assertNumQueries(1):
+            self.assertEqual(allocator.allocate('Ahmed', 'Smith'), 'a.smith6@madrasti-students.com')
+            self.assertEqual(allocator.allocate('Amina', 'Smith'), 'a.smith7@madrasti-students.com')
+        self.assertEqual(allocator.allocate('Omar', 'Haddad'), 'o.haddad@madrasti-students.com')
+
+    def test_preloaded_domain_keeps_numbered_last_names_apart(self):
+        User.objects.create_user(email='j.doe2@madrasti-parents.com', password=None)
+        with self.assertNumQueries(1):
+            allocator = EmailAllocator('PARENT', preload=True)
+            self.assertEqual(allocator.allocate('John', 'Doe'), 'j.doe3@madrasti-parents.com')
+            self.assertEqual(allocator.allocate('Jane', 'Doe2'), 'j.doe22@madrasti-parents.com')
+            self.assertEqual(allocator.allocate('Ali', 'Alaoui'), 'a.alaoui@madrasti-parents.com')
+
+    def test_create_retries_when_a_concurrent_registration_wins(self):
+        allocator = EmailAllocator('PARENT')
+        self.assertEqual(allocator.allocate('Karim', 'Idrissi'), 'k.idrissi@madrasti-parents.com')
+        # Another request registers the next address before this one uses it
+        User.objects.create_user(email='k.idrissi2@madrasti-parents.com', password=None)
+
+        parent = create_with_unique_email(
+            'PARENT', 'Karim', 'Idrissi',
+            lambda email: User.objects.create_user(email=email, password=None, role=User.Role.PARENT),
+            allocator=allocator,
+        )
+        self.assertEqual(parent.email, 'k.idrissi3@madrasti-parents.com')
+
+    def test_registration_generates_the_parent_email(self):
+        User.objects.create_user(email='m.smith@madrasti-parents.com', password=None)
+        serializer = UserRegisterSerializer(data={
+            'email': 'a.smith@madrasti-students.com', 'password': 'strongpassword123',
+            'first_name': 'Ahmed', 'last_name': 'Smith', 'role': 'STUDENT',
+            'parent_first_name': 'Mohamed', 'parent_last_name': 'Smith',
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        student = serializer.save()
+        self.assertEqual(student.parent.email, 'm.smith2@madrasti-parents.com')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkImportQueueTest(BulkImportFixtures, APITestCase):
+    """
+    Test suite for the DB-backed bulk import queue and its resumable worker.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(email='admin@madrasti.com', password=None, role=User.Role.ADMIN)
+
+    def test_upload_is_queued_and_run_by_the_worker(self):
+        buffer = io.BytesIO()
+        self._sheet(3).to_excel(buffer, sheet_name='Students', index=False)
+        buffer.seek(0)
+        buffer.name = 'students.xlsx'
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('bulk_import_students'), {
+            'file': buffer, 'preview': 'false', **self.structure,
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        job = BulkImportJob.objects.get(job_id=response.data['job_id'])
+        self.assertEqual(job.status, BulkImportJob.Status.PENDING)
+
+        call_command('run_import_worker', '--once', stdout=io.StringIO())
+
+        response = self.client.get(reverse('bulk_import_progress', args=[job.job_id]))
+        self.assertEqual(response.data['status'], BulkImportJob.Status.COMPLETED)
+        self.assertEqual(response.data['successful_records'], 3)
+        self.assertEqual(response.data['results']['created_students'][0]['row_number'], 2)
+        job.refresh_from_db()
+        self.assertIsNone(job.payload)
+
+    def test_restarted_worker_resumes_from_the_checkpoint(self):
+        enqueue_import(self.admin, self._sheet(250), self.structure)
+        job = claim_next_job()
+
+        import_chunk = bulk_import._import_chunk
+        def crash_on_second_chunk(*args):
+            if job.checkpoint:
+                raise KeyboardInterrupt
+            return import_chunk(*args)
+
+        with mock.patch('users.bulk_import._import_chunk', side_effect=crash_on_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.checkpoint), (BulkImportJob.Status.PROCESSING, 200))
+        self.assertEqual(User.objects.filter(role=User.Role.STUDENT).count(), 200)
+        # The heartbeat is fresh: nothing to claim until it goes stale
+        self.assertIsNone(claim_next_job())
+
+        job = run_job(claim_next_job(stale_after=0))
+
+        self.assertEqual((job.status, job.attempts), (BulkImportJob.Status.COMPLETED, 2))
+        self.assertEqual(job.successful_records, 250)
+        self.assertEqual(len(job.results['created_students']), 250)
+        self.assertEqual(User.objects.filter(role=User.Role.STUDENT).count(), 250)
+        self.assertEqual(StudentEnrollment.objects.count(), 250)
+
+    def test_worker_that_lost_its_job_rolls_back(self):
+        enqueue_import(self.admin, self._sheet(3), self.structure)
+        slow = claim_next_job()
+        current = claim_next_job(stale_after=0)
+
+        slow = run_job(slow)
+        self.assertEqual(slow.status, BulkImportJob.Status.PROCESSING)
+        self.assertEqual(User.objects.filter(role=User.Role.STUDENT).count(), 0)
+
+        self.assertEqual(run_job(current).status, BulkImportJob.Status.COMPLETED)
+        self.assertEqual(User.objects.filter(role=User.Role.STUDENT).count(), 3)
+
+    def test_worker_that_lost_its_job_does_not_finish_it(self):
+        enqueue_import(self.admin, self._sheet(2, **{'Date of Birth': ['not a date'] * 2}), self.structure)
+        slow = claim_next_job()
+        failing = BulkImportJob.objects.get(pk=slow.pk)
+        current = claim_next_job(stale_after=0)
+
+        slow = run_job(slow)
+        self.assertEqual((slow.status, slow.attempts), (BulkImportJob.Status.PROCESSING, 2))
+        self.assertIsNotNone(slow.payload)
+
+        with mock.patch('users.import_jobs.import_students', side_effect=ValueError("broken sheet")):
+            failing = run_job(failing)
+        self.assertEqual((failing.status, failing.error_message), (BulkImportJob.Status.PROCESSING, None))
+
+        current = run_job(current)
+        self.assertEqual(current.status, BulkImportJob.Status.COMPLETED)
+        self.assertEqual(current.failed_records, 2)
+
+    def test_progress_writes_refresh_the_heartbeat(self):
+        enqueue_import(self.admin, self._sheet(3), self.structure)
+        job = claim_next_job()
+        BulkImportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        ProgressReporter(job).update(50, "Processing...")
+
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, timezone.now() - timedelta(minutes=1))
+        self.assertIsNone(claim_next_job())
+
+    def test_retry_pass_refreshes_the_heartbeat(self):
+        enqueue_import(self.admin, self._sheet(3), self.structure)
+        job = claim_next_job()
+        import_chunk = bulk_import._import_chunk
+        def stale_then_conflict(rows, *args):
+            if len(rows) > 1:
+                # A slow first pass: the heartbeat went stale before the chunk failed
+                BulkImportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+                raise IntegrityError("email taken")
+            return import_chunk(rows, *args)
+
+        with mock.patch('users.bulk_import._import_chunk', side_effect=stale_then_conflict):
+            with mock.patch.object(ProgressReporter, 'heartbeat', autospec=True, wraps=ProgressReporter.heartbeat) as heartbeat:
+                job = run_job(job)
+
+        self.assertEqual(job.status, BulkImportJob.Status.COMPLETED)
+        self.assertEqual(heartbeat.call_count, 2)
+
+    def test_failed_job_drops_the_sheet(self):
+        job = enqueue_import(self.admin, self._sheet(3), self.structure)
+
+        job.mark_failed("broken sheet")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkImportJob.Status.FAILED)
+        self.assertIsNone(job.payload)
+
+
+@override_settings(PRESENCE_ASYNC=False)
+class PresenceTest(APITestCase):
+    """
+    Test suite for heartbeats and the presence store.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(email=f'user{index}@madrasti.com', password=None) for index in range(3)
+        ]
+
+    def _heartbeat(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('user_heartbeat'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    @override_settings(PRESENCE_ASYNC=True)
+    def test_heartbeats_are_coalesced_into_one_bulk_update(self):
+        buffer = presence.PresenceBuffer()
+        with mock.patch.object(presence, 'buffer', buffer), mock.patch.object(buffer, '_ensure_worker'):
+            with self.assertNumQueries(0):
+                for _ in range(5):
+                    for user in self.users[:2]:
+                        response = self._heartbeat(user)
+            self.assertTrue(response.data['is_online'])
+            self.assertFalse(User.objects.filter(last_seen__isnull=False).exists())
+
+            with self.assertNumQueries(1):
+                self.assertEqual(buffer.flush(), 2)
+
+        seen = dict(User.objects.filter(last_seen__isnull=False, is_online=True).values_list('id', 'last_seen'))
+        self.assertEqual(seen, {self.users[1].id: response.data['last_seen'], self.users[0].id: mock.ANY})
+
+    def test_who_is_online_comes_from_the_presence_store(self):
+        self._heartbeat(self.users[0])
+        self._heartbeat(self.users[1])
+        self.client.post(reverse('user_logout'))
+
+        data = UserBasicSerializer(User.objects.order_by('id'), many=True).data
+        self.assertEqual([user['is_online'] for user in data], [True, False, False])
+        self.assertTrue(UserBasicSerializer(self.users[0]).data['is_online'])
+        self.assertEqual(presence.online_user_ids(self.users), {self.users[0].id})
+
+    def test_logout_drops_heartbeats_buffered_by_other_processes(self):
+        user = self.users[0]
+        other_process = presence.PresenceBuffer()
+        with mock.patch.object(other_process, '_ensure_worker'):
+            other_process.record(user.id, timezone.now())
+        self._heartbeat(user)
+        self.client.post(reverse('user_logout'))
+
+        self.assertEqual(other_process.flush(), 0)
+        self.assertFalse(User.objects.get(pk=user.pk).is_online)
+
+        # A later heartbeat is written again
+        with mock.patch.object(other_process, '_ensure_worker'):
+            other_process.record(user.id, timezone.now())
+        self.assertEqual(other_process.flush(), 1)
+
+    def test_users_missing_from_the_store_fall_back_to_the_stored_columns(self):
+        User.objects.filter(pk=self.users[0].pk).update(is_online=True, last_seen=timezone.now())
+        User.objects.filter(pk=self.users[1].pk).update(
+            is_online=True, last_seen=timezone.now() - presence.ONLINE_TIMEOUT - timedelta(minutes=1)
+        )
+        cache.clear()
+
+        self.assertEqual(presence.online_user_ids(User.objects.all()), {self.users[0].id})
+        data = UserBasicSerializer(User.objects.order_by('id'), many=True).data
+        self.assertEqual([user['is_online'] for user in data], [True, False, False])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginTest(APITestCase):
+    """
+    Test suite for the login path.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.login_url = reverse('user_login')
+        self.user = User.objects.create_user(
+            email='student@madrasti.com', password='strongpassword123', first_name='Sara', last_name='Amrani',
+            role=User.Role.STUDENT
+        )
+
+    def _login(self, email, password='strongpassword123'):
+        response = self.client.post(self.login_url, {'email': email, 'password': password}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_login_reads_the_user_once_and_writes_it_once(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self._login(self.user.email)
+        self.assertEqual(len(context), 2)
+        self.assertTrue(context[1]['sql'].startswith('UPDATE'))
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.is_online)
+        self.assertIsNotNone(user.last_login)
+        self.assertEqual(user.last_seen, user.last_login)
+        self.assertFalse(user.force_password_change)
+        self.assertTrue(presence.is_online(user))
+        self.assertEqual(response.data['user']['email'], user.email)
+        self.assertEqual(response.data['user']['full_name'], 'Sara Amrani')
+        self.assertTrue(response.data['user']['is_online'])
+
+    def test_default_password_forces_a_password_change(self):
+        self.user.set_password('defaultStrongPassword25')
+        self.user.save()
+        response = self._login(self.user.email, 'defaultStrongPassword25')
+        self.assertTrue(response.data['force_password_change'])
+        self.assertTrue(User.objects.get(pk=self.user.pk).force_password_change)
+
+    @skipUnless(os.getenv('RUN_BENCHMARKS') == 'true', "benchmark: set RUN_BENCHMARKS=true to run it")
+    def test_login_benchmark(self):
+        """Benchmark: logins per second against 500 seeded students"""
+        User.objects.bulk_create(
+            User(email=f'student{index}@madrasti.com', password=self.user.password, role=User.Role.STUDENT)
+            for index in range(500)
+        )
+        started = time.perf_counter()
+        for index in range(0, 500, 5):
+            self._login(f'student{index}@madrasti.com')
+        elapsed = time.perf_counter() - started
+        # At least 50 logins/second
+        self.assertLess(elapsed, 2)
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    """
+    Test the system check requiring a shared cache in production.
+    """
+
+    @override_settings(REQUIRE_SHARED_CACHE=True)
+    def test_local_memory_cache_fails_in_production(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['users.E001'])
+
+    @override_settings(REQUIRE_SHARED_CACHE=True, CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/0',
+    }})
+    def test_redis_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(REQUIRE_SHARED_CACHE=False)
+    def test_local_memory_cache_is_fine_in_development(self):
+        self.assertEqual(check_shared_cache(None), [])
@@ -12,11 +12,12 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 import pandas as pd
 import io
 from datetime import datetime
-import threading
-import time
 from django.utils import timezone
 
 from .models import User, StudentEnrollment, BulkImportJob, Profile
+from .bulk_import import import_students, preview_students
+from .import_jobs import enqueue_import
+from . import presence
 from .serializers import (
     UserRegisterSerializer,
     UserProfileSerializer,
@@ -68,26 +69,19 @@ class LoginView(APIView):
         user = authenticate(request, email=email, password=password)
 
         if user:
-            # Check if user is using default password
+            # Users still on the default password must change it; one UPDATE records the
+            # login, the online status and that flag
             default_password = 'defaultStrongPassword25'
-            if password == default_password and not user.force_password_change:
-                # Mark user for forced password change
-                user.force_password_change = True
-                user.save()
-            
-            # Set user as online and update last_login
-            from django.utils import timezone
-            user.set_online_status(True)
-            user.last_login = timezone.now()
-            user.save(update_fields=['last_login'])
+            user.record_login(force_password_change=password == default_password)
 
             # If authentication is successful, use our serializer to get tokens
             serializer = MyTokenObtainPairSerializer.get_token(user)
             refresh = str(serializer)
             access = str(serializer.access_token)
 
-            # Use UserUpdateSerializer to get complete user data including profile
-            user_serializer = UserUpdateSerializer(user)
+            # Identity and display fields only: all of them come with the user fetched by
+            # EmailBackend, and the full profile is served by the profile endpoint
+            user_serializer = UserBasicSerializer(user, context={'request': request})
 
             return Response(
                 {
@@ -113,6 +107,7 @@ class LogoutView(APIView):
         """Mark user as offline during logout"""
         try:
             user = request.user
+            presence.mark_offline(user.id)
             user.set_online_status(False)
 
             return Response(
@@ -134,12 +129,9 @@ class HeartbeatView(APIView):
         """Update user's last seen timestamp and ensure they're marked as online"""
         try:
             user = request.user
+            # Also marks the user online; the row is written in batches (see users.presence)
             user.update_last_seen()
 
-            # Ensure user is marked as online (in case they weren't)
-            if not user.is_online:
-                user.set_online_status(True)
-
             return Response(
                 {
                     "status": "success",
@@ -170,6 +162,9 @@ class CleanupInactiveUsersView(APIView):
         try:
             from datetime import timedelta
 
+            # Write the heartbeats buffered by this process first
+            presence.buffer.flush()
+
             # Mark users as offline if they haven't been seen in 10 minutes
             inactive_threshold = timezone.now() - timedelta(minutes=10)
 
@@ -709,21 +704,9 @@ class StudentBulkImportView(APIView):
                 results = self._process_student_data(df, preview_mode, educational_structure)
                 return Response(results, status=status.HTTP_200_OK)
             else:
-                # For actual import, process asynchronously
-                job = BulkImportJob.objects.create(
-                    created_by=request.user,
-                    total_records=len(df),
-                    current_status='Initializing import...'
-                )
-                
-                # Start background processing
-                thread = threading.Thread(
-                    target=self._process_import_async,
-                    args=(job.job_id, df, educational_structure)
-                )
-                thread.daemon = True
-                thread.start()
-                
+                # For actual import, queue the job for the import worker (manage.py run_import_worker)
+                job = enqueue_import(request.user, df, educational_structure)
+
                 return Response({
                     'job_id': str(job.job_id),
                     'status': 'started',
@@ -736,334 +719,11 @@ class StudentBulkImportView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def _process_import_async(self, job_id, df, educational_structure):
-        """Process import in background thread"""
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        try:
-            job = BulkImportJob.objects.get(job_id=job_id)
-            job.status = BulkImportJob.Status.PROCESSING
-            job.started_at = timezone.now()
-            job.save()
-            
-            # Process the import with progress tracking
-            results = self._process_student_data_with_progress(df, job, educational_structure)
-            
-            # Mark job as completed
-            job.mark_completed(results)
-            logger.info(f"Import job {job_id} completed successfully")
-            
-        except Exception as e:
-            logger.error(f"Import job {job_id} failed: {str(e)}")
-            try:
-                job = BulkImportJob.objects.get(job_id=job_id)
-                job.mark_failed(str(e))
-            except:
-                pass
-
-    def _generate_unique_email_for_import(self, first_name, last_name, role, used_emails):
-        """
-        Generates a unique email for the import process.
-        Checks against the database and a set of emails used in the current batch.
-        """
-        import re
-        from .models import User
-
-        # Clean names and get initial
-        clean_last_name = re.sub(r'[^a-z0-9]', '', last_name.lower().replace(' ', '')).strip()
-        initial = first_name[0].lower() if first_name else 'u'
-        
-        # Determine email domain
-        school_name = 'madrasti' # This could be a setting
-        role_suffix_map = {'STUDENT': 'students', 'PARENT': 'parents', 'TEACHER': 'teachers', 'ADMIN': 'team', 'STAFF': 'team'}
-        domain_suffix = role_suffix_map.get(role, 'users')
-        email_domain = f"@{school_name}-{domain_suffix}.com"
-        
-        # Base email part (e.g., j.doe)
-        base_email_part = f"{initial}.{clean_last_name}"
-        
-        # First attempt - clean email without numbers
-        candidate_email = base_email_part + email_domain
-        
-        # Check for uniqueness and add simple incremental number if needed
-        counter = 2  # Start with 2 for the second attempt (first attempt has no number)
-        while User.objects.filter(email=candidate_email).exists() or candidate_email in used_emails:
-            candidate_email = f"{base_email_part}{counter}{email_domain}"
-            counter += 1
-            # Safety break to avoid infinite loop
-            if counter > 1000:
-                break
-            
-        return candidate_email
-
     def _process_student_data(self, df, preview_mode=True, educational_structure=None):
         """Process student data from DataFrame"""
-        results = {
-            'total_rows': len(df),
-            'processed_rows': 0,
-            'successful_imports': 0,
-            'errors': [],
-            'warnings': [],
-            'preview_data': [] if preview_mode else None,
-            'created_students': [] if not preview_mode else None,
-            'created_parents': [] if not preview_mode else None
-        }
-        
-        generated_emails_in_batch = set()
-        
-        for index, row in df.iterrows():
-            try:
-                # Skip empty rows
-                if pd.isna(row['Student First Name']) or pd.isna(row['Student Last Name']):
-                    continue
-                
-                results['processed_rows'] += 1
-                row_number = index + 2  # Excel row number (accounting for header)
-
-                # --- Basic Row Validation ---
-                row_errors = []
-                required_fields = {'Student First Name': 'Student first name', 'Student Last Name': 'Student last name', 'Arabic First Name': 'Arabic first name', 'Arabic Last Name': 'Arabic last name'}
-                for field, display_name in required_fields.items():
-                    if pd.isna(row.get(field)) or str(row.get(field)).strip() == '':
-                        row_errors.append(f'{display_name} is required.')
-                
-                if not pd.isna(row.get('Date of Birth')):
-                    try: pd.to_datetime(row['Date of Birth'])
-                    except: row_errors.append('Invalid date format for Date of Birth. Use YYYY-MM-DD.')
-                
-                if row_errors:
-                    results['errors'].append({'row': row_number, 'error': ' '.join(row_errors)})
-                    continue
-                # --- End Basic Validation ---
-
-                # --- Prepare Student Data ---
-                from datetime import date
-                student_first_name = str(row['Student First Name']).strip()
-                student_last_name = str(row['Student Last Name']).strip()
-                
-                # Generate final, unique email before validation
-                student_email = self._generate_unique_email_for_import(
-                    student_first_name, student_last_name, 'STUDENT', generated_emails_in_batch
-                )
-
-                student_data = {
-                    'email': student_email,
-                    'password': 'defaultStrongPassword25',
-                    'first_name': student_first_name,
-                    'last_name': student_last_name,
-                    'role': 'STUDENT',
-                    'ar_first_name': str(row['Arabic First Name']).strip(),
-                    'ar_last_name': str(row['Arabic Last Name']).strip(),
-                    'enrollment_date': date.today(),
-                }
-                
-                if educational_structure:
-                    student_data['school_class_id'] = educational_structure['class_id']
-                    student_data['academic_year_id'] = educational_structure['academic_year_id']
-                
-                optional_fields = {
-                    'phone': 'Student Phone', 'address': 'Address', 'bio': 'Notes',
-                    'emergency_contact_name': 'Emergency Contact Name', 'emergency_contact_phone': 'Emergency Contact Phone',
-                    'parent_first_name': 'Parent First Name', 'parent_last_name': 'Parent Last Name', 'parent_phone': 'Parent Phone'
-                }
-                for field, column in optional_fields.items():
-                    if column in row and not pd.isna(row[column]):
-                        student_data[field] = str(row[column]).strip()
-                
-                if 'Date of Birth' in row and not pd.isna(row['Date of Birth']):
-                    student_data['date_of_birth'] = pd.to_datetime(row['Date of Birth']).date()
-                # --- End Data Preparation ---
-
-                if preview_mode:
-                    generated_emails_in_batch.add(student_email) # Add to set even in preview
-                    
-                    # Generate predicted parent email if parent data exists
-                    predicted_parent_email = None
-                    if student_data.get('parent_first_name') and student_data.get('parent_last_name'):
-                        predicted_parent_email = self._generate_unique_email_for_import(
-                            student_data['parent_first_name'], 
-                            student_data['parent_last_name'], 
-                            'PARENT', 
-                            generated_emails_in_batch
-                        )
-                    
-                    preview_item = {
-                        'row_number': row_number,
-                        'student_name': f"{student_first_name} {student_last_name}",
-                        'arabic_name': f"{row['Arabic First Name']} {row['Arabic Last Name']}",
-                        'parent_name': f"{row.get('Parent First Name', '')} {row.get('Parent Last Name', '')}".strip(),
-                        'predicted_student_email': student_email,
-                        'predicted_parent_email': predicted_parent_email or 'No parent data provided'
-                    }
-                    if results['preview_data'] is None: results['preview_data'] = []
-                    results['preview_data'].append(preview_item)
-                else:
-                    # Final Import: Validate and Save
-                    serializer = UserRegisterSerializer(data=student_data)
-                    if serializer.is_valid():
-                        try:
-                            student = serializer.save()
-                            generated_emails_in_batch.add(student.email) # Add final email to set
-                            results['successful_imports'] += 1
-                            results['created_students'].append({'id': student.id, 'email': student.email, 'full_name': student.full_name, 'row_number': row_number})
-                            
-                            # Track parent creation for results
-                            if student_data.get('parent_first_name') and student.parent:
-                                # Check if this parent was already tracked in this batch
-                                parent_already_tracked = any(
-                                    p['id'] == student.parent.id 
-                                    for p in results['created_parents']
-                                )
-                                if not parent_already_tracked:
-                                    results['created_parents'].append({
-                                        'id': student.parent.id, 
-                                        'email': student.parent.email, 
-                                        'full_name': student.parent.full_name,
-                                        'children_count': student.parent.children.count()
-                                    })
-
-                        except Exception as save_error:
-                            results['errors'].append({'row': row_number, 'error': f"Save Error: {save_error}"})
-                    else:
-                        results['errors'].append({'row': row_number, 'error': f"Validation failed: {serializer.errors}"})
-                                
-            except Exception as e:
-                results['errors'].append({'row': index + 2, 'error': str(e)})
-        
-        return results
-
-    def _process_student_data_with_progress(self, df, job, educational_structure):
-        """Process student data with progress tracking"""
-        results = {
-            'total_rows': len(df),
-            'processed_rows': 0,
-            'successful_imports': 0,
-            'errors': [],
-            'warnings': [],
-            'created_students': [],
-            'created_parents': []
-        }
-        
-        generated_emails_in_batch = set()
-        total_rows = len(df)
-        
-        job.update_progress(5, "Validating data...")
-        
-        for index, row in df.iterrows():
-            try:
-                # Skip empty rows
-                if pd.isna(row['Student First Name']) or pd.isna(row['Student Last Name']):
-                    continue
-                
-                results['processed_rows'] += 1
-                row_number = index + 2  # Excel row number (accounting for header)
-                
-                # Update progress after each record for smoother progress bar
-                progress = 10 + (results['processed_rows'] / total_rows * 85)  # 10% to 95%
-                status = f"Processing student {results['processed_rows']} of {total_rows}..."
-                job.update_progress(int(progress), status)
-
-                # --- Basic Row Validation ---
-                row_errors = []
-                required_fields = {'Student First Name': 'Student first name', 'Student Last Name': 'Student last name', 'Arabic First Name': 'Arabic first name', 'Arabic Last Name': 'Arabic last name'}
-                for field, display_name in required_fields.items():
-                    if pd.isna(row.get(field)) or str(row.get(field)).strip() == '':
-                        row_errors.append(f'{display_name} is required.')
-                
-                if not pd.isna(row.get('Date of Birth')):
-                    try: pd.to_datetime(row['Date of Birth'])
-                    except: row_errors.append('Invalid date format for Date of Birth. Use YYYY-MM-DD.')
-                
-                if row_errors:
-                    results['errors'].append({'row': row_number, 'error': ' '.join(row_errors)})
-                    continue
-                # --- End Basic Validation ---
-
-                # --- Prepare Student Data ---
-                from datetime import date
-                student_first_name = str(row['Student First Name']).strip()
-                student_last_name = str(row['Student Last Name']).strip()
-                
-                # Generate final, unique email before validation
-                student_email = self._generate_unique_email_for_import(
-                    student_first_name, student_last_name, 'STUDENT', generated_emails_in_batch
-                )
-
-                student_data = {
-                    'email': student_email,
-                    'password': 'defaultStrongPassword25',
-                    'first_name': student_first_name,
-                    'last_name': student_last_name,
-                    'role': 'STUDENT',
-                    'ar_first_name': str(row['Arabic First Name']).strip(),
-                    'ar_last_name': str(row['Arabic Last Name']).strip(),
-                    'enrollment_date': date.today(),
-                }
-                
-                if educational_structure:
-                    student_data['school_class_id'] = educational_structure['class_id']
-                    student_data['academic_year_id'] = educational_structure['academic_year_id']
-                
-                optional_fields = {
-                    'phone': 'Student Phone', 'address': 'Address', 'bio': 'Notes',
-                    'emergency_contact_name': 'Emergency Contact Name', 'emergency_contact_phone': 'Emergency Contact Phone',
-                    'parent_first_name': 'Parent First Name', 'parent_last_name': 'Parent Last Name', 'parent_phone': 'Parent Phone'
-                }
-                for field, column in optional_fields.items():
-                    if column in row and not pd.isna(row[column]):
-                        student_data[field] = str(row[column]).strip()
-                
-                if 'Date of Birth' in row and not pd.isna(row['Date of Birth']):
-                    student_data['date_of_birth'] = pd.to_datetime(row['Date of Birth']).date()
-                # --- End Data Preparation ---
-
-                # Final Import: Validate and Save
-                serializer = UserRegisterSerializer(data=student_data)
-                if serializer.is_valid():
-                    try:
-                        student = serializer.save()
-                        generated_emails_in_batch.add(student.email) # Add final email to set
-                        results['successful_imports'] += 1
-                        results['created_students'].append({
-                            'id': student.id, 
-                            'email': student.email, 
-                            'full_name': student.full_name, 
-                            'row_number': row_number
-                        })
-                        
-                        # Track parent creation for results
-                        if student_data.get('parent_first_name') and student.parent:
-                            # Check if this parent was already tracked in this batch
-                            parent_already_tracked = any(
-                                p['id'] == student.parent.id 
-                                for p in results['created_parents']
-                            )
-                            if not parent_already_tracked:
-                                results['created_parents'].append({
-                                    'id': student.parent.id, 
-                                    'email': student.parent.email, 
-                                    'full_name': student.parent.full_name,
-                                    'children_count': student.parent.children.count()
-                                })
-
-                    except Exception as save_error:
-                        results['errors'].append({'row': row_number, 'error': f"Save Error: {save_error}"})
-                else:
-                    results['errors'].append({'row': row_number, 'error': f"Validation failed: {serializer.errors}"})
-                                
-            except Exception as e:
-                results['errors'].append({'row': index + 2, 'error': str(e)})
-        
-        # Update job statistics
-        job.successful_records = results['successful_imports']
-        job.failed_records = len(results['errors'])
-        job.processed_records = results['processed_rows']
-        job.save()
-        
-        job.update_progress(100, f"Import completed: {results['successful_imports']} students created")
-        
-        return results
+        if preview_mode:
+            return preview_students(df)
+        return import_students(df, educational_structure)
 
 
 class BulkImportStatusView(APIView):